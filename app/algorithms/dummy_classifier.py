@@ -1,19 +1,27 @@
 import numpy as np
 import pandas as pd
 
+from app.utils.algorithm_utils import FeatureMatrix
+
 
 def dummy_classifier(
-    df: pd.DataFrame, *, label_col: str = "Prognosis", include_label: bool = False
+    df: pd.DataFrame | FeatureMatrix,
+    *,
+    label_col: str = "Prognosis",
+    include_label: bool = False,
 ) -> pd.DataFrame:
     """
     Return a random ranking of features as a DataFrame with a single column 'Feature'.
     - Excludes `label_col` by default.
     - No random_state (purely random each call).
     """
-    if not isinstance(df, pd.DataFrame):
-        raise ValueError("df must be a pandas DataFrame.")
+    if isinstance(df, FeatureMatrix):
+        cols = list(df.features)
+    elif isinstance(df, pd.DataFrame):
+        cols = list(df.columns)
+    else:
+        raise ValueError("df must be a pandas DataFrame or a FeatureMatrix.")
 
-    cols = list(df.columns)
     if not include_label and label_col in cols:
         feats = [c for c in cols if c != label_col]
     else:
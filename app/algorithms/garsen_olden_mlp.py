@@ -1,8 +1,9 @@
 import numpy as np
 import pandas as pd
-from pandas.api.types import is_numeric_dtype
 from sklearn.neural_network import MLPClassifier
 
+from app.utils.algorithm_utils import FeatureMatrix, split_xy
+
 
 def _connection_weights_importance(mlp) -> np.ndarray:
     """
@@ -33,7 +34,7 @@ def _connection_weights_importance(mlp) -> np.ndarray:
 
 
 def garsen_olden_mlp(
-    df: pd.DataFrame,
+    df: pd.DataFrame | FeatureMatrix,
     *,
     label_col: str = "Prognosis",
     # MLP hyperparams
@@ -56,18 +57,9 @@ def garsen_olden_mlp(
     and returns a DataFrame with a single column 'feature' ranked most→least important.
     Also saves the CSV to `csv_path`.
     """
-    if label_col not in df.columns:
-        raise ValueError(f"Label column '{label_col}' not found.")
-
-    y = df[label_col].to_numpy()
-    X = df.drop(columns=[label_col])
+    X, y, feats = split_xy(df, label_col)
 
     # Checks
-    if not np.issubdtype(y.dtype, np.number):
-        raise ValueError(f"'{label_col}' must be numeric/encoded already.")
-    nonnum = [c for c in X.columns if not is_numeric_dtype(X[c])]
-    if nonnum:
-        raise ValueError(f"Non-numeric feature columns found: {nonnum}.")
     classes, counts = np.unique(y, return_counts=True)
     if len(classes) < 2:
         raise ValueError("Need at least two classes in the target.")
@@ -88,7 +80,7 @@ def garsen_olden_mlp(
                 idx_all.append(idx_c)
         train_idx = np.concatenate(idx_all)
         rng.shuffle(train_idx)
-        X_use = X.iloc[train_idx, :]
+        X_use = X[train_idx]
         y_use = y[train_idx]
 
     # Fit n_models times with different seeds; average importances
@@ -108,7 +100,7 @@ def garsen_olden_mlp(
             early_stopping=early_stopping,  # keep False to avoid internal val split
             random_state=seed,
         )
-        mlp.fit(X_use.values, y_use)
+        mlp.fit(X_use, y_use)
         imp = _connection_weights_importance(mlp)
         if imp is not None and np.isfinite(imp).all():
             imp_accum += imp
@@ -119,7 +111,6 @@ def garsen_olden_mlp(
 
     importances = imp_accum / valid_runs
     # Break ties by feature name for deterministic ordering
-    feats = np.array(X_use.columns)
     order = np.lexsort((feats, -importances))
     ranked = pd.DataFrame({"Feature": feats[order], "Importance": importances[order]})
     return ranked
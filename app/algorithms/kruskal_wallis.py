@@ -0,0 +1,18 @@
+import pandas as pd
+
+from app.utils.algorithm_utils import FeatureMatrix, split_xy
+from app.utils.univariate_stats import univariate_test
+
+
+def kruskal_wallis(
+    df: pd.DataFrame | FeatureMatrix, *, label_col: str = "Prognosis"
+) -> pd.DataFrame:
+    """
+    Rank ALL features (best → worst) with the rank-based Kruskal-Wallis H
+    test (Mann-Whitney U for binary), robust to outliers and to the skewed,
+    bimodal beta distributions where the F-test's normality assumption fails.
+
+    Ordered by p-value; Importance is -log10(p).
+    """
+    X, y, feats = split_xy(df, label_col)
+    return univariate_test(X, y, "kruskal").ranking(feats)
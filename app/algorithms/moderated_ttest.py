@@ -0,0 +1,19 @@
+import pandas as pd
+
+from app.utils.algorithm_utils import FeatureMatrix, split_xy
+from app.utils.univariate_stats import univariate_test
+
+
+def moderated_ttest(
+    df: pd.DataFrame | FeatureMatrix, *, label_col: str = "Prognosis"
+) -> pd.DataFrame:
+    """
+    Rank ALL features (best → worst) with a moderated t-test (moderated F
+    for multiclass), as limma does for DMPs: each feature's within-class
+    variance is shrunk towards a prior fitted on all features, which keeps
+    features with tiny variances on few samples from topping the list.
+
+    Ordered by p-value; Importance is -log10(p).
+    """
+    X, y, feats = split_xy(df, label_col)
+    return univariate_test(X, y, "moderated_t").ranking(feats)
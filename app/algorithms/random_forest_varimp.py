@@ -1,11 +1,12 @@
 import numpy as np
 import pandas as pd
-from pandas.api.types import is_numeric_dtype
 from sklearn.ensemble import RandomForestClassifier
 
+from app.utils.algorithm_utils import FeatureMatrix, split_xy
+
 
 def random_forest_varimp(
-    df: pd.DataFrame,
+    df: pd.DataFrame | FeatureMatrix,
     *,
     label_col: str = "Prognosis",
     n_estimators: int = 300,
@@ -22,27 +23,16 @@ def random_forest_varimp(
 
     Assumes:
       - df[label_col] is ALREADY encoded (e.g., ints 0..K-1),
-      - feature columns are numeric (e.g., 0..1).
+      - feature columns are numeric (e.g., 0..1),
+      - or a float32 FeatureMatrix, fitted as-is (no copy). The forest needs
+        every column in memory at once, so it never reads the quantized store.
 
     Returns:
       pd.DataFrame: single column 'Feature' ordered best → worst by importance.
     """
-    if label_col not in df.columns:
-        raise ValueError(
-            f"Label column '{label_col}' not found. Columns: {list(df.columns)}"
-        )
-
-    y = df[label_col].to_numpy()
-    X = df.drop(columns=[label_col])
+    X, y, feats = split_xy(df, label_col)
 
     # sanity checks
-    if not np.issubdtype(y.dtype, np.number):
-        raise ValueError(f"'{label_col}' must be numeric/encoded already.")
-    nonnum = [c for c in X.columns if not is_numeric_dtype(X[c])]
-    if nonnum:
-        raise ValueError(
-            f"Non-numeric feature columns found: {nonnum}. Encode/convert them first."
-        )
     if len(np.unique(y)) < 2:
         raise ValueError("Need at least two classes in the target.")
 
@@ -62,4 +52,4 @@ def random_forest_varimp(
     importances = rf.feature_importances_
     order = np.argsort(-importances)  # descending
 
-    return pd.DataFrame({"Feature": X.columns[order], "Importance": importances[order]})
+    return pd.DataFrame({"Feature": feats[order], "Importance": importances[order]})
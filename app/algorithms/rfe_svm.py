@@ -1,85 +1,93 @@
-import numpy as np
+from pathlib import Path
+
 import pandas as pd
-from pandas.api.types import is_numeric_dtype
-from sklearn.feature_selection import RFE
-from sklearn.svm import LinearSVC
+
+from app.algorithms.workflow import Notify
+from app.utils.algorithm_utils import FeatureMatrix, split_xy
+from app.utils.svm_rfe import RFERound, svm_rfe
+
+# Share of the Celery progress bar (fs_wrapper is at 30, saving at 80)
+PROGRESS_START, PROGRESS_END = 30, 79
 
 
 def rfe_svm(
-    df: pd.DataFrame,
+    df: pd.DataFrame | FeatureMatrix,
     *,
     label_col: str = "Prognosis",
     # Tighter regularization → faster convergence; you can raise to 0.2–1.0 if needed
     C: float = 0.1,
-    # Huge fractional step = drop ~99% per round → ~5–7 fits total for 300k cols
-    step: float = 0.99,
+    # Coarse rounds: drop half of the features per round while above top_k
+    step: float = 0.5,
+    # Fine rounds: the best top_k are eliminated one by one (exact top ranking)
+    top_k: int = 100,
     # Looser tolerance → fewer solver iterations per fit
     tol: float = 5e-2,
     random_state: int = 0,
-    # Plenty for convergence with tol=5e-2; bump if you see ConvergenceWarning
+    # Solver epochs per round; warm starts usually need a handful
     max_iter: int = 5000,
     # Usually faster than squared_hinge for this use
     loss: str = "hinge",
     # Avoids per-iteration class reweighting cost unless you truly need it
     class_weight=None,
+    # Per-round progress (e.g. NotifyCeleryTask) and partial ranking file
+    notify: Notify | None = None,
+    partial_path=None,
 ) -> pd.DataFrame:
     """
     Rank ALL features (best → worst) using Linear SVM + RFE, tuned for speed on p ≫ n.
     Assumes feature columns are already numeric (e.g., scaled 0..1) and `label_col` is encoded.
 
-    Returns:
-        pd.DataFrame: single column 'Feature' ordered best → worst
-    """
-    if label_col not in df.columns:
-        raise ValueError(
-            f"Label column '{label_col}' not found. Columns: {list(df.columns)}"
-        )
+    The SVM is fitted in its dual over a Gram matrix that is downdated as
+    features are eliminated, warm started from the previous round (see
+    app.utils.svm_rfe). Features eliminated in the same round are ordered by
+    their weight; Importance is the RFE rank (1 = best).
 
-    # Split
-    y = df[label_col].to_numpy()
-    X_df = df.drop(columns=[label_col])
+    With `partial_path`, every round appends its eliminated features to that
+    CSV (worst first), so the file read bottom-up is the ranking so far.
 
-    # Require at least 2 classes
-    n_classes = len(np.unique(y))
-    if n_classes < 2:
-        raise ValueError(
-            f"Need at least 2 classes in '{label_col}'; found {n_classes}."
-        )
+    Returns:
+        pd.DataFrame: 'Feature' ordered best → worst, with its RFE rank
+    """
+    X, y, feats = split_xy(df, label_col)
 
-    # Ensure numeric features
-    nonnum = [c for c in X_df.columns if not is_numeric_dtype(X_df[c])]
-    if nonnum:
-        raise ValueError(
-            f"Non-numeric feature columns found: {nonnum}. Encode/convert them first."
+    meta = {}
+    if partial_path is not None:
+        pd.DataFrame(columns=["Feature", "Importance"]).to_csv(
+            partial_path, index=False
         )
+        meta["partial_ranking"] = Path(partial_path).name
 
-    # Convert to float32 to cut time/memory
-    X = X_df.to_numpy(dtype=np.float32, copy=False)
-    n_samples, n_features = X.shape
+    def report(rfe_round: RFERound):
+        if partial_path is not None:
+            pd.DataFrame(
+                {
+                    "Feature": feats[rfe_round.eliminated[::-1]],
+                    "Importance": rfe_round.ranks[::-1],
+                }
+            ).to_csv(partial_path, mode="a", header=False, index=False)
+        if notify is not None:
+            span = PROGRESS_END - PROGRESS_START
+            notify.progress(
+                f"RFE round {rfe_round.round}/{rfe_round.n_rounds}: "
+                f"{rfe_round.remaining} features left",
+                progress=PROGRESS_START + span * rfe_round.round // rfe_round.n_rounds,
+                rfe_round=rfe_round.round,
+                rfe_rounds=rfe_round.n_rounds,
+                features_left=rfe_round.remaining,
+                **meta,
+            )
 
-    # For p >> n, dual=True is appropriate (LinearSVC uses liblinear)
-    dual_flag = True if n_features >= n_samples else False
-
-    est = LinearSVC(
-        dual=dual_flag,
+    result = svm_rfe(
+        X,
+        y,
         C=C,
-        tol=tol,
         loss=loss,
         class_weight=class_weight,
-        random_state=random_state,
+        tol=tol,
         max_iter=max_iter,
+        step=step,
+        top_k=top_k,
+        random_state=random_state,
+        on_round=report,
     )
-
-    # n_features_to_select=1 => compute a full ranking (keeps all features)
-    rfe = RFE(estimator=est, n_features_to_select=1, step=step)
-    rfe.fit(X, y)
-
-    ranks = pd.Series(
-        rfe.ranking_, index=X_df.columns, name="RFE_rank"
-    ).sort_values()  # 1 = best
-    ordered_features = ranks.index.tolist()
-
-    return pd.DataFrame(
-        {"Feature": ordered_features, "Importance": ranks[ordered_features].values},
-        index=range(len(ordered_features)),
-    )
+    return result.ranking(feats)
@@ -1,13 +1,43 @@
 import numpy as np
 import pandas as pd
+import xgboost as xgb
 
-# import shap  # not needed when using pred_contribs
-from pandas.api.types import is_numeric_dtype
-from xgboost import DMatrix, XGBClassifier
+from app.utils.algorithm_utils import FeatureMatrix, split_xy
+from app.utils.beta_quant import dequantize, is_quantized
+
+# Bound on the float32 rows or SHAP contributions held per batch
+BATCH_BYTES = 256 * 2**20
+
+
+def _float_rows(X: np.ndarray, rows) -> np.ndarray:
+    """float32 X[rows] (NaN for missing), dequantizing uint16 codes."""
+    if is_quantized(X):
+        return dequantize(X[rows])
+    return np.asarray(X[rows], dtype=np.float32)
+
+
+class _RowBatches(xgb.DataIter):
+    """Feeds X to a QuantileDMatrix a few rows at a time (no full copy)."""
+
+    def __init__(self, X: np.ndarray, y: np.ndarray, batch_rows: int):
+        self.X, self.y, self.batch_rows = X, y, batch_rows
+        self.start = 0
+        super().__init__()
+
+    def next(self, input_data) -> bool:
+        if self.start >= self.X.shape[0]:
+            return False
+        rows = slice(self.start, self.start + self.batch_rows)
+        input_data(data=_float_rows(self.X, rows), label=self.y[rows])
+        self.start += self.batch_rows
+        return True
+
+    def reset(self):
+        self.start = 0
 
 
 def shap_xgboost(
-    df: pd.DataFrame,
+    df: pd.DataFrame | FeatureMatrix,
     *,
     label_col: str = "Prognosis",
     # XGBoost params
@@ -22,6 +52,8 @@ def shap_xgboost(
     n_jobs: int = -1,
     # SHAP speed knob (rows only; ALL features are still ranked)
     shap_sample_size: int = 2000,
+    # Memory bound of each row batch (training input and SHAP contributions)
+    batch_bytes: int = BATCH_BYTES,
 ) -> pd.DataFrame:
     """
     Train XGBoost, compute SHAP via XGBoost's native TreeSHAP (pred_contribs=True),
@@ -33,73 +65,70 @@ def shap_xgboost(
     Assumes:
       - df[label_col] is already encoded (ints 0..K-1)
       - feature columns are numeric
-    """
-    if label_col not in df.columns:
-        raise ValueError(f"Label column '{label_col}' not found.")
+      - or a FeatureMatrix; uint16 quantized X is dequantized batch by batch
 
-    y = df[label_col].to_numpy()
-    X = df.drop(columns=[label_col])
-
-    if not np.issubdtype(y.dtype, np.number):
-        raise ValueError(f"'{label_col}' must be numeric/encoded already.")
-    nonnum = [c for c in X.columns if not is_numeric_dtype(X[c])]
-    if nonnum:
-        raise ValueError(f"Non-numeric feature columns found: {nonnum}.")
+    Training reads X in row batches into one float32 QuantileDMatrix (binned
+    values only); SHAP rows are binned against the same cuts and their
+    contributions computed batch by batch, accumulating sum |SHAP| per
+    feature, so memory stays bounded for any number of CpGs and classes.
+    """
+    X, y, feats = split_xy(df, label_col)
+    n_rows, n_feats = X.shape
 
     classes = np.unique(y)
     if len(classes) < 2:
         raise ValueError("Need at least two classes in the target.")
 
     # Choose objective
+    params = {
+        "max_depth": max_depth,
+        "learning_rate": learning_rate,
+        "subsample": subsample,
+        "colsample_bytree": colsample_bytree,
+        "reg_lambda": reg_lambda,
+        "reg_alpha": reg_alpha,
+        "seed": random_state,
+        "nthread": n_jobs,
+        "tree_method": "hist",
+        "verbosity": 0,
+    }
     if len(classes) == 2:
-        objective, num_class, eval_metric = "binary:logistic", None, "logloss"
+        params |= {"objective": "binary:logistic", "eval_metric": "logloss"}
+        n_outputs = 1
     else:
-        objective, num_class, eval_metric = "multi:softprob", len(classes), "mlogloss"
-
-    # Fit with the DataFrame so feature names are preserved
-    model = XGBClassifier(
-        objective=objective,
-        num_class=num_class,
-        n_estimators=n_estimators,
-        max_depth=max_depth,
-        learning_rate=learning_rate,
-        subsample=subsample,
-        colsample_bytree=colsample_bytree,
-        reg_lambda=reg_lambda,
-        reg_alpha=reg_alpha,
-        random_state=random_state,
-        n_jobs=n_jobs,
-        eval_metric=eval_metric,
-        tree_method="hist",
-        verbosity=0,
-    )
-    model.fit(X, y)
+        params |= {
+            "objective": "multi:softprob",
+            "num_class": len(classes),
+            "eval_metric": "mlogloss",
+        }
+        n_outputs = len(classes)
+
+    # Train on binned float32 rows, built once from row batches
+    batch_rows = max(1, batch_bytes // (4 * n_feats))
+    dtrain = xgb.QuantileDMatrix(_RowBatches(X, y, batch_rows), missing=np.nan)
+    booster = xgb.train(params, dtrain, num_boost_round=n_estimators)
 
     # Optional row subsample for SHAP speed
-    if shap_sample_size is not None and X.shape[0] > shap_sample_size:
+    if shap_sample_size is not None and n_rows > shap_sample_size:
         rng = np.random.RandomState(random_state)
-        idx = rng.choice(X.shape[0], shap_sample_size, replace=False)
-        X_shap = X.iloc[idx, :]
-    else:
-        X_shap = X
-
-    # ---- Compute SHAP via XGBoost's native TreeSHAP ----
-    booster = model.get_booster()
-    dmat = DMatrix(X_shap.values, feature_names=X.columns.tolist())
-    contribs = booster.predict(dmat, pred_contribs=True)
-    contribs = np.asarray(contribs)
-
-    # Drop the last column = bias/base value and aggregate
-    if contribs.ndim == 2:
-        # (n_samples, n_features + 1)
-        shap_vals = contribs[:, :-1]
-        mean_abs_shap = np.mean(np.abs(shap_vals), axis=0)
-    elif contribs.ndim == 3:
-        # (n_samples, n_classes, n_features + 1)
-        shap_vals = contribs[..., :-1]
-        mean_abs_shap = np.mean(np.abs(shap_vals), axis=(0, 1))
+        shap_rows = np.sort(rng.choice(n_rows, shap_sample_size, replace=False))
     else:
-        raise RuntimeError(f"Unexpected pred_contribs shape: {contribs.shape}")
+        shap_rows = np.arange(n_rows)
+
+    # ---- SHAP via XGBoost's native TreeSHAP, one bounded batch at a time ----
+    # each batch returns (rows, [classes,] features + 1) float32 contributions
+    batch_rows = max(1, batch_bytes // (4 * n_outputs * (n_feats + 1)))
+    abs_shap_sum = np.zeros(n_feats)
+    for start in range(0, len(shap_rows), batch_rows):
+        rows = shap_rows[start : start + batch_rows]
+        dbatch = xgb.QuantileDMatrix(_float_rows(X, rows), missing=np.nan, ref=dtrain)
+        contribs = np.asarray(booster.predict(dbatch, pred_contribs=True))
+        if contribs.ndim not in (2, 3):
+            raise RuntimeError(f"Unexpected pred_contribs shape: {contribs.shape}")
+        # Drop the last column = bias/base value and aggregate
+        contribs = contribs.reshape(-1, contribs.shape[-1])[:, :-1]
+        abs_shap_sum += np.abs(contribs).sum(axis=0, dtype=np.float64)
+    mean_abs_shap = abs_shap_sum / (len(shap_rows) * n_outputs)
 
     if mean_abs_shap.shape[0] != X.shape[1]:
         raise RuntimeError(
@@ -108,11 +137,7 @@ def shap_xgboost(
 
     # Gain vector aligned to columns (0 for features never used in splits)
     fscore_gain = booster.get_score(importance_type="gain")  # dict: {name: gain}
-    xgb_names = booster.feature_names or [f"f{i}" for i in range(X.shape[1])]
-    if xgb_names == list(X.columns):
-        name_to_idx = {name: i for i, name in enumerate(X.columns)}
-    else:
-        name_to_idx = {f"f{i}": i for i in range(X.shape[1])}
+    name_to_idx = {f"f{i}": i for i in range(X.shape[1])}
 
     gain_vec = np.zeros(X.shape[1], dtype=float)
     for name, g in fscore_gain.items():
@@ -125,5 +150,5 @@ def shap_xgboost(
 
     # Return DF with the exact same order
     return pd.DataFrame(
-        {"Feature": X.columns[order].tolist(), "Importance": mean_abs_shap[order]}
+        {"Feature": feats[order].tolist(), "Importance": mean_abs_shap[order]}
     )
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from app.utils.algorithm_utils import FeatureMatrix, split_xy
+from app.utils.univariate_stats import univariate_test
+
+
+def welch_ttest(
+    df: pd.DataFrame | FeatureMatrix, *, label_col: str = "Prognosis"
+) -> pd.DataFrame:
+    """
+    Rank ALL features (best → worst) with Welch's test, which unlike the
+    ANOVA F-test does not assume equal variances across classes:
+      - binary: Welch's two-sample t-test (statistic reported as t^2)
+      - multiclass: Welch's ANOVA
+
+    Features are ordered by p-value (Welch's degrees of freedom differ per
+    feature, so the statistic alone is not comparable); Importance is
+    -log10(p).
+    """
+    X, y, feats = split_xy(df, label_col)
+    return univariate_test(X, y, "welch").ranking(feats)
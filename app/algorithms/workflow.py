@@ -4,9 +4,11 @@ import numpy as np
 import pandas as pd
 from pandas.api.types import is_numeric_dtype
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.feature_selection import RFE, f_classif
-from sklearn.linear_model import LogisticRegression
-from sklearn.svm import LinearSVC
+
+from app.utils.csv_engine import InvalidCsvError, read_frame
+from app.utils.lasso_path import lasso_path
+from app.utils.svm_rfe import RFERound, svm_rfe
+from app.utils.univariate_stats import univariate_test
 
 
 class Notify(ABC):
@@ -22,6 +24,10 @@ class Notify(ABC):
     def error(self, message: str):
         self(message)
 
+    def progress(self, message: str, progress: int, **meta):
+        """Progress of a long step (0-100); plain notifiers just log it."""
+        self.info(message)
+
 
 class NotifyCeleryTask(Notify):
     def __init__(self, notifier):
@@ -45,6 +51,13 @@ class NotifyCeleryTask(Notify):
                 state="PROCESSING", meta={"status": message, "progress": 50}
             )
 
+    def progress(self, message: str, progress: int, **meta):
+        if self.notifier:
+            self.notifier.update_state(
+                state="PROCESSING",
+                meta={"status": message, "progress": progress, **meta},
+            )
+
 
 class NotifyPrint(Notify):
     def info(self, message: str):
@@ -64,11 +77,13 @@ def csv2df(csv_path: str, notify: Notify) -> pd.DataFrame:
     """
     notify.info("Reading CSV file...")
     try:
-        df = pd.read_csv(csv_path, encoding="utf-8", on_bad_lines="skip")
-    except UnicodeDecodeError:
-        df = pd.read_csv(csv_path, encoding="latin-1", on_bad_lines="skip")
-    except pd.errors.EmptyDataError:
-        raise ValueError("CSV file is empty or has no valid data")
+        try:
+            df = read_frame(csv_path, encoding="utf-8")
+        except InvalidCsvError:
+            # latin-1 decodes any bytes, so this only fails on the CSV itself
+            df = read_frame(csv_path, encoding="latin-1")
+    except InvalidCsvError as e:
+        raise ValueError(f"CSV file is empty or has no valid data: {str(e)}")
     except Exception as e:
         raise ValueError(f"Error reading CSV file: {str(e)}")
 
@@ -119,7 +134,8 @@ def xy_anova_ftest(
     X: pd.DataFrame, y: pd.Series, notify: Notify = NotifyPrint()
 ) -> pd.DataFrame:
     notify.info("Performing ANOVA F-test...")
-    F, p = f_classif(X.values, y)
+    result = univariate_test(X.to_numpy(), y, "anova")
+    F, p = result.statistic, result.pvalue
     # Clean up edge cases (constant features, etc.)
     F = np.nan_to_num(F, nan=0.0, posinf=0.0, neginf=0.0)
     p = np.nan_to_num(p, nan=1.0, posinf=1.0, neginf=1.0)
@@ -136,61 +152,25 @@ def xy_lasso_lrc(
     y: pd.Series,
     *,
     C: float = 0.5,
+    n_steps: int = 12,
     max_iter: int = 8000,
     tol: float = 1e-3,
     class_weight: str = "balanced",
     random_state: int = 0,
     notify: Notify = NotifyPrint(),
 ):
-    clf = LogisticRegression(
-        penalty="l1",
-        solver="saga",
+    notify.info("Fitting Lasso Logistic Regression path...")
+    path = lasso_path(
+        X.to_numpy(),
+        y,
         C=C,
+        n_steps=n_steps,
         max_iter=max_iter,
         tol=tol,
         class_weight=class_weight,
         random_state=random_state,
-        fit_intercept=True,
-    )
-    notify.info("Fitting Lasso Logistic Regression...")
-    clf.fit(X.values, y)
-
-    W = clf.coef_
-    coef_score = np.abs(W) if W.ndim == 1 else np.linalg.norm(W, axis=0)
-
-    Xv = X.values.astype(float)
-    n = Xv.shape[0]
-    Xc = Xv - Xv.mean(axis=0, keepdims=True)
-    Xs = Xv.std(axis=0, ddof=1, keepdims=True)
-    Xs[Xs == 0] = 1.0
-
-    classes = np.unique(y)
-
-    if len(classes) == 2:
-        yb = y.astype(float)
-        yc = yb - yb.mean()
-        ys = yb.std(ddof=1) or 1.0
-        corr = (Xc.T @ yc) / ((n - 1) * (Xs.ravel() * ys))
-        tie_score = np.abs(corr)
-    else:
-        tie_score = np.zeros(X.shape[1], dtype=float)
-        for c in classes:
-            yc = (y == c).astype(float)
-            yc = yc - yc.mean()
-            ys = yc.std(ddof=1)
-            if ys == 0:
-                continue
-            corr_c = (Xc.T @ yc) / ((n - 1) * (Xs.ravel() * ys))
-            tie_score = np.maximum(tie_score, np.abs(corr_c))
-
-    coef_score = np.asarray(coef_score).reshape(-1)
-    tie_score = np.asarray(tie_score).reshape(-1)
-    feats = np.array(X.columns)
-
-    order_idx = np.lexsort((feats, -tie_score, -coef_score))
-    return pd.DataFrame(
-        {"Feature": feats[order_idx], "Importance": coef_score[order_idx]}
     )
+    return path.ranking(np.array(X.columns))
 
 
 def xy_random_forest_varimp(
@@ -241,7 +221,8 @@ def xy_rfe_svm(
     y: pd.Series,
     *,
     C: float = 0.1,
-    step: float = 0.99,
+    step: float = 0.5,
+    top_k: int = 100,
     tol: float = 5e-2,
     random_state: int = 0,
     max_iter: int = 5000,
@@ -250,33 +231,28 @@ def xy_rfe_svm(
     notify: Notify = NotifyPrint(),
 ) -> pd.DataFrame:
     notify.info("Fitting RFE + Linear SVM...")
-    X = X.to_numpy(dtype=np.float32, copy=False)
-    n_samples, n_features = X.shape
-    # For p >> n, dual=True is appropriate (LinearSVC uses liblinear)
-    dual_flag = True if n_features >= n_samples else False
 
-    est = LinearSVC(
-        dual=dual_flag,
+    def report(rfe_round: RFERound):
+        notify.progress(
+            f"RFE round {rfe_round.round}/{rfe_round.n_rounds}: "
+            f"{rfe_round.remaining} features left",
+            progress=rfe_round.round * 100 // rfe_round.n_rounds,
+        )
+
+    result = svm_rfe(
+        X.to_numpy(dtype=np.float32, copy=False),
+        y,
         C=C,
-        tol=tol,
         loss=loss,
         class_weight=class_weight,
-        random_state=random_state,
+        tol=tol,
         max_iter=max_iter,
+        step=step,
+        top_k=top_k,
+        random_state=random_state,
+        on_round=report,
     )
-    # n_features_to_select=1 => compute a full ranking (keeps all features)
-    rfe = RFE(estimator=est, n_features_to_select=1, step=step)
-    rfe.fit(X, y)
-
-    ranks = pd.Series(
-        rfe.ranking_, index=X.columns, name="RFE_rank"
-    ).sort_values()  # 1 = best
-    ordered_features = ranks.index.tolist()
-
-    return pd.DataFrame(
-        {"Feature": ordered_features, "Importance": ranks[ordered_features].values},
-        index=range(len(ordered_features)),
-    )
+    return result.ranking(np.array(X.columns))
 
 
 def workflow(
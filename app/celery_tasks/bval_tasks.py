@@ -5,6 +5,7 @@ from typing import Any, Dict, List
 
 import docker
 from app.config import cnf
+from app.utils.blob_store import recorded_sha1
 
 from .celery import app
 
@@ -32,12 +33,22 @@ def process_uploaded_files(
             "start_time": time.time(),
         }
 
+        # A previous run's CSV is a hardlink to a read-only blob, shared with
+        # fs/dmp: the pipeline must write a new file, not overwrite it
+        out_csv = Path(storage_dir) / "out" / "bval_data.csv"
+        out_csv.unlink(missing_ok=True)
+        out_csv.with_name(f"{out_csv.name}.sha1").unlink(missing_ok=True)
+
         # Docker processing with better error handling
         docker_result = run_docker_processing(
             storage_dir=storage_dir, command=["idat_preprocessor.R"]
         )
         results["docker_processing"] = docker_result
 
+        # Hash the beta CSV now, so promoting it to fs/dmp needs no re-read
+        if docker_result.get("status") == "success" and out_csv.exists():
+            results["bval_csv_sha1"] = recorded_sha1(out_csv)
+
         # Final state update
         self.update_state(
             state="SUCCESS",
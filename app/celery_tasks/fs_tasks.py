@@ -14,7 +14,11 @@ from ..cpg2gene.cpg_gene_mapping import (
 )
 
 # from ..algorithms.selector import ALGORITHMS
-from ..services.get_algorithms import get_algorithm
+from ..services.get_algorithms import (
+    accepts_quantized,
+    get_algorithm,
+    reports_progress,
+)
 from .celery import app
 
 PROGNOSIS_COLUMN = cnf.prognosis_column_name
@@ -53,24 +57,32 @@ def process_prognosis_algorithm(
     Run feature ranking algorithm on selected prognosis values.
     This is a heavy task that processes the data and generates feature rankings.
     """
+    partial_path = None
     try:
         algorithm_func = get_algorithm(algorithm)
 
+        # Create output filename
+        output_filename, output_path, json_path, plot_path = generate_output_paths(
+            storage_dir, selected_prognosis, algorithm, keep_features
+        )
+        # Long-running rankings publish their partial ranking next to the result
+        if reports_progress(algorithm):
+            partial_path = output_path.with_name(f"{output_filename}.partial")
+
         results = fs_wrapper(
             algorithm=algorithm_func,
             csv_path=file_path,
             selected_prognosis=selected_prognosis,
             parent=self,
+            quantized=accepts_quantized(algorithm),
+            partial_path=partial_path,
         )
         notify_progress(self, "Saving  results", 80)
 
-        # Create output filename
-        output_filename, output_path, json_path, plot_path = generate_output_paths(
-            storage_dir, selected_prognosis, algorithm, keep_features
-        )
-
-        pca_plot = pca.pca_plot(
-            df=results["df"],
+        pca_plot = pca.pca_plot_matrix(
+            results["data"].X,
+            results["labels"],
+            results["data"].features,
             conditions=selected_prognosis,
             fs_algorithm_name=algorithm,
             selected_features=results["feature_ranking"]["Feature"]
@@ -125,6 +137,10 @@ def process_prognosis_algorithm(
             self, selected_prognosis, algorithm, str(exc), type(exc).__name__
         )
         raise
+    finally:
+        # superseded by the result, or stale after a failure
+        if partial_path is not None:
+            partial_path.unlink(missing_ok=True)
 
 
 def notify_failure(self, selected_prognosis, algorithm, error_msg, exc_type):
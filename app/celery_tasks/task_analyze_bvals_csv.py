@@ -5,17 +5,46 @@ from pathlib import Path
 import pandas as pd
 
 from app.config import cnf
+from app.utils.beta_csv import iter_cpg_ids, read_beta_header
+from app.utils.beta_store import write_beta_store
+from app.utils.blob_store import link_derived, share_derived
+from app.utils.dataset_profile import build_profile, write_profile
 from app.utils.json_utils import serialize_for_json
 
-from ..cpg2gene.cpg_gene_mapping import (
-    guess_illumina_array_type_pd,
-)
+from ..cpg2gene.cpg_gene_mapping import ArrayTypeMatcher
 
 # from ..algorithms.selector import ALGORITHMS
 from .celery import app
 
 PROGNOSIS_COLUMN = cnf.prognosis_column_name
 OUT = cnf.fs_outdir_name
+STORE = cnf.beta_store_dir_name
+# derived from the CSV alone, so shared by every workdir holding that CSV
+SHARED_ARTIFACTS = [cnf.profile_file, cnf.metadata_file]
+
+
+@app.task(bind=True)
+def task_build_beta_store(
+    self, file_path: str, storage_dir: str, sha1_hash: str | None = None
+):
+    """
+    Convert the uploaded CSV into the binary beta store.
+
+    Runs after the analysis so the dataset is usable right away; until the
+    store exists, feature selection falls back to parsing the CSV. A store
+    already built for the same CSV (e.g. by the other module) is linked.
+    """
+    if sha1_hash and link_derived(sha1_hash, storage_dir, [STORE]):
+        return {"path": str(Path(storage_dir) / STORE), "shared": True}
+
+    self.update_state(
+        state="PROCESSING",
+        meta={"status": "Building binary beta store", "progress": 0},
+    )
+    info = write_beta_store(file_path, storage_dir)
+    if sha1_hash:
+        share_derived(sha1_hash, storage_dir, [STORE])
+    return info
 
 
 @app.task(bind=True)
@@ -35,46 +64,11 @@ def task_analyze_bvals_csv(self, file_path: str, sha1_hash: str, storage_dir: st
         if not file_path_obj.exists():
             raise FileNotFoundError(f"CSV file not found: {file_path}")
 
-        # Read CSV file
-        try:
-            df = pd.read_csv(file_path_obj, index_col=0)
-        except Exception as e:
-            raise ValueError(f"Error reading CSV file: {str(e)}")
+        # Header + prognosis row only; beta values are never parsed here
+        samples, labels = read_beta_header(file_path_obj)
 
-        self.update_state(
-            state="PROCESSING",
-            meta={"status": "Analyzing CSV structure", "progress": 30},
-        )
-
-        # STRICT VALIDATION: First row must contain prognosis values (transposed structure)
-        if len(df) < 1:
-            raise ValueError(
-                "CSV file must contain at least 1 row with prognosis values (transposed structure: columns=samples, rows=CpG sites)"
-            )
-
-        # Get first row which should contain prognosis values
-        first_row = df.iloc[0]  # First row
-
-        # Handle CSV with index column (like "Unnamed: 0") - check if first cell is "Prognosis"
-        first_cell_value = str(first_row.iloc[0])
-
-        if first_cell_value == PROGNOSIS_COLUMN:
-            # First cell is "Prognosis" identifier in index column, actual values start from column 1
-            prognosis_values = first_row.iloc[1:].dropna()  # Skip index column
-        else:
-            # Check if this might be a CSV with row labels column
-            # Look for "Prognosis" in first column (index/row labels)
-            if hasattr(df, "index") and len(df.index) > 0:
-                first_index_value = str(df.index[0])
-                if first_index_value == PROGNOSIS_COLUMN:
-                    # Row index contains "Prognosis", use all column values from first row
-                    prognosis_values = first_row.dropna()
-                else:
-                    # Neither first cell nor first index is "Prognosis", this might not be the expected format
-                    prognosis_values = first_row.dropna()  # Try using all values anyway
-            else:
-                # First cell is already a prognosis value, use all values
-                prognosis_values = first_row.dropna()
+        prognosis_values = pd.Series(labels)
+        prognosis_values = prognosis_values[prognosis_values.str.strip() != ""]
 
         if len(prognosis_values) == 0:
             raise ValueError(
@@ -83,24 +77,28 @@ def task_analyze_bvals_csv(self, file_path: str, sha1_hash: str, storage_dir: st
 
         self.update_state(
             state="PROCESSING",
-            meta={"status": "Guessing Illumina array type", "progress": 30},
+            meta={"status": "Guessing Illumina array type", "progress": 20},
         )
 
-        # print(df.head())
+        # Stream the first column only, matching CpG ids block by block
+        matcher = ArrayTypeMatcher()
+        n_cpgs = 0
+        for cpg_ids in iter_cpg_ids(file_path_obj):
+            matcher.update(cpg_ids)
+            n_cpgs += len(cpg_ids)
 
-        illumina_types = guess_illumina_array_type_pd(
-            df.index[1:] if len(df) > 1 else pd.Index([])
-        )
+        illumina_types = matcher.array_types
 
         result = {
             "sha1_hash": sha1_hash,
             "filename": file_path_obj.name,
             "file_size": int(file_path_obj.stat().st_size),
-            "rows": int(len(df)),  # Number of CpG sites (plus prognosis row)
-            "columns": int(len(df.columns)),  # Number of samples
+            "rows": int(n_cpgs + 1),  # Number of CpG sites (plus prognosis row)
+            "columns": int(len(samples)),  # Number of samples
             "prognosis_column": "First row (transposed structure)",
             "analysis_time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
             "detected_illumina_array_types": illumina_types,
+            "array_type_overlap": matcher.overlap,
             "structure_type": "transposed",  # Document the structure type
         }
 
@@ -112,7 +110,7 @@ def task_analyze_bvals_csv(self, file_path: str, sha1_hash: str, storage_dir: st
             {
                 "prognosis_unique_values": [str(val) for val in sorted(unique_values)],
                 "prognosis_value_counts": int(len(unique_values)),
-                "prognosis_null_count": 0,  # We already filtered out NaN values
+                "prognosis_null_count": int(len(labels) - len(prognosis_values)),
                 "prognosis_distribution": {
                     str(k): int(v) for k, v in value_counts.items()
                 },
@@ -124,11 +122,35 @@ def task_analyze_bvals_csv(self, file_path: str, sha1_hash: str, storage_dir: st
             meta={"status": "Saving analysis results", "progress": 80},
         )
 
+        # Profile lets the prognosis-values endpoints skip the CSV entirely
+        write_profile(
+            storage_dir,
+            build_profile(
+                filename=file_path_obj.name,
+                file_size=result["file_size"],
+                n_cpgs=n_cpgs,
+                labels=labels.tolist(),  # every sample, blank labels included
+                array_types=illumina_types,
+                matrix_bytes=len(samples) * n_cpgs * 4,
+            ),
+        )
+
         # Save analysis results to JSON file normally analysis42.json
+        # Written to a new file and renamed over: the old one may be hardlinked
+        # into other datasets (share_derived) and must not change under them
         analysis_file = Path(storage_dir) / cnf.metadata_file
-        with open(analysis_file, "w") as f:
+        tmp = analysis_file.with_name(f"{analysis_file.name}.tmp")
+        with open(tmp, "w") as f:
             # Use serialize_for_json to ensure all data types are JSON-compatible
             json.dump(serialize_for_json(result), f, indent=2, default=str)
+        tmp.replace(analysis_file)
+        share_derived(sha1_hash, storage_dir, SHARED_ARTIFACTS)
+
+        # The full parse into the binary store happens off the critical path;
+        # it is queued only once the analysis and profile are on disk
+        result["beta_store_task_id"] = task_build_beta_store.delay(
+            str(file_path_obj), str(storage_dir), sha1_hash
+        ).id
 
         self.update_state(
             state="SUCCESS",
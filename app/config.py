@@ -31,31 +31,51 @@ class Config:
     prefix_bval = f"/{bval}"
     prefix_dmp = f"/{dmp}"
     prefix_fs = f"/{fs}"
+    prefix_uploads = "/uploads"
 
     bval_workdir: Path = workdir / bval  # Beta value calculation
     dmp_workdir: Path = workdir / dmp  # Differential Methylation Analysis
     fs_workdir: Path = workdir / fs  # Feature selection
+    # uploads are staged here, on the same filesystem, then renamed into place
+    upload_tmpdir: Path = workdir / "tmp"
+    # resumable (chunked) uploads in progress, see upload_sessions
+    upload_session_dir: Path = upload_tmpdir / "sessions"
+    # content-addressed uploads shared by bval, fs and dmp (see blob_store)
+    blob_dir: Path = workdir / "blobs"
     # those are subdirectories under the sha1_hash directory
     # e.g. workdir/fs/<sha1_hash>/fsout
     bval_outdir_name: str = os.getenv("BVAL_OUT_DIR", "bvalout")
     dmp_outdir_name: str = os.getenv("DMP_OUT_DIR", "dmpout")
     fs_outdir_name: str = os.getenv("FS_OUT_DIR", "fsout")
+    # binary copy of the uploaded beta matrix, e.g. workdir/fs/<sha1_hash>/bstore
+    beta_store_dir_name: str = os.getenv("BETA_STORE_DIR", "bstore")
+    # also keep a uint16 quantized copy of the matrix (half the size of float32)
+    beta_store_quantized: bool = os.getenv("BETA_STORE_QUANTIZED", "false") == "true"
 
     bval_allowed_extensions = {".idat", ".csv"}
-    fs_allowed_extensions = {".csv"}
+    # gzip / zstd uploads are decompressed while streaming to disk
+    fs_allowed_extensions = {".csv", ".csv.gz", ".csv.zst"}
+    # "auto" uses pyarrow's multi-threaded reader when installed, else pandas
+    csv_engine: str = os.getenv("CSV_ENGINE", "auto")
     r_docker_image: str = os.getenv("R_DOCKER_IMAGE", "konlaz/r-analysis")
 
     manifest_csv = [f"{name}.csv" for name in _MANIFESTS.values()]
     manifest_pkl = [f"{name}.pkl" for name in _MANIFESTS.values()]
     pkl_files = {key: PKL_DIR / f"{name}.pkl" for key, name in _MANIFESTS.items()}
+    # hashed probe ids of all platforms, built by pkl/create_pkl.py
+    probe_index_file: Path = PKL_DIR / "probe_index.npz"
+    # an upload is of a platform when this fraction of its CpGs is on it
+    array_type_min_overlap: float = float(os.getenv("ARRAY_TYPE_MIN_OVERLAP", "0.95"))
 
     metadata_file: str = os.getenv("METADATA_FILE", "analysis42.json")
+    profile_file: str = os.getenv("PROFILE_FILE", "profile.json")
 
     def create_directories(self):
         self.workdir.mkdir(parents=True, exist_ok=True)
         self.bval_workdir.mkdir(parents=True, exist_ok=True)
         self.fs_workdir.mkdir(parents=True, exist_ok=True)
         self.dmp_workdir.mkdir(parents=True, exist_ok=True)
+        self.upload_tmpdir.mkdir(parents=True, exist_ok=True)
 
 
 cnf = Config()
@@ -0,0 +1,197 @@
+"""
+Memory-mappable copy of a platform's CpG -> gene annotation.
+
+The pickles in pkl/ must be unpickled into private memory by every worker.
+pkl/create_pkl.py therefore also writes, next to each `<name>.pkl`:
+
+    <name>/
+        cpgs.npy        CpG ids, fixed-width bytes, sorted and unique
+        genes.npy       int32 code of each CpG's GeneName, -1 for none
+        gene_names.npy  distinct GeneName strings (the codes' categories)
+        cpg_hashes.npy  sorted uint64 hashes of the CpG ids (hash_probe_ids)
+        cpg_hash_rows.npy  row in cpgs.npy of every hash
+        gene_indptr.npy, gene_indices.npy, symbols.npy
+                        CpG x gene incidence in CSR form: GeneName fields
+                        list several genes ("A;B;A"), split into `symbols`
+        chroms.npy, chrom_offsets.npy, positions.npy, position_rows.npy
+                        interval index: positions sorted within every
+                        chromosome, chroms[i] spanning offsets[i]:offsets[i+1],
+                        with the cpgs.npy row of each (manifests with
+                        coordinates only)
+
+All arrays are opened read-only with mmap_mode="r", so the API process and
+every Celery worker share one page-cached copy and loading is near instant.
+Lookups hash the requested ids and binary search `cpg_hashes.npy` instead of
+building a hash table.
+"""
+
+import shutil
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+CPGS_FILE = "cpgs.npy"
+GENES_FILE = "genes.npy"
+GENE_NAMES_FILE = "gene_names.npy"
+HASHES_FILE = "cpg_hashes.npy"
+HASH_ROWS_FILE = "cpg_hash_rows.npy"
+INDPTR_FILE = "gene_indptr.npy"
+INDICES_FILE = "gene_indices.npy"
+SYMBOLS_FILE = "symbols.npy"
+CHROMS_FILE = "chroms.npy"
+CHROM_OFFSETS_FILE = "chrom_offsets.npy"
+POSITIONS_FILE = "positions.npy"
+POSITION_ROWS_FILE = "position_rows.npy"
+
+STORE_FILES = (CPGS_FILE, GENES_FILE, GENE_NAMES_FILE, HASHES_FILE, HASH_ROWS_FILE)
+INCIDENCE_FILES = (INDPTR_FILE, INDICES_FILE, SYMBOLS_FILE)
+COORDINATE_FILES = (CHROMS_FILE, CHROM_OFFSETS_FILE, POSITIONS_FILE, POSITION_ROWS_FILE)
+# optional coordinate columns of the pickles (see pkl/create_pkl.py)
+CHROM_COLUMN = "chr"
+POS_COLUMN = "pos"
+GENE_SEPARATOR = ";"
+
+
+def store_dir(pkl_path: str | Path) -> Path:
+    """The store lives next to the pickle it mirrors, e.g. pkl/<name>/."""
+    return Path(pkl_path).with_suffix("")
+
+
+def has_annotation_store(directory: str | Path) -> bool:
+    return all((Path(directory) / name).exists() for name in STORE_FILES)
+
+
+def hash_probe_ids(cpg_ids: Iterable[str]) -> np.ndarray:
+    """Stable uint64 hash of every probe id (the same in every process)."""
+    if isinstance(cpg_ids, (set, frozenset)) or not hasattr(cpg_ids, "__len__"):
+        cpg_ids = list(cpg_ids)
+    return pd.util.hash_array(np.asarray(cpg_ids, dtype=object), categorize=False)
+
+
+def encode_cpgs(cpg_ids) -> np.ndarray:
+    """CpG ids as the fixed-width bytes the store is sorted by."""
+    cpg_ids = np.asarray(cpg_ids, dtype=str)
+    try:
+        return cpg_ids.astype("S")  # plain ASCII ids, much faster than encode
+    except UnicodeEncodeError:
+        return np.char.encode(cpg_ids, "utf-8")
+
+
+def annotation_arrays(df: pd.DataFrame) -> dict[str, np.ndarray]:
+    """
+    Store arrays of a CpG_site / GeneName table, sorted by CpG id, plus the
+    interval index when the table has chr / pos columns.
+    """
+    df = df.drop_duplicates("CpG_site")
+    ids = df["CpG_site"].astype(str).to_numpy(dtype=object)
+    cpgs = encode_cpgs(ids)
+    genes = pd.Categorical(df["GeneName"])
+    order = np.argsort(cpgs, kind="stable")
+    hashes = hash_probe_ids(ids[order])
+    hash_order = np.argsort(hashes)
+    arrays = {
+        CPGS_FILE: cpgs[order],
+        GENES_FILE: genes.codes[order].astype(np.int32),
+        GENE_NAMES_FILE: genes.categories.to_numpy(dtype=str),
+        HASHES_FILE: hashes[hash_order],
+        HASH_ROWS_FILE: hash_order.astype(np.int32),
+    }
+    if CHROM_COLUMN in df.columns and POS_COLUMN in df.columns:
+        arrays |= coordinate_arrays(
+            df[CHROM_COLUMN].to_numpy(dtype=object)[order],
+            pd.to_numeric(df[POS_COLUMN], errors="coerce").to_numpy(dtype=float)[order],
+        )
+    return arrays
+
+
+def coordinate_arrays(
+    chroms: np.ndarray, positions: np.ndarray
+) -> dict[str, np.ndarray]:
+    """Interval index of the CpG rows that have a chromosome and position."""
+    rows = np.flatnonzero(pd.notna(chroms) & pd.notna(positions))
+    codes, names = pd.factorize(pd.Series(chroms[rows]).astype(str), sort=True)
+    positions = positions[rows].astype(np.int64)
+    order = np.lexsort((positions, codes))
+    return {
+        CHROMS_FILE: np.asarray(names, dtype=str),
+        CHROM_OFFSETS_FILE: np.searchsorted(codes[order], np.arange(len(names) + 1)),
+        POSITIONS_FILE: positions[order],
+        POSITION_ROWS_FILE: rows[order].astype(np.int32),
+    }
+
+
+def incidence_arrays(
+    gene_codes: np.ndarray, gene_names: np.ndarray
+) -> dict[str, np.ndarray]:
+    """
+    CSR arrays of the CpG x gene incidence matrix (rows in `cpgs` order).
+
+    Each distinct GeneName is split once; every CpG row is then the row of
+    its GeneName code, with an extra empty row for CpGs without a gene.
+    """
+    split = [
+        sorted(set(filter(None, name.split(GENE_SEPARATOR)))) for name in gene_names
+    ]
+    symbols = sorted({gene for genes in split for gene in genes})
+    column = {gene: i for i, gene in enumerate(symbols)}
+    name_lengths = np.array([len(genes) for genes in split] + [0], dtype=np.int64)
+    name_columns = np.array(
+        [column[gene] for genes in split for gene in genes], dtype=np.int32
+    )
+    name_indptr = np.concatenate([[0], np.cumsum(name_lengths)])
+
+    rows = np.where(gene_codes >= 0, gene_codes, len(split))
+    lengths = name_lengths[rows]
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    # column positions of every CpG's genes inside name_columns
+    offsets = np.arange(indptr[-1]) - np.repeat(
+        indptr[:-1] - name_indptr[rows], lengths
+    )
+    return {
+        INDPTR_FILE: indptr,
+        INDICES_FILE: name_columns[offsets],
+        SYMBOLS_FILE: np.asarray(symbols, dtype=str),
+    }
+
+
+def write_annotation_store(df: pd.DataFrame, directory: str | Path) -> Path:
+    final_dir = Path(directory)
+    tmp_dir = final_dir.with_name(f"{final_dir.name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    arrays = annotation_arrays(df)
+    arrays |= incidence_arrays(arrays[GENES_FILE], arrays[GENE_NAMES_FILE])
+    for name, array in arrays.items():
+        np.save(tmp_dir / name, array)
+
+    # Swap in atomically so workers never map a half written store
+    shutil.rmtree(final_dir, ignore_errors=True)
+    tmp_dir.rename(final_dir)
+    return final_dir
+
+
+def open_annotation_store(directory: str | Path) -> dict[str, np.ndarray]:
+    """Read-only memmaps of the store arrays."""
+    directory = Path(directory)
+    if not has_annotation_store(directory):
+        raise FileNotFoundError(f"Annotation store not found: {directory}")
+    return {name: np.load(directory / name, mmap_mode="r") for name in STORE_FILES}
+
+
+def _open_optional(directory: str | Path, names: tuple[str, ...]):
+    directory = Path(directory)
+    if not all((directory / name).exists() for name in names):
+        return None
+    return {name: np.load(directory / name, mmap_mode="r") for name in names}
+
+
+def open_incidence(directory: str | Path) -> dict[str, np.ndarray] | None:
+    """Read-only memmaps of the incidence arrays (None for older stores)."""
+    return _open_optional(directory, INCIDENCE_FILES)
+
+
+def open_coordinates(directory: str | Path) -> dict[str, np.ndarray] | None:
+    """Read-only memmaps of the interval index (None without coordinates)."""
+    return _open_optional(directory, COORDINATE_FILES)
@@ -1,19 +1,108 @@
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterable, Sequence
 
+import numpy as np
 import pandas as pd
 
 from app.config import cnf
+from app.cpg2gene.annotation_store import (
+    CPGS_FILE,
+    GENE_NAMES_FILE,
+    GENES_FILE,
+    HASH_ROWS_FILE,
+    HASHES_FILE,
+    annotation_arrays,
+    has_annotation_store,
+    hash_probe_ids,
+    open_annotation_store,
+    store_dir,
+)
+
+PROBE_INDEX_FILE = cnf.probe_index_file
+
+
+@dataclass(frozen=True)
+class Annotation:
+    """
+    CpG -> gene name table of one platform, indexed for ordered lookups.
+
+    Arrays come from the annotation store (usually read-only memmaps, see
+    annotation_store): N features are resolved by hashing them and binary
+    searching the sorted `hashes`; gene names are codes into the few distinct
+    `gene_names`.
+    """
+
+    array_type: str
+    cpgs: np.ndarray
+    gene_codes: np.ndarray
+    gene_names: np.ndarray
+    hashes: np.ndarray
+    hash_rows: np.ndarray
+
+    @property
+    def genes(self) -> pd.Categorical:
+        """GeneName of every CpG, in the order of `cpgs`."""
+        return pd.Categorical.from_codes(self.gene_codes, self.gene_names)
+
+    def positions(self, features: Sequence[str]) -> np.ndarray:
+        """Row of every feature in `cpgs`, -1 where it is not annotated."""
+        needles = hash_probe_ids(features)
+        positions = np.searchsorted(self.hashes, needles)
+        positions[positions == len(self.hashes)] = 0
+        found = self.hashes[positions] == needles
+        return np.where(found, self.hash_rows[positions], -1)
+
+    def lookup(self, features: Sequence[str]) -> pd.DataFrame:
+        """
+        CpG_site / GeneName rows in the exact order of `features`.
+
+        Features missing from the annotation keep their row with a NaN
+        GeneName, like annotated CpGs without a gene.
+        """
+        positions = self.positions(features)
+        codes = np.where(positions < 0, -1, self.gene_codes[positions])
+        return pd.DataFrame(
+            {
+                "CpG_site": np.asarray(features, dtype=object),
+                "GeneName": pd.Categorical.from_codes(codes, self.gene_names),
+            }
+        )
+
+
+@lru_cache(maxsize=None)
+def get_annotation(array_type: str) -> Annotation:
+    """
+    Annotation of one platform, loaded once per worker process.
+
+    The memory-mapped store is used when pkl/create_pkl.py wrote one;
+    otherwise the pickle is read and converted in memory.
+    """
+    if array_type not in cnf.pkl_files:
+        raise ValueError(f"Unknown array type: {array_type}")
+    directory = store_dir(cnf.pkl_files[array_type])
+    if has_annotation_store(directory):
+        arrays = open_annotation_store(directory)
+    else:
+        arrays = annotation_arrays(pd.read_pickle(cnf.pkl_files[array_type]))
+    return Annotation(
+        array_type=array_type,
+        cpgs=arrays[CPGS_FILE],
+        gene_codes=arrays[GENES_FILE],
+        gene_names=arrays[GENE_NAMES_FILE],
+        hashes=arrays[HASHES_FILE],
+        hash_rows=arrays[HASH_ROWS_FILE],
+    )
 
 
 def build_gene_names_csv(
     *, array_type: str, input: str, output_dir: str, fno: int = 0
 ) -> str:
-    assert array_type.lower() in ["450k", "epic", "epicv2"]
+    annotation = get_annotation(array_type.lower())
 
     input_file_name = Path(input).stem
 
-    annotation_df = pd.read_pickle(cnf.pkl_files.get(array_type.lower()))
-
     features_df = pd.read_csv(
         input, usecols=["Feature"], dtype="string", keep_default_na=True
     )
@@ -23,13 +112,9 @@ def build_gene_names_csv(
 
     # STRICT ORDER PRESERVATION: Keep the exact original order from input
     features = features_df["Feature"].dropna().astype(str).tolist()
-    feature_set = set(features)
-    assert len(feature_set) == len(features), "Input features contain duplicates!"
+    assert len(set(features)) == len(features), "Input features contain duplicates!"
 
-    result_df = annotation_df[annotation_df["CpG_site"].isin(feature_set)]
-
-    # Reorder to match the order of features
-    result_df = result_df.set_index("CpG_site").loc[features].reset_index()
+    result_df = annotation.lookup(features)
 
     outfile = Path(output_dir) / f"{array_type}_{input_file_name}_mapped_genes.csv"
     result_df.to_csv(outfile, index=False)
@@ -62,55 +147,132 @@ def build_gene_names_csv(
 #     return found[0]
 
 
-def guess_illumina_array_type(columnset: set) -> list[str]:
-    """Guess Illumina array type(s) based on provided set of CpG site IDs."""
-    found = []
+@dataclass(frozen=True)
+class ProbeIndex:
+    """
+    Probe ids of every platform as sorted uint64 hashes.
+
+    `hashes` is the union over all platforms and `platforms` a bitset per
+    hash (bit i set: the probe is on `array_types[i]`), so one searchsorted
+    answers membership for every platform at once.
+    """
+
+    array_types: tuple[str, ...]
+    hashes: np.ndarray
+    platforms: np.ndarray
+
+    def membership(self, cpg_ids: Iterable[str]) -> np.ndarray:
+        """Platform bitset of every id; 0 for ids on no platform."""
+        hashed = hash_probe_ids(cpg_ids)
+        pos = np.searchsorted(self.hashes, hashed)
+        pos[pos == len(self.hashes)] = 0
+        return np.where(self.hashes[pos] == hashed, self.platforms[pos], 0)
+
+    def save(self, path: str | Path) -> None:
+        np.savez(
+            path,
+            array_types=np.array(self.array_types),
+            hashes=self.hashes,
+            platforms=self.platforms,
+        )
+
+
+def build_probe_index(probe_ids: dict[str, Iterable[str]]) -> ProbeIndex:
+    hashed = [np.unique(hash_probe_ids(ids)) for ids in probe_ids.values()]
+    hashes = np.unique(np.concatenate(hashed))
+    platforms = np.zeros(len(hashes), dtype=np.uint8)
+    for bit, platform_hashes in enumerate(hashed):
+        platforms[np.searchsorted(hashes, platform_hashes)] |= 1 << bit
+    return ProbeIndex(tuple(probe_ids), hashes, platforms)
+
+
+@lru_cache(maxsize=None)
+def probe_index() -> ProbeIndex:
+    """The prebuilt index if it covers the configured platforms, else built now."""
+    array_types = tuple(cnf.pkl_files)
+    if PROBE_INDEX_FILE.exists():
+        with np.load(PROBE_INDEX_FILE) as data:
+            if tuple(data["array_types"]) == array_types:
+                return ProbeIndex(array_types, data["hashes"], data["platforms"])
+    return build_probe_index(
+        {
+            t: pd.read_pickle(cnf.pkl_files[t])["CpG_site"].astype(str)
+            for t in array_types
+        }
+    )
 
-    for selector, path in cnf.pkl_files.items():
-        annotation_df = pd.read_pickle(path)
-        selector_set = set(annotation_df["CpG_site"].astype(str).tolist())
 
-        if columnset.issubset(selector_set):
-            # print(f"Detected array type: {selector}")
-            found.append(selector)
+class ArrayTypeMatcher:
+    """
+    Streaming array type detection: feed CpG ids chunk by chunk and track,
+    per platform, the fraction of the ids seen so far that it contains.
+    """
+
+    def __init__(
+        self,
+        array_types: Iterable[str] | None = None,
+        min_overlap: float = cnf.array_type_min_overlap,
+    ):
+        self.index = probe_index()
+        self.candidates = list(
+            self.index.array_types if array_types is None else array_types
+        )
+        self.min_overlap = min_overlap
+        self.seen = 0
+        self.hits = np.zeros(len(self.index.array_types), dtype=np.int64)
+
+    def update(self, cpg_ids: Iterable[str]) -> None:
+        platforms = self.index.membership(cpg_ids)
+        self.seen += len(platforms)
+        for bit in range(len(self.hits)):
+            self.hits[bit] += np.count_nonzero(platforms & (1 << bit))
+
+    @property
+    def overlap(self) -> dict[str, float]:
+        """Fraction of the ids seen that are on each candidate platform."""
+        return {
+            array_type: float(
+                self.hits[self.index.array_types.index(array_type)] / self.seen
+            )
+            if self.seen
+            else 1.0
+            for array_type in self.candidates
+        }
+
+    @property
+    def array_types(self) -> list[str]:
+        """Platforms above `min_overlap`, best match first."""
+        overlap = self.overlap
+        matches = [t for t in self.candidates if overlap[t] >= self.min_overlap]
+        return sorted(matches, key=lambda t: -overlap[t])
 
-    return found
+
+def guess_illumina_array_type(columnset: set) -> list[str]:
+    """Guess Illumina array type(s) based on provided set of CpG site IDs."""
+    matcher = ArrayTypeMatcher()
+    matcher.update(columnset)
+    return matcher.array_types
 
 
 def guess_illumina_array_type_pd(column_index: pd.Index) -> list[str]:
     """Most efficient - work with Index objects."""
-    found = []
-    column_set = set(column_index.astype(str))
-
-    for annotator, path in cnf.pkl_files.items():
-        annotation_df = pd.read_pickle(path)
-        annotation_set = set(annotation_df["CpG_site"].astype(str).tolist())
-
-        if column_set.issubset(annotation_set):
-            found.append(annotator)
-
-    return found
+    matcher = ArrayTypeMatcher()
+    matcher.update(column_index.astype(str))
+    return matcher.array_types
 
 
 def build_gene_names_df(
     *, array_type: str, feature_df: pd.DataFrame, fno: int = 0
 ) -> pd.DataFrame:
-    assert array_type.lower() in ["450k", "epic", "epicv2"]
-
-    annotation_df = pd.read_pickle(cnf.pkl_files.get(array_type.lower()))
+    annotation = get_annotation(array_type.lower())
     if fno > 0:
         feature_df = feature_df.iloc[:fno, :]
 
     # STRICT ORDER PRESERVATION: Keep the exact original order from input
     features = feature_df["Feature"].astype(str).tolist()
-    feature_set = set(features)
-
-    assert len(feature_set) == len(features), "Input features contain duplicates!"
-
-    result_df = annotation_df[annotation_df["CpG_site"].isin(feature_set)]
+    assert len(set(features)) == len(features), "Input features contain duplicates!"
 
-    # Reorder to match the order of features
-    result_df = result_df.set_index("CpG_site").loc[features].reset_index()
+    result_df = annotation.lookup(features)
     result_df = result_df.join(feature_df.drop(columns=["Feature"]))
     return result_df
 
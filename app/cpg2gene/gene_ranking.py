@@ -0,0 +1,122 @@
+"""
+Gene-level aggregation of CpG rankings.
+
+Every algorithm in app/algorithms returns a ranking (Feature, Importance),
+best CpG first. A gene's CpGs are found through the platform's sparse
+CpG x gene incidence matrix (see annotation_store), so aggregating a whole
+450k ranking is a sparse mat-vec rather than a groupby over split strings.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from app.config import cnf
+from app.cpg2gene.annotation_store import (
+    INDICES_FILE,
+    INDPTR_FILE,
+    SYMBOLS_FILE,
+    incidence_arrays,
+    open_incidence,
+    store_dir,
+)
+from app.cpg2gene.cpg_gene_mapping import get_annotation
+
+# max / mean: of the CpG scores; rank_sum: Borda points (n - rank) summed
+# over the gene's CpGs; top_k: number of the gene's CpGs among the top k
+AGGREGATIONS = ("max", "mean", "rank_sum", "top_k")
+
+
+@dataclass(frozen=True)
+class GeneIncidence:
+    """CpG x gene matrix of one platform, rows in the annotation's order."""
+
+    array_type: str
+    matrix: sp.csr_matrix
+    symbols: np.ndarray
+
+
+@lru_cache(maxsize=None)
+def get_gene_incidence(array_type: str) -> GeneIncidence:
+    """Incidence of one platform, from the store or built from its annotation."""
+    annotation = get_annotation(array_type)
+    arrays = open_incidence(store_dir(cnf.pkl_files[array_type]))
+    if arrays is None:
+        arrays = incidence_arrays(annotation.gene_codes, annotation.gene_names)
+    indices = arrays[INDICES_FILE]
+    matrix = sp.csr_matrix(
+        (np.ones(len(indices), dtype=np.float32), indices, arrays[INDPTR_FILE]),
+        shape=(len(annotation.cpgs), len(arrays[SYMBOLS_FILE])),
+    )
+    return GeneIncidence(array_type, matrix, arrays[SYMBOLS_FILE])
+
+
+def aggregate_genes(
+    ranking: pd.DataFrame,
+    array_type: str,
+    method: str = "max",
+    top_k: int = 100,
+    score_column: str | None = None,
+) -> pd.DataFrame:
+    """
+    Gene-level ranking of a CpG ranking (rows ordered best first).
+
+    Scores are Borda points (n for the best CpG, 1 for the last) unless
+    `score_column` names a column where higher is better, e.g. "Importance"
+    (not for rfe_svm, whose Importance is a rank). CpGs that are not on the
+    platform are ignored. Returns Gene, Score, CpGs (ranked CpGs on the gene)
+    and BestRank (1-based rank of its best CpG), best gene first.
+    """
+    if method not in AGGREGATIONS:
+        raise ValueError(
+            f"Unknown aggregation {method}, expected one of {AGGREGATIONS}"
+        )
+    array_type = array_type.lower()
+    annotation = get_annotation(array_type)
+    incidence = get_gene_incidence(array_type)
+
+    positions = annotation.positions(
+        ranking["Feature"].astype(str).to_numpy(dtype=object)
+    )
+    found = positions >= 0
+    n = len(ranking)
+    if score_column is None:
+        scores = np.arange(n, 0, -1, dtype=np.float64)
+    else:
+        scores = ranking[score_column].to_numpy(dtype=np.float64)
+    ranks = np.arange(1, n + 1)[found]
+    scores = scores[found]
+
+    # ranked CpGs x genes; one mat-vec aggregates every gene at once
+    ranked = incidence.matrix[positions[found]]
+    n_genes = ranked.shape[1]
+    counts = np.bincount(ranked.indices, minlength=n_genes)
+    if method == "max":
+        gene_scores = np.full(n_genes, -np.inf)
+        per_entry = np.repeat(scores, np.diff(ranked.indptr))
+        np.maximum.at(gene_scores, ranked.indices, per_entry)
+    elif method == "top_k":
+        gene_scores = ranked.T @ (ranks <= top_k).astype(np.float64)
+    else:
+        gene_scores = ranked.T @ scores
+        if method == "mean":
+            gene_scores = gene_scores / np.maximum(counts, 1)
+
+    best_rank = np.full(n_genes, n + 1)
+    np.minimum.at(best_rank, ranked.indices, np.repeat(ranks, np.diff(ranked.indptr)))
+
+    hit = np.flatnonzero(counts)
+    result = pd.DataFrame(
+        {
+            "Gene": incidence.symbols[hit],
+            "Score": gene_scores[hit],
+            "CpGs": counts[hit],
+            "BestRank": best_rank[hit],
+        }
+    )
+    return result.sort_values(
+        ["Score", "BestRank"], ascending=[False, True], ignore_index=True
+    )
@@ -0,0 +1,160 @@
+"""
+Region queries over CpG coordinates.
+
+The annotation store keeps, per chromosome, the sorted positions of every CpG
+(see annotation_store), so all CpGs in a region are found with two binary
+searches, and the CpGs near a gene with a few more. Beta values of the hits
+are then read from an uploaded dataset's binary store (see beta_store).
+"""
+
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.config import cnf
+from app.cpg2gene.annotation_store import (
+    CHROM_OFFSETS_FILE,
+    CHROMS_FILE,
+    POSITION_ROWS_FILE,
+    POSITIONS_FILE,
+    annotation_arrays,
+    open_coordinates,
+    store_dir,
+)
+from app.cpg2gene.cpg_gene_mapping import get_annotation
+from app.cpg2gene.gene_ranking import get_gene_incidence
+from app.utils.beta_csv import TAG
+from app.utils.beta_store import read_store_cpgs
+
+
+def _chrom_key(chrom) -> str:
+    """Chromosome name without its prefix: chr1, Chr1 and 1 are the same."""
+    chrom = str(chrom)
+    return chrom[3:] if chrom.lower().startswith("chr") else chrom
+
+
+@dataclass(frozen=True)
+class CoordinateIndex:
+    """Sorted CpG positions per chromosome, rows into the annotation."""
+
+    array_type: str
+    chroms: np.ndarray
+    offsets: np.ndarray
+    positions: np.ndarray
+    rows: np.ndarray
+
+    @cached_property
+    def _blocks(self) -> dict[str, int]:
+        return {_chrom_key(c): i for i, c in enumerate(self.chroms)}
+
+    @cached_property
+    def _entry_of_row(self) -> np.ndarray:
+        entries = np.full(len(get_annotation(self.array_type).cpgs), -1)
+        entries[self.rows] = np.arange(len(self.rows))
+        return entries
+
+    def region(self, chrom: str, start: int, end: int) -> np.ndarray:
+        """Index entries of the CpGs at start <= position <= end."""
+        block = self._blocks.get(_chrom_key(chrom))
+        if block is None:
+            raise ValueError(f"Unknown chromosome {chrom} on {self.array_type}")
+        lo, hi = self.offsets[block], self.offsets[block + 1]
+        positions = self.positions[lo:hi]
+        first = lo + np.searchsorted(positions, start, side="left")
+        last = lo + np.searchsorted(positions, end, side="right")
+        return np.arange(first, last)
+
+    def entries(self, rows: np.ndarray) -> np.ndarray:
+        """Index entries of annotation rows (rows without coordinates dropped)."""
+        entries = self._entry_of_row[rows]
+        return entries[entries >= 0]
+
+    def chrom_of(self, entries: np.ndarray) -> np.ndarray:
+        blocks = np.searchsorted(self.offsets, entries, side="right") - 1
+        return self.chroms[blocks]
+
+    def frame(self, entries: np.ndarray) -> pd.DataFrame:
+        """CpG_site, chr, pos and GeneName of index entries."""
+        annotation = get_annotation(self.array_type)
+        rows = self.rows[entries]
+        return pd.DataFrame(
+            {
+                "CpG_site": annotation.cpgs[rows].astype(str),
+                "chr": self.chrom_of(entries),
+                "pos": self.positions[entries],
+                "GeneName": pd.Categorical.from_codes(
+                    annotation.gene_codes[rows], annotation.gene_names
+                ),
+            }
+        )
+
+
+@lru_cache(maxsize=None)
+def get_coordinate_index(array_type: str) -> CoordinateIndex:
+    """Interval index of one platform, loaded once per worker process."""
+    annotation = get_annotation(array_type)
+    arrays = open_coordinates(store_dir(cnf.pkl_files[array_type]))
+    if arrays is None:
+        arrays = annotation_arrays(pd.read_pickle(cnf.pkl_files[array_type]))
+    if CHROMS_FILE not in arrays:
+        raise ValueError(
+            f"No CpG coordinates in the {annotation.array_type} annotation"
+        )
+    return CoordinateIndex(
+        array_type=array_type,
+        chroms=arrays[CHROMS_FILE],
+        offsets=arrays[CHROM_OFFSETS_FILE],
+        positions=arrays[POSITIONS_FILE],
+        rows=arrays[POSITION_ROWS_FILE],
+    )
+
+
+def region_cpgs(array_type: str, chrom: str, start: int, end: int) -> pd.DataFrame:
+    """All CpGs of a platform in chrom:start-end (inclusive), by position."""
+    if start > end:
+        raise ValueError(f"Region start {start} is after its end {end}")
+    index = get_coordinate_index(array_type.lower())
+    return index.frame(index.region(chrom, start, end))
+
+
+def gene_cpgs(array_type: str, gene: str, flank: int = 0) -> pd.DataFrame:
+    """
+    CpGs near a gene: every CpG from the first to the last CpG annotated to
+    `gene` on each chromosome, extended by `flank` bases on both sides.
+    """
+    array_type = array_type.lower()
+    incidence = get_gene_incidence(array_type)
+    column = np.searchsorted(incidence.symbols, gene)
+    if column == len(incidence.symbols) or incidence.symbols[column] != gene:
+        raise ValueError(f"Gene {gene} is not in the {array_type} annotation")
+
+    index = get_coordinate_index(array_type)
+    entries = index.entries(incidence.matrix[:, column].nonzero()[0])
+    chroms = index.chrom_of(entries)
+    frames = [
+        index.frame(
+            index.region(
+                chrom,
+                index.positions[entries[chroms == chrom]].min() - flank,
+                index.positions[entries[chroms == chrom]].max() + flank,
+            )
+        )
+        for chrom in np.unique(chroms)
+    ]
+    if not frames:
+        return index.frame(entries)
+    return pd.concat(frames, ignore_index=True)
+
+
+def region_betas(storage_dir: str | Path, cpg_ids) -> pd.DataFrame:
+    """
+    Beta values of the given CpGs from an upload's binary store: one row per
+    sample, one column per CpG present in the dataset, plus the prognosis.
+    """
+    matrix = read_store_cpgs(storage_dir, cpg_ids)
+    betas = pd.DataFrame(matrix.betas, index=matrix.samples, columns=matrix.cpgs)
+    betas[TAG] = matrix.labels
+    return betas
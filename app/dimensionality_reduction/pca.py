@@ -1,8 +1,11 @@
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import seaborn as sns
 from sklearn.decomposition import PCA
 
+from app.utils.beta_quant import dequantize, is_quantized
+
 
 def pca_plot(
     df: pd.DataFrame,
@@ -11,20 +14,46 @@ def pca_plot(
     selected_features: list[str] | None = None,
     n_components: int = 2,
 ):
+    X_full = df.drop(columns=["Prognosis"])
+    return pca_plot_matrix(
+        X_full.to_numpy(),
+        df["Prognosis"].to_numpy(),
+        X_full.columns.to_numpy(),
+        conditions=conditions,
+        fs_algorithm_name=fs_algorithm_name,
+        selected_features=selected_features,
+        n_components=n_components,
+    )
+
+
+def pca_plot_matrix(
+    X: np.ndarray,
+    prognosis: np.ndarray,
+    features: np.ndarray,
+    conditions: list[str] | None = None,
+    fs_algorithm_name: str | None = None,
+    selected_features: list[str] | None = None,
+    n_components: int = 2,
+):
+    """Same plot as `pca_plot`, from a (possibly memory-mapped) sample x CpG matrix."""
     if conditions:
-        df = df[df["Prognosis"].isin(conditions)]
+        rows = np.isin(prognosis, conditions)
+        if not rows.all():
+            X, prognosis = X[rows], prognosis[rows]
 
     # 1) Pick feature columns
+    feature_index = pd.Index(features)
     if selected_features is None:
-        feat_cols = [c for c in df.columns if c != "Prognosis"]
+        feat_idx = np.arange(len(feature_index))
     else:
-        feat_cols = [
-            c for c in selected_features if c in df.columns and c != "Prognosis"
-        ]
+        feat_idx = feature_index.get_indexer(selected_features)
+        feat_idx = feat_idx[feat_idx >= 0]
 
     # 2) Full vs Selected feature matrices
-    X_full = df.drop(columns=["Prognosis"])
-    X_selected = df[feat_cols]
+    X_full = X
+    X_selected = X[:, feat_idx]
+    if is_quantized(X):
+        X_full, X_selected = dequantize(X_full), dequantize(X_selected)
 
     full_feature_number = X_full.shape[1]
     selected_feature_number = X_selected.shape[1]
@@ -38,13 +67,13 @@ def pca_plot(
 
     # 4) Build PCA dataframe
     principalDf_2d_full = pd.DataFrame(PC_full[:, :2], columns=["PC 1", "PC 2"])
-    principalDf_2d_full["Prognosis"] = df["Prognosis"].values
+    principalDf_2d_full["Prognosis"] = prognosis
 
     principalDf_2d_sel = pd.DataFrame(PC_selected[:, :2], columns=["PC 1", "PC 2"])
-    principalDf_2d_sel["Prognosis"] = df["Prognosis"].values
+    principalDf_2d_sel["Prognosis"] = prognosis
 
     # 5) Colors: consistent across subplots
-    labels = df["Prognosis"].unique()
+    labels = pd.unique(prognosis)
     colors = sns.color_palette("tab20", n_colors=len(labels))
     color_map = dict(zip(labels, colors))
 
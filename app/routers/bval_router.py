@@ -2,18 +2,45 @@
 # Handles uploading .idat and .csv files, processing them to generate beta values,
 # and managing the resulting files and images.
 import shutil
-import tempfile
 from pathlib import Path
+from typing import Annotated
 
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Body, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 
 from app.celery_tasks.bval_tasks import process_uploaded_files
 from app.config import cnf
-from app.schemas import FileProcessingStatus, FileUploadResponse
+from app.schemas import (
+    BlobUploadResponse,
+    BundleManifest,
+    FileProcessingStatus,
+    FileUploadResponse,
+    ManifestFile,
+    ManifestResponse,
+    PromoteRequest,
+    PromoteResponse,
+    PromoteTarget,
+)
+from app.services.service_upload_beta_csv import UploadBetaValuesCSVService
+from app.utils.blob_store import (
+    drop_manifest,
+    intern_file,
+    is_sha1,
+    link_blob,
+    load_manifest,
+    missing_blobs,
+    prune_blobs,
+    put_blob,
+    recorded_sha1,
+    save_manifest,
+)
 from app.utils.file_utils import (
-    calculate_sha1_hashes,
+    SavedFile,
+    manifest_sha1,
+    move_into_place,
     save_uploaded_files,
+    upload_tempdir,
     validate_file_extensions,
 )
 
@@ -23,6 +50,11 @@ router = APIRouter(prefix=cnf.prefix_bval, tags=["Beta Value Creation"])
 # UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR = cnf.bval_workdir
 
+PROMOTE_SERVICES = {
+    PromoteTarget.FS: UploadBetaValuesCSVService(cnf.fs_workdir),
+    PromoteTarget.DMP: UploadBetaValuesCSVService(cnf.dmp_workdir),
+}
+
 
 @router.post("/upload", response_model=FileUploadResponse)
 async def upload_files(
@@ -40,12 +72,10 @@ async def upload_files(
             detail=f"Only files with extensions {cnf.bval_allowed_extensions} are allowed",
         )
 
-    # Create temporary directory for processing
-    with tempfile.TemporaryDirectory() as temp_dir:
-        temp_path = Path(temp_dir)
-
+    # Staging directory on the same filesystem as UPLOAD_DIR
+    with upload_tempdir() as temp_path:
         try:
-            # Save files temporarily
+            # Stream files to disk, hashing each one while it is written
             saved_files = await save_uploaded_files(files, temp_path)
 
             if not saved_files:
@@ -55,14 +85,14 @@ async def upload_files(
             if bundle_id:
                 sha1_hash = bundle_id
                 # Optionally verify the bundle_id matches by recalculating
-                calculated_hash = calculate_sha1_hashes(saved_files)
+                calculated_hash = manifest_sha1(saved_files)
                 if calculated_hash != bundle_id:
                     raise HTTPException(
                         status_code=400,
                         detail=f"Provided bundle_id does not match calculated hash. Expected: {calculated_hash}, Got: {bundle_id}",
                     )
             else:
-                sha1_hash = calculate_sha1_hashes(saved_files)
+                sha1_hash = manifest_sha1(saved_files)
 
             # Create permanent storage directory
             storage_dir = UPLOAD_DIR / sha1_hash
@@ -77,15 +107,10 @@ async def upload_files(
                     file_count=len(saved_files),
                 )
 
-            # Create directories
-            storage_in.mkdir(parents=True, exist_ok=True)
-
-            # Move files to permanent storage
-            final_file_paths = []
-            for file_path in saved_files:
-                final_path = storage_in / file_path.name
-                shutil.copy2(file_path, final_path)
-                final_file_paths.append(str(final_path))
+            # Files become hardlinks to their blobs, so IDATs shared with other
+            # bundles are stored once; 'in' appears all at once
+            linked = [intern_file(f.path, f.sha1) for f in saved_files]
+            final_file_paths = [str(p) for p in move_into_place(linked, storage_in)]
 
             # Start Celery task for processing
             task = process_uploaded_files.delay(
@@ -107,6 +132,152 @@ async def upload_files(
             )
 
 
+def _manifest_files(manifest: BundleManifest) -> list[SavedFile]:
+    files = []
+    for entry in manifest.files:
+        name = Path(entry.name).name
+        if (
+            name != entry.name
+            or Path(name).suffix.lower() not in cnf.bval_allowed_extensions
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Only files with extensions {cnf.bval_allowed_extensions} are allowed: {entry.name}",
+            )
+        if not is_sha1(entry.sha1):
+            raise HTTPException(
+                status_code=400, detail=f"Invalid SHA1 for {entry.name}: {entry.sha1}"
+            )
+        files.append(SavedFile(path=Path(name), size=entry.size, sha1=entry.sha1))
+    return files
+
+
+def _manifest_entries(files: list[SavedFile]) -> list[ManifestFile]:
+    return [ManifestFile(name=f.path.name, size=f.size, sha1=f.sha1) for f in files]
+
+
+@router.post("/manifest", response_model=ManifestResponse)
+async def post_manifest(manifest: BundleManifest):
+    """
+    First phase of a bundle upload: report which files the server is missing.
+
+    Only those need to be sent to /blobs/{sha1} before /commit/{bundle_id}.
+    """
+    files = _manifest_files(manifest)
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+
+    calculated_hash = manifest_sha1(files)
+    if calculated_hash != manifest.bundle_id:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Provided bundle_id does not match calculated hash. Expected: {calculated_hash}, Got: {manifest.bundle_id}",
+        )
+
+    storage_in = UPLOAD_DIR / manifest.bundle_id / "in"
+    if storage_in.exists() and any(storage_in.iterdir()):
+        return ManifestResponse(
+            bundle_id=manifest.bundle_id,
+            exists=True,
+            missing=[],
+            message="Files with this SHA1 hash already exist",
+        )
+
+    save_manifest(manifest.bundle_id, files)
+    missing = missing_blobs(files)
+    return ManifestResponse(
+        bundle_id=manifest.bundle_id,
+        exists=False,
+        missing=_manifest_entries(missing),
+        message=f"{len(missing)} of {len(files)} files need to be uploaded",
+    )
+
+
+@router.post("/blobs/{sha1}", response_model=BlobUploadResponse)
+async def upload_blob(
+    sha1: str, file: UploadFile = File(..., description="File whose SHA1 is sha1")
+):
+    """Upload the content of one file listed as missing by /manifest."""
+    try:
+        saved = await put_blob(file, sha1)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return BlobUploadResponse(sha1=saved.sha1, size=saved.size)
+
+
+@router.post("/commit/{bundle_id}", response_model=FileUploadResponse)
+async def commit_bundle(bundle_id: str):
+    """Last phase of a manifest upload: assemble the bundle and process it."""
+    try:
+        files = load_manifest(bundle_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if files is None:
+        raise HTTPException(status_code=404, detail="No manifest for this bundle")
+
+    storage_dir = UPLOAD_DIR / bundle_id
+    storage_in = storage_dir / "in"
+    if storage_in.exists() and any(storage_in.iterdir()):
+        drop_manifest(bundle_id)
+        return FileUploadResponse(
+            task_id="",
+            sha1_hash=bundle_id,
+            message="Files with this SHA1 hash already exist",
+            file_count=len(files),
+        )
+
+    missing = missing_blobs(files)
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Missing files: {[f.path.name for f in missing]}",
+        )
+
+    # Hardlink the blobs into the bundle; 'in' appears all at once
+    with upload_tempdir() as temp_path:
+        linked = [link_blob(f.sha1, temp_path / f.path.name) for f in files]
+        final_file_paths = [str(p) for p in move_into_place(linked, storage_in)]
+    drop_manifest(bundle_id)
+
+    task = process_uploaded_files.delay(
+        file_paths=final_file_paths,
+        sha1_hash=bundle_id,
+        storage_dir=str(storage_dir),
+    )
+
+    return FileUploadResponse(
+        task_id=task.id,
+        sha1_hash=bundle_id,
+        message="Files uploaded successfully. Processing started.",
+        file_count=len(final_file_paths),
+    )
+
+
+@router.post("/promote/{sha1_hash}", response_model=PromoteResponse)
+async def promote_output(
+    sha1_hash: str, request: Annotated[PromoteRequest | None, Body()] = None
+):
+    """
+    Use the beta CSV produced for a bundle in Feature Selection and/or DMP.
+
+    The CSV is linked, not copied or uploaded again; its hash was recorded
+    when the pipeline finished, and analysis starts right away.
+    """
+    out_csv = UPLOAD_DIR / sha1_hash / "out" / "bval_data.csv"
+    if not is_sha1(sha1_hash) or not out_csv.exists():
+        raise HTTPException(
+            status_code=404, detail="No beta values output found for this bundle"
+        )
+
+    request = request or PromoteRequest()  # no body: promote to every target
+    csv_sha1 = await run_in_threadpool(recorded_sha1, out_csv)
+    results = {}
+    for target in dict.fromkeys(request.targets):
+        service = PROMOTE_SERVICES[target]
+        results[target.value] = await service.handle_blob(csv_sha1, out_csv.name)
+    return PromoteResponse(sha1_hash=sha1_hash, csv_sha1=csv_sha1, results=results)
+
+
 @router.get("/exists/{hash_id}")
 async def get_hash_exists(hash_id: str):
     """Check if files with the given SHA1 hash already exist."""
@@ -231,6 +402,7 @@ async def remove_files(sha1_hash: str):
 
     try:
         shutil.rmtree(storage_dir)
+        prune_blobs()
         return {"message": f"Files with SHA1 hash {sha1_hash} removed successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error removing files: {str(e)}")
@@ -249,6 +421,7 @@ async def remove_all_files(delete_pass: str):
         shutil.rmtree(UPLOAD_DIR)
         # Recreate the upload directory after deletion
         UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        prune_blobs()
         return {"message": "All uploaded files removed successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error removing files: {str(e)}")
@@ -8,6 +8,7 @@ from fastapi.responses import FileResponse
 
 from app.config import cnf
 from app.schemas import (
+    BlobIngestRequest,
     CSVUploadResponse,
     DMPRequest,
     DMPResponse,
@@ -37,6 +38,12 @@ async def upload_csv_file(
     return await upload_service.handle_upload(file, id)
 
 
+@router.post("/upload-blob", response_model=CSVUploadResponse)
+async def upload_csv_blob(request: BlobIngestRequest):
+    """Use a CSV finished through a resumable upload (see /uploads)."""
+    return await upload_service.handle_blob(request.sha1, request.filename)
+
+
 @router.get("/exists/{sha1_hash}")
 async def check_file_exists(sha1_hash: str):
     """Check if a file with the given SHA1 hash exists."""
@@ -1,18 +1,25 @@
 # Feature Selection Router
 # Handles uploading CSV files, running algorithms, and managing results
 import shutil
+from pathlib import Path
 
+import numpy as np
+import pandas as pd
 from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse, JSONResponse
 
 from app.celery_tasks.fs_tasks import (
     process_prognosis_algorithm,
 )
 from app.config import cnf
+from app.cpg2gene.gene_ranking import AGGREGATIONS, aggregate_genes
+from app.cpg2gene.regions import gene_cpgs, region_betas, region_cpgs
 from app.schemas import (
     Algorithm,
     AlgorithmRequest,
     AlgorithmResponse,
+    BlobIngestRequest,
     CSVUploadResponse,
     PrognosisValuesResponse,
     TaskStatus,
@@ -20,6 +27,8 @@ from app.schemas import (
 from app.services.get_algorithms import get_algorithms
 from app.services.prognosis_values_from_csv import get_prognosis_values_from_csv
 from app.services.service_upload_beta_csv import UploadBetaValuesCSVService
+from app.utils.beta_store import has_beta_store
+from app.utils.blob_store import prune_blobs
 from app.utils.get_metadata import get_metadata
 
 router = APIRouter(prefix=cnf.prefix_fs, tags=["Feature Selection"])
@@ -38,6 +47,12 @@ async def upload_csv_file(
     return await upload_service.handle_upload(file, id)
 
 
+@router.post("/upload-blob", response_model=CSVUploadResponse)
+async def upload_csv_blob(request: BlobIngestRequest):
+    """Use a CSV finished through a resumable upload (see /uploads)."""
+    return await upload_service.handle_blob(request.sha1, request.filename)
+
+
 @router.get("/exists/{sha1_hash}")
 async def check_file_exists(sha1_hash: str):
     """Check if a file with the given SHA1 hash exists."""
@@ -264,6 +279,126 @@ async def download_result_file(sha1_hash: str, filename: str, lines: int = 0):
     return FileResponse(path=str(file_path), filename=filename, media_type="text/csv")
 
 
+@router.get("/genes/{sha1_hash}/{filename}")
+async def gene_ranking(
+    sha1_hash: str,
+    filename: str,
+    method: str = Query("max", description=f"One of {AGGREGATIONS}"),
+    top_k: int = Query(100, ge=1, description="Cut-off for method=top_k"),
+    use_importance: bool = Query(
+        False, description="Aggregate the Importance column instead of ranks"
+    ),
+    limit: int = Query(0, ge=0, description="Return only the best genes"),
+):
+    """Aggregate a CpG ranking result file to a gene-level ranking."""
+    file_path = cnf.fs_workdir / sha1_hash / OUT / filename
+    if file_path.name != filename or not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+
+    try:
+        metadata = get_metadata(cnf.fs_workdir / sha1_hash)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    array_types = metadata.get("detected_illumina_array_types") or []
+    if not array_types:
+        raise HTTPException(status_code=400, detail="Illumina array type not detected")
+
+    def build():
+        ranking = pd.read_csv(file_path)
+        genes = aggregate_genes(
+            ranking,
+            array_types[0],
+            method=method,
+            top_k=top_k,
+            score_column="Importance" if use_importance else None,
+        )
+        return genes.head(limit) if limit else genes
+
+    try:
+        genes = await run_in_threadpool(build)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "sha1_hash": sha1_hash,
+        "filename": filename,
+        "array_type": array_types[0],
+        "method": method,
+        "gene_count": len(genes),
+        "genes": genes.to_dict(orient="records"),
+    }
+
+
+# region queries read feature-selection uploads first, then DMP uploads
+REGION_WORKDIRS = (cnf.fs_workdir, cnf.dmp_workdir)
+
+
+def _dataset_dir(sha1_hash: str) -> Path:
+    for workdir in REGION_WORKDIRS:
+        if (workdir / sha1_hash).is_dir():
+            return workdir / sha1_hash
+    return REGION_WORKDIRS[0] / sha1_hash
+
+
+@router.get("/region/{sha1_hash}")
+async def region_query(
+    sha1_hash: str,
+    chrom: str = Query(None, description="Chromosome, e.g. chr17 or 17"),
+    start: int = Query(None, ge=0),
+    end: int = Query(None, ge=0),
+    gene: str = Query(None, description="Instead of a region: CpGs near a gene"),
+    flank: int = Query(0, ge=0, description="Bases added around the gene's CpGs"),
+    betas: bool = Query(False, description="Include the dataset's beta values"),
+):
+    """
+    CpGs of a genomic region (chrom/start/end) or near a gene; `sha1_hash`
+    may be a feature-selection or a DMP dataset.
+    """
+    storage_dir = _dataset_dir(sha1_hash)
+    try:
+        metadata = get_metadata(storage_dir)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    array_types = metadata.get("detected_illumina_array_types") or []
+    if not array_types:
+        raise HTTPException(status_code=400, detail="Illumina array type not detected")
+    if gene is None and None in (chrom, start, end):
+        raise HTTPException(
+            status_code=400, detail="Give either chrom, start and end, or gene"
+        )
+    if betas and not has_beta_store(storage_dir):
+        raise HTTPException(
+            status_code=409, detail="The dataset is still being prepared"
+        )
+
+    def query():
+        if gene is not None:
+            cpgs = gene_cpgs(array_types[0], gene, flank)
+        else:
+            cpgs = region_cpgs(array_types[0], chrom, start, end)
+        values = region_betas(storage_dir, cpgs["CpG_site"]) if betas else None
+        return cpgs, values
+
+    try:
+        cpgs, values = await run_in_threadpool(query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = {
+        "sha1_hash": sha1_hash,
+        "array_type": array_types[0],
+        "cpg_count": len(cpgs),
+        "cpgs": cpgs.astype({"GeneName": object})
+        .replace({np.nan: None})
+        .to_dict(orient="records"),
+    }
+    if values is not None:
+        result["samples"] = values.index.tolist()
+        values = values.astype(object).where(values.notna(), None)
+        result["betas"] = values.to_dict(orient="list")
+    return result
+
+
 @router.get("/metadata/{sha1_hash}/{filename}")
 async def get_metadata_json(sha1_hash: str, filename: str):
     """Return a metadata JSON file parsed and served with application/json."""
@@ -315,6 +450,7 @@ async def remove_all_files(
 
     try:
         shutil.rmtree(cnf.fs_workdir)
+        prune_blobs()
         return {"message": "All files removed successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error removing files: {str(e)}")
@@ -0,0 +1,176 @@
+# Resumable Upload Router
+# Large files (IDAT bundles, beta CSVs) are sent as numbered chunks and can be
+# resumed after a dropped connection. A finalized upload lands in the blob
+# store: IDATs are then committed with /bval/manifest + /bval/commit, CSVs are
+# ingested with /fs/upload-blob or /dmp/upload-blob.
+import aiofiles
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+from app.config import cnf
+from app.schemas import BlobUploadResponse, UploadSessionRequest, UploadSessionResponse
+from app.utils.beta_csv import PREFIX_BYTES, InvalidCsvError
+from app.utils.blob_store import has_blob
+from app.utils.file_utils import (
+    UPLOAD_CHUNK_SIZE,
+    check_compression_support,
+    is_csv_filename,
+    validate_csv_prefix,
+)
+from app.utils.upload_sessions import (
+    MAX_CHUNK_SIZE,
+    ChunkOutOfOrder,
+    UploadSession,
+    create_session,
+    drop_session,
+    finalize_session,
+    load_session,
+    staging_path,
+    write_chunk,
+)
+
+router = APIRouter(prefix=cnf.prefix_uploads, tags=["Resumable Uploads"])
+
+ALLOWED_EXTENSIONS = cnf.bval_allowed_extensions | cnf.fs_allowed_extensions
+
+
+def _session_response(session: UploadSession, exists: bool = False):
+    return UploadSessionResponse(
+        session_id=session.session_id,
+        filename=session.filename,
+        size=session.size,
+        sha1=session.sha1,
+        chunk_size=session.chunk_size,
+        chunk_count=session.chunk_count,
+        received=session.received,
+        next_chunk=session.next_chunk,
+        complete=session.complete,
+        exists=exists,
+    )
+
+
+def _get_session(session_id: str) -> UploadSession:
+    try:
+        session = load_session(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+@router.post("", response_model=UploadSessionResponse)
+async def start_upload(request: UploadSessionRequest):
+    """Open an upload session; nothing needs sending if the content is known."""
+    if not any(request.filename.lower().endswith(e) for e in ALLOWED_EXTENSIONS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Only files with extensions {sorted(ALLOWED_EXTENSIONS)} are allowed",
+        )
+
+    chunk_size = request.chunk_size or UPLOAD_CHUNK_SIZE
+    try:
+        check_compression_support(request.filename)
+        if has_blob(request.sha1, request.size):
+            session = UploadSession(
+                session_id="",
+                filename=request.filename,
+                size=request.size,
+                sha1=request.sha1,
+                chunk_size=chunk_size,
+                received=request.size,
+            )
+            return _session_response(session, exists=True)
+        session = create_session(
+            request.filename, request.size, request.sha1, chunk_size
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _session_response(session)
+
+
+@router.get("/{session_id}", response_model=UploadSessionResponse)
+async def get_upload(session_id: str):
+    """Offset to resume from: send chunks starting at `next_chunk`."""
+    return _session_response(_get_session(session_id))
+
+
+@router.put("/{session_id}/chunks/{index}", response_model=UploadSessionResponse)
+async def put_chunk(session_id: str, index: int, request: Request):
+    """
+    Upload chunk `index` as the raw request body.
+
+    The body is streamed to a part file in the session, never held in
+    memory. The first chunk of a beta CSV is validated from its first bytes
+    right away, so a malformed file is rejected (and its session dropped)
+    before the rest is sent.
+    """
+    session = _get_session(session_id)
+    validate = (
+        index == 0 and session.received == 0 and is_csv_filename(session.filename)
+    )
+
+    staged = staging_path(session_id)
+    try:
+        prefix = bytearray()
+        size = 0
+        try:
+            async with aiofiles.open(staged, "wb") as f:
+                async for part in request.stream():
+                    size += len(part)
+                    if size > MAX_CHUNK_SIZE:
+                        raise HTTPException(status_code=413, detail="Chunk too large")
+                    if validate and len(prefix) < PREFIX_BYTES:
+                        prefix += part[: PREFIX_BYTES - len(prefix)]
+                    await f.write(part)
+        except FileNotFoundError:  # the session was dropped meanwhile
+            raise HTTPException(status_code=404, detail="Upload session not found")
+
+        if validate:
+            try:
+                await run_in_threadpool(
+                    validate_csv_prefix,
+                    bytes(prefix),
+                    session.filename,
+                    session.chunk_count == 1,
+                )
+            except InvalidCsvError as e:
+                drop_session(session_id)
+                raise HTTPException(
+                    status_code=400, detail=f"CSV validation failed: {str(e)}"
+                )
+
+        try:
+            session = await run_in_threadpool(write_chunk, session_id, index, staged)
+        except ChunkOutOfOrder as e:
+            raise HTTPException(
+                status_code=409, detail={"message": str(e), "next_chunk": e.expected}
+            )
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        staged.unlink(missing_ok=True)
+    return _session_response(session)
+
+
+@router.post("/{session_id}/finalize", response_model=BlobUploadResponse)
+async def finalize_upload(session_id: str):
+    """Check the assembled file against its SHA1 and add it to the blob store."""
+    _get_session(session_id)
+    try:
+        saved = await run_in_threadpool(finalize_session, session_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return BlobUploadResponse(sha1=saved.sha1, size=saved.size)
+
+
+@router.delete("/{session_id}")
+async def cancel_upload(session_id: str):
+    """Abandon an upload and delete the chunks received so far."""
+    _get_session(session_id)
+    drop_session(session_id)
+    return {"message": f"Upload session {session_id} removed"}
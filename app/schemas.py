@@ -8,11 +8,14 @@ class Algorithm(str, Enum):
     ANOVA_TEST = "anova_ftest"
     DUMMY_CLASSIFIER = "dummy_classifier"
     GARSEN_OLDEN_MLP = "garsen_olden_mlp"
+    KRUSKAL_WALLIS = "kruskal_wallis"
     LASSO_LRC = "lasso_lrc"
+    MODERATED_TTEST = "moderated_ttest"
     RANDOM_FOREST = "random_forest"
     RFE_SVM = "rfe_svm"
     RIDGE_L2 = "ridge_l2"
     SHAP_XGBOOST = "shap_xgboost"
+    WELCH_TTEST = "welch_ttest"
     # Add new algorithms here as needed
 
 
@@ -77,6 +80,69 @@ class FileUploadResponse(BaseModel):
     file_count: int
 
 
+class ManifestFile(BaseModel):
+    name: str
+    size: int
+    sha1: str
+
+
+class BundleManifest(BaseModel):
+    bundle_id: str
+    files: list[ManifestFile]
+
+
+class ManifestResponse(BaseModel):
+    bundle_id: str
+    exists: bool
+    missing: list[ManifestFile]
+    message: str
+
+
+class BlobUploadResponse(BaseModel):
+    sha1: str
+    size: int
+
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int
+    sha1: str
+    chunk_size: int = None
+
+
+class UploadSessionResponse(BaseModel):
+    session_id: str
+    filename: str
+    size: int
+    sha1: str
+    chunk_size: int
+    chunk_count: int
+    received: int
+    next_chunk: int
+    complete: bool
+    exists: bool = False
+
+
+class BlobIngestRequest(BaseModel):
+    sha1: str
+    filename: str
+
+
+class PromoteTarget(str, Enum):
+    FS = "fs"
+    DMP = "dmp"
+
+
+class PromoteRequest(BaseModel):
+    targets: list[PromoteTarget] = [PromoteTarget.FS, PromoteTarget.DMP]
+
+
+class PromoteResponse(BaseModel):
+    sha1_hash: str  # the bval bundle
+    csv_sha1: str  # dataset id of its beta CSV in fs / dmp
+    results: dict[str, CSVUploadResponse]
+
+
 class FileProcessingStatus(BaseModel):
     task_id: str
     status: str
@@ -8,6 +8,7 @@ from fastapi import HTTPException
 
 from app.celery_tasks.dmp_tasks import dmp_selection_task
 from app.schemas import DMPRequest, DMPResponse
+from app.utils.beta_store import has_beta_store, read_store_labels
 
 
 class DmpRunService:
@@ -58,6 +59,23 @@ class DmpRunService:
                 detail=f"DMP analysis requires exactly 2 prognosis groups, got {len(selected)}",
             )
 
+        storage_dir = csv_file.parent
+        if has_beta_store(storage_dir):
+            uniques = set(str(v) for v in read_store_labels(storage_dir))
+        else:
+            uniques = self._read_csv_groups(csv_file)
+
+        missing = [g for g in selected if str(g) not in uniques]
+        if missing:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Selected prognosis values not found in file: {missing}",
+            )
+
+        # Return normalized values as strings
+        return str(selected[0]), str(selected[1])
+
+    def _read_csv_groups(self, csv_file: Path) -> set:
         # Ensure selected groups exist in CSV - read from first row (transposed structure)
         try:
             # Read first row to get prognosis values
@@ -96,15 +114,7 @@ class DmpRunService:
                 status_code=400, detail=f"Error parsing CSV file: {str(e)}"
             )
 
-        missing = [g for g in selected if str(g) not in uniques]
-        if missing:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Selected prognosis values not found in file: {missing}",
-            )
-
-        # Return normalized values as strings
-        return str(selected[0]), str(selected[1])
+        return uniques
 
     async def start(self, request: DMPRequest) -> DMPResponse:
         storage_dir = self._storage_dir(request.sha1_hash)
@@ -3,11 +3,14 @@ from typing import Callable, Dict
 from app.algorithms.anova_ftest import anova_ftest
 from app.algorithms.dummy_classifier import dummy_classifier
 from app.algorithms.garsen_olden_mlp import garsen_olden_mlp
+from app.algorithms.kruskal_wallis import kruskal_wallis
 from app.algorithms.lasso_logistic_regression import lasso_lrc
+from app.algorithms.moderated_ttest import moderated_ttest
 from app.algorithms.random_forest_varimp import random_forest_varimp
 from app.algorithms.rfe_svm import rfe_svm
 from app.algorithms.ridge_l2 import ridge_l2
 from app.algorithms.shap_xgboost import shap_xgboost
+from app.algorithms.welch_ttest import welch_ttest
 from app.schemas import Algorithm
 
 # Canonical registry keyed by the Algorithm enum
@@ -15,13 +18,34 @@ ALGORITHM_REGISTRY: Dict[Algorithm, Callable] = {
     Algorithm.ANOVA_TEST: anova_ftest,
     Algorithm.DUMMY_CLASSIFIER: dummy_classifier,
     Algorithm.GARSEN_OLDEN_MLP: garsen_olden_mlp,
+    Algorithm.KRUSKAL_WALLIS: kruskal_wallis,
     Algorithm.LASSO_LRC: lasso_lrc,
+    Algorithm.MODERATED_TTEST: moderated_ttest,
     Algorithm.RANDOM_FOREST: random_forest_varimp,
     Algorithm.RFE_SVM: rfe_svm,
     Algorithm.RIDGE_L2: ridge_l2,
     Algorithm.SHAP_XGBOOST: shap_xgboost,
+    Algorithm.WELCH_TTEST: welch_ttest,
     # Add new algorithms here as needed
 }
+# Rankings that tolerate 16-bit betas and may read the quantized store copy.
+# Each dequantizes only a block at a time: column blocks for the statistics
+# and linear models, row batches into a float32 QuantileDMatrix for XGBoost.
+# Random forest is left out: it would need a full float32 copy.
+QUANTIZED_ALGORITHMS = {
+    Algorithm.ANOVA_TEST,
+    Algorithm.KRUSKAL_WALLIS,
+    Algorithm.LASSO_LRC,
+    Algorithm.MODERATED_TTEST,
+    Algorithm.RFE_SVM,
+    Algorithm.RIDGE_L2,
+    Algorithm.SHAP_XGBOOST,
+    Algorithm.WELCH_TTEST,
+}
+# Rankings that report per-round progress and write a partial ranking
+PROGRESS_ALGORITHMS = {
+    Algorithm.RFE_SVM,
+}
 # Backwards-compatible mapping keyed by the string values (eg. used by some callers)
 ALGORITHMS: Dict[str, Callable] = {
     alg.value: fn for alg, fn in ALGORITHM_REGISTRY.items()
@@ -50,3 +74,13 @@ def get_algorithm(algorithm_name: str) -> Callable:
             f"Unknown algorithm: {algorithm_name}. Available: {list(ALGORITHMS.keys())}"
         )
     return algorithm_func
+
+
+def accepts_quantized(algorithm_name: str) -> bool:
+    """Whether the algorithm can consume the uint16 quantized beta store."""
+    return algorithm_name in {alg.value for alg in QUANTIZED_ALGORITHMS}
+
+
+def reports_progress(algorithm_name: str) -> bool:
+    """Whether the algorithm takes `notify` and `partial_path` (see fs_wrapper)."""
+    return algorithm_name in {alg.value for alg in PROGRESS_ALGORITHMS}
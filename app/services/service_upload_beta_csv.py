@@ -1,30 +1,37 @@
 from __future__ import annotations
 
 import contextlib
-import shutil
-import tempfile
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO
 
-import pandas as pd
 from fastapi import HTTPException, UploadFile
-
-from app.celery_tasks.task_analyze_bvals_csv import task_analyze_bvals_csv
+from fastapi.concurrency import run_in_threadpool
+
+from app.celery_tasks.task_analyze_bvals_csv import (
+    SHARED_ARTIFACTS,
+    task_analyze_bvals_csv,
+    task_build_beta_store,
+)
+from app.config import cnf
 from app.schemas import CSVUploadResponse
 from app.utils import file_utils as csvu
+from app.utils.beta_csv import PREFIX_BYTES, InvalidCsvError, PrefixValidator
+from app.utils.blob_store import (
+    blob_path,
+    has_blob,
+    intern_file,
+    link_blob,
+    link_derived,
+)
 
 
 class UploadBetaValuesCSVService:
     def __init__(self, workdir: Path):
         self.workdir = Path(workdir)
 
-    @contextlib.contextmanager
     def _tempdir(self):
-        td = tempfile.TemporaryDirectory()
-        try:
-            yield Path(td.name)
-        finally:
-            td.cleanup()
+        # same filesystem as the storage dirs, so the final move is a rename
+        return csvu.upload_tempdir()
 
     def _ensure_file_present_and_extension(self, file: UploadFile) -> None:
         if not file:
@@ -35,117 +42,204 @@ class UploadBetaValuesCSVService:
                 status_code=400,
                 detail=f"Only CSV files are allowed. Got: {suffix}",
             )
+        self._ensure_compression_supported(file.filename)
+
+    def _ensure_compression_supported(self, filename: str) -> None:
+        try:
+            csvu.check_compression_support(filename)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     def _verify_or_compute_sha1(
-        self, temp_file_path: Path, provided_id: Optional[str]
+        self,
+        temp_file_path: Path,
+        provided_id: str | None,
+        calculated_hash: str | None = None,
+        accepted_ids: tuple[str, ...] = (),
     ) -> str:
-        calculated_hash = csvu.calculate_file_sha1(temp_file_path)
-        if provided_id and provided_id != calculated_hash:
+        calculated_hash = calculated_hash or csvu.calculate_file_sha1(temp_file_path)
+        if provided_id and provided_id not in (calculated_hash, *accepted_ids):
             raise HTTPException(
                 status_code=400,
                 detail=f"Provided id does not match calculated hash. Expected: {calculated_hash}, Got: {provided_id}",
             )
-        return provided_id or calculated_hash
+        return calculated_hash
 
     def _ensure_not_already_uploaded(self, storage_dir: Path) -> bool:
         # Returns True if already uploaded
         return storage_dir.exists() and any(storage_dir.iterdir())
 
     def _validate_prognosis_column(self, temp_file_path: Path) -> None:
-        try:
-            # Read first 2 rows to get headers and first data row
-            df = pd.read_csv(temp_file_path, nrows=2)
-        except pd.errors.EmptyDataError:
-            raise HTTPException(status_code=400, detail="CSV file is empty")
-        except pd.errors.ParserError as e:
-            raise HTTPException(status_code=400, detail=f"Invalid CSV format: {str(e)}")
-        except Exception as e:
-            raise HTTPException(
-                status_code=400, detail=f"Error validating CSV file: {str(e)}"
-            )
+        # Same checks as during the upload stream, on the stored file's start
+        validator = PrefixValidator()
+        with open(temp_file_path, "rb") as f:
+            with self._csv_errors():
+                validator.feed(f.read(PREFIX_BYTES))
+                validator.close()
 
-        if len(df) < 1:
+    @contextlib.contextmanager
+    def _csv_errors(self):
+        try:
+            yield
+        except InvalidCsvError as e:
             raise HTTPException(
-                status_code=400,
-                detail="CSV file must contain at least 2 rows (sample headers and prognosis values row)",
+                status_code=400, detail=f"CSV validation failed: {str(e)}"
             )
 
-        # Check if first value of first row (index name) is "Prognosis"
-        first_row_index = str(df.index[0]) if not df.empty else str(df.iloc[0, 0])
-
-        # Try both index and first cell approaches
-        if first_row_index != "Prognosis":
-            # Check if first cell contains "Prognosis"
-            first_cell_value = str(df.iloc[0, 0]) if len(df) > 0 else ""
-            if first_cell_value != "Prognosis":
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"CSV validation failed: first row must start with 'Prognosis' (found: '{first_cell_value}'). Expected structure: columns are samples, first row contains prognosis values.",
+    @staticmethod
+    def _decompress(
+        src: BinaryIO | Path, temp_file_path: Path, compression: str
+    ) -> tuple[str, str]:
+        if isinstance(src, Path):
+            with open(src, "rb") as f:
+                return csvu.decompress_csv(
+                    f, temp_file_path, compression, PrefixValidator()
                 )
+        return csvu.decompress_csv(src, temp_file_path, compression, PrefixValidator())
 
-        # Check for prognosis values in the first row (excluding the "Prognosis" identifier)
+    async def _save_decompressed(
+        self, src: BinaryIO | Path, temp_file_path: Path, compression: str
+    ) -> tuple[str, str]:
+        # blocking file I/O and decompression run in a worker thread
         try:
-            first_row = df.iloc[0]  # First row with prognosis values
-            # Skip the first column if it contains "Prognosis", otherwise use all columns
-            if str(first_row.iloc[0]) == "Prognosis":
-                prognosis_values = first_row.iloc[
-                    1:
-                ].dropna()  # Skip "Prognosis" column
-            else:
-                prognosis_values = first_row.dropna()  # Use all values
-
-            if len(prognosis_values) == 0:
-                raise HTTPException(
-                    status_code=400,
-                    detail="First row contains 'Prognosis' identifier but no prognosis values found",
-                )
-        except Exception:
+            return await run_in_threadpool(
+                self._decompress, src, temp_file_path, compression
+            )
+        except InvalidCsvError as e:
             raise HTTPException(
-                status_code=400, detail="Error reading prognosis values from first row"
+                status_code=400, detail=f"CSV validation failed: {str(e)}"
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Could not decompress {compression} upload: {str(e)}",
             )
 
     async def handle_upload(
-        self, file: UploadFile, provided_id: Optional[str]
+        self, file: UploadFile, provided_id: str | None
     ) -> CSVUploadResponse:
         self._ensure_file_present_and_extension(file)
 
         with self._tempdir() as temp_dir:
-            # Save upload to temp
-            temp_file_path = await csvu.save_csv_file(file, temp_dir)
-
-            # Prepare identifiers and storage paths
-            sha1_hash = self._verify_or_compute_sha1(temp_file_path, provided_id)
-            storage_dir = self.workdir / sha1_hash
-            file_size = temp_file_path.stat().st_size
-
-            # Fast path if already uploaded
-            if self._ensure_not_already_uploaded(storage_dir):
-                return CSVUploadResponse(
-                    task_id="",
-                    sha1_hash=sha1_hash,
-                    message="File with this SHA1 hash already exists",
-                    filename=file.filename,
-                    file_size=file_size,
+            compression = csvu.csv_compression(file.filename)
+            # Both paths validate the file's start while it streams in, so a
+            # malformed upload is rejected without writing all of it
+            if compression:
+                # Decompress while streaming; the id is the SHA1 of the plain
+                # CSV so compressed and plain uploads of a dataset dedupe
+                temp_file_path = temp_dir / "bval_data.csv"
+                csv_hash, compressed_hash = await self._save_decompressed(
+                    file.file, temp_file_path, compression
+                )
+                # the frontend hashes the bytes it sends, i.e. the compressed file
+                sha1_hash = self._verify_or_compute_sha1(
+                    temp_file_path,
+                    provided_id,
+                    calculated_hash=csv_hash,
+                    accepted_ids=(compressed_hash,),
+                )
+            else:
+                # Stream upload to temp, hashing it on the way
+                with self._csv_errors():
+                    saved = await csvu.save_csv_file(file, temp_dir, PrefixValidator())
+                temp_file_path = saved.path
+                sha1_hash = self._verify_or_compute_sha1(
+                    temp_file_path, provided_id, calculated_hash=saved.sha1
                 )
 
-            # Validate schema before persisting
-            self._validate_prognosis_column(temp_file_path)
+            return await run_in_threadpool(
+                self._store_and_analyze,
+                temp_file_path,
+                sha1_hash,
+                file.filename,
+                validated=True,
+            )
 
-            # Persist and start processing
-            storage_dir.mkdir(parents=True, exist_ok=True)
-            final_file_path = storage_dir / "bval_data.csv"
-            shutil.copy2(temp_file_path, final_file_path)
+    async def handle_blob(self, sha1: str, filename: str) -> CSVUploadResponse:
+        """Ingest a CSV that arrived through a resumable upload session."""
+        if not csvu.is_csv_filename(filename):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Only CSV files are allowed. Got: {Path(filename).suffix}",
+            )
+        self._ensure_compression_supported(filename)
+        try:
+            if not has_blob(sha1):
+                raise HTTPException(status_code=404, detail="Upload not found")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-            task = task_analyze_bvals_csv.delay(
-                file_path=str(final_file_path),
+        with self._tempdir() as temp_dir:
+            temp_file_path = temp_dir / "bval_data.csv"
+            compression = csvu.csv_compression(filename)
+            if compression:
+                sha1_hash, _ = await self._save_decompressed(
+                    blob_path(sha1), temp_file_path, compression
+                )
+            else:
+                await run_in_threadpool(link_blob, sha1, temp_file_path)
+                sha1_hash = sha1
+            return await run_in_threadpool(
+                self._store_and_analyze,
+                temp_file_path,
+                sha1_hash,
+                filename,
+                validated=bool(compression),
+            )
+
+    def _store_and_analyze(
+        self,
+        temp_file_path: Path,
+        sha1_hash: str,
+        filename: str,
+        validated: bool = False,
+    ) -> CSVUploadResponse:
+        # Prepare storage paths
+        storage_dir = self.workdir / sha1_hash
+        file_size = temp_file_path.stat().st_size
+
+        # Fast path if already uploaded
+        if self._ensure_not_already_uploaded(storage_dir):
+            return CSVUploadResponse(
+                task_id="",
                 sha1_hash=sha1_hash,
-                storage_dir=str(storage_dir),
+                message="File with this SHA1 hash already exists",
+                filename=filename,
+                file_size=file_size,
             )
 
+        # Validate schema before persisting
+        if not validated:
+            self._validate_prognosis_column(temp_file_path)
+
+        # Persist as a hardlink to the CSV's blob, shared with the other module
+        storage_dir.mkdir(parents=True, exist_ok=True)
+        final_file_path = storage_dir / "bval_data.csv"
+        intern_file(temp_file_path, sha1_hash, final_file_path)
+
+        # Same CSV already analyzed elsewhere: reuse what was derived from it
+        if cnf.metadata_file in link_derived(sha1_hash, storage_dir, SHARED_ARTIFACTS):
+            task_build_beta_store.delay(
+                str(final_file_path), str(storage_dir), sha1_hash
+            )
             return CSVUploadResponse(
-                task_id=task.id,
+                task_id="",
                 sha1_hash=sha1_hash,
-                message="CSV file uploaded successfully. Analysis started.",
-                filename=file.filename,
+                message="CSV file uploaded successfully. Reusing an earlier analysis.",
+                filename=filename,
                 file_size=file_size,
             )
+
+        task = task_analyze_bvals_csv.delay(
+            file_path=str(final_file_path),
+            sha1_hash=sha1_hash,
+            storage_dir=str(storage_dir),
+        )
+
+        return CSVUploadResponse(
+            task_id=task.id,
+            sha1_hash=sha1_hash,
+            message="CSV file uploaded successfully. Analysis started.",
+            filename=filename,
+            file_size=file_size,
+        )
@@ -7,6 +7,7 @@ from app.routers.dmp_router import router as dmp_router
 from app.routers.docs import router as docs_router
 from app.routers.fs_router import router as fs_router
 from app.routers.html import router as htmlrouter
+from app.routers.upload_router import router as upload_router
 from app.routers.util import router as utilrouter
 
 check()
@@ -26,3 +27,4 @@ app.include_router(docs_router)
 app.include_router(bval_router)
 app.include_router(fs_router)
 app.include_router(dmp_router)
+app.include_router(upload_router)
@@ -1,82 +1,135 @@
+from dataclasses import dataclass
+from pathlib import Path
+
 import numpy as np
-import pandas as pd
+from pandas.api.types import is_numeric_dtype
 from sklearn.preprocessing import LabelEncoder
 
+from app.algorithms.workflow import NotifyCeleryTask
 from app.config import cnf
+from app.utils.beta_csv import read_beta_csv, read_beta_header
+from app.utils.beta_store import (
+    has_beta_store,
+    has_quantized_store,
+    open_beta_store,
+    open_quantized_store,
+    read_store_labels,
+)
 
 TAG = cnf.prognosis_column_name
 
 
+@dataclass(frozen=True)
+class FeatureMatrix:
+    """
+    Algorithm input that avoids a pandas copy of the beta matrix.
+
+    X is (n_samples, n_features) and may be a read-only np.memmap straight
+    from the beta store; y holds the encoded labels (ints 0..K-1). X holds
+    uint16 codes (see app.utils.beta_quant) when the quantized store is used.
+    """
+
+    X: np.ndarray
+    y: np.ndarray
+    features: np.ndarray
+
+
+def split_xy(data, label_col: str = TAG) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return (X, y, features) for either a FeatureMatrix or a DataFrame holding
+    numeric feature columns plus an already encoded `label_col`.
+    """
+    if isinstance(data, FeatureMatrix):
+        return data.X, data.y, data.features
+
+    if label_col not in data.columns:
+        raise ValueError(
+            f"Label column '{label_col}' not found. Columns: {list(data.columns)}"
+        )
+
+    y = data[label_col].to_numpy()
+    X = data.drop(columns=[label_col])
+
+    if not np.issubdtype(y.dtype, np.number):
+        raise ValueError(f"'{label_col}' must be numeric/encoded already.")
+
+    nonnum = [c for c in X.columns if not is_numeric_dtype(X[c])]
+    if nonnum:
+        raise ValueError(
+            f"Non-numeric feature columns found: {nonnum}. Encode/convert them first."
+        )
+
+    return X.to_numpy(), y, np.array(X.columns)
+
+
 def fs_wrapper(
     *,
     algorithm,
     csv_path,
     selected_prognosis: list = None,
     parent=None,
+    quantized: bool = False,
+    partial_path: Path | None = None,
 ) -> dict:
+    """
+    Load the dataset next to `csv_path` and run `algorithm` on it.
+
+    With `quantized` the uint16 copy of the beta store is handed to the
+    algorithm when it exists; only pass it for algorithms that accept it.
+    With `partial_path` the algorithm reports its own progress to `parent`
+    and writes its partial ranking there (see PROGRESS_ALGORITHMS).
+    """
     if parent:
         parent.update_state(
             state="PROCESSING", meta={"status": "Reading CSV file...", "progress": 1}
         )
+    storage_dir = Path(csv_path).parent
     try:
-        #     df = pd.read_csv(csv_path, encoding="utf-8", on_bad_lines="skip")
-        df_first = pd.read_csv(csv_path, nrows=1, index_col=0)
-        df_rest = pd.read_csv(csv_path, skiprows=[1], index_col=0, header=0)
-        df_first = df_first.T
-        df_rest = df_rest.T
-        df_rest["Prognosis"] = df_first["Prognosis"]
-        df_rest = df_rest.reset_index(drop=True)
-    #     df = pd.read_csv(csv_path, encoding="utf-8", on_bad_lines="skip")
-    # except UnicodeDecodeError:
-    #     df = pd.read_csv(csv_path, encoding="latin-1", on_bad_lines="skip")
-
-    # except pd.errors.EmptyDataError:
-    #     raise ValueError("CSV file is empty or has no valid data")
+        use_store = has_beta_store(storage_dir)
+        # Labels first, so only the selected samples are ever materialized
+        if use_store:
+            labels = read_store_labels(storage_dir)
+        else:
+            labels = read_beta_header(csv_path)[1]
+
+        all_prognosis = sorted(set(labels.tolist()))
+        rows = None
+        if selected_prognosis:
+            selected = np.isin(labels, selected_prognosis)
+            if not selected.all():
+                rows = np.flatnonzero(selected)
+                labels = labels[rows]
+        else:
+            selected_prognosis = all_prognosis
+
+        if use_store and quantized and has_quantized_store(storage_dir):
+            matrix = open_quantized_store(storage_dir)
+            betas = matrix.betas if rows is None else matrix.betas[rows]
+        elif use_store:
+            # memory-mapped, shared between concurrent jobs on the same dataset
+            matrix = open_beta_store(storage_dir)
+            # a row slice copies only the selected samples out of the memmap
+            betas = matrix.betas if rows is None else matrix.betas[rows]
+        else:
+            matrix = read_beta_csv(csv_path, sample_idx=rows)
+            betas = matrix.betas
     except Exception as e:
         raise ValueError(f"Error reading CSV file: {str(e)}")
 
-    if df_rest.empty:
-        raise ValueError("CSV file contains no data")
-
-    if TAG not in df_rest.columns:
-        raise ValueError(f"CSV file must contain a '{TAG}' column")
-
-    if parent:
-        parent.update_state(
-            state="PROCESSING", meta={"status": "Preparing data...", "progress": 10}
-        )
-    all_prognosis = list(df_rest[TAG].unique())
-    all_prognosis.sort()
+    features = matrix.cpgs
 
-    # Filter data for selected prognosis values
-    if selected_prognosis:
-        df_rest = df_rest[df_rest[TAG].isin(selected_prognosis)].copy()
-    else:
-        selected_prognosis = all_prognosis
+    if betas.size == 0:
+        raise ValueError("CSV file contains no data")
 
     if parent:
         parent.update_state(
             state="PROCESSING", meta={"status": "Encoding labels...", "progress": 20}
         )
 
-    # Prepare data for algorithm (encode Prognosis if needed)
-    df_for_algorithm = df_rest.copy()
-
     label_encoder = LabelEncoder()
-    df_for_algorithm[TAG] = label_encoder.fit_transform(df_for_algorithm[TAG])
-
-    # Only keep numeric columns for feature ranking
-    numeric_columns = df_for_algorithm.select_dtypes(
-        include=[np.number]
-    ).columns.tolist()
-    if TAG in numeric_columns:
-        numeric_columns.remove(TAG)
-
-    # Keep only Prognosis + numeric feature columns
-    df_for_algorithm = df_for_algorithm[[TAG] + numeric_columns]
-
-    if len(numeric_columns) == 0:
-        raise ValueError("No numeric columns found for feature ranking")
+    data = FeatureMatrix(
+        X=betas, y=label_encoder.fit_transform(labels), features=features
+    )
 
     # Run the feature ranking algorithm
     try:
@@ -86,18 +139,24 @@ def fs_wrapper(
                 meta={"status": "Running algorithm...", "progress": 30},
             )
 
-        feature_ranking = algorithm(df_for_algorithm)
+        if partial_path is not None:
+            feature_ranking = algorithm(
+                data, notify=NotifyCeleryTask(parent), partial_path=partial_path
+            )
+        else:
+            feature_ranking = algorithm(data)
     except Exception as e:
         raise ValueError(f"Error running {algorithm}: {str(e)}")
 
     return {
         "feature_ranking": feature_ranking,
-        "df": df_rest,
+        "data": data,
+        "labels": labels,
         "all_prognosis": all_prognosis,
         "selected_prognosis": selected_prognosis,
-        "total_samples": len(df_rest),
-        "features_ranked": len(numeric_columns),
-        "numeric_features_used": len(numeric_columns),
+        "total_samples": len(labels),
+        "features_ranked": len(features),
+        "numeric_features_used": len(features),
         "class_mapping": {
             str(i): str(class_name)
             for i, class_name in enumerate(label_encoder.classes_)
@@ -0,0 +1,329 @@
+"""
+Streaming reader for the beta-value upload layout.
+
+    ,S1,S2,S3,...            <- sample ids
+    Prognosis,A,B,A,...      <- prognosis label of every sample
+    cg0001,0.12,0.85,...     <- one row per CpG
+    ...
+
+CpG rows are parsed in chunks and written straight into a preallocated
+sample-major float32 matrix (optionally a .npy memmap on disk), so a parse
+never holds more than the matrix plus one chunk.
+"""
+
+import csv
+import io
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from app.config import cnf
+from app.utils.csv_engine import InvalidCsvError, iter_cpg_batches, resolve_engine
+
+TAG = cnf.prognosis_column_name
+
+CHUNK_ROWS = 20_000  # CpG rows per parsed chunk
+PREFIX_ROWS = 200  # CpG rows checked by validate_prefix while uploading
+PREFIX_BYTES = 4 * 1024 * 1024
+_BLOCK_SIZE = 1 << 24
+_LINE_FIRST_FIELD = re.compile(rb"^([^,\n]*)[^\n]*\n", re.M)
+_NA_VALUES = {"", "NA", "NaN", "nan", "NULL", "null", "N/A"}
+
+
+@dataclass(frozen=True)
+class BetaMatrix:
+    betas: np.ndarray  # (n_samples, n_cpgs) float32
+    cpgs: np.ndarray
+    samples: np.ndarray
+    labels: np.ndarray
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.betas.shape
+
+    def to_frame(self) -> pd.DataFrame:
+        """Sample-major DataFrame with CpG columns plus the prognosis column."""
+        df = pd.DataFrame(self.betas, columns=self.cpgs)
+        df[TAG] = self.labels
+        return df
+
+
+def read_beta_header(csv_path: str | Path) -> tuple[np.ndarray, np.ndarray]:
+    """Return (sample ids, prognosis labels) from the first two lines only."""
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        prognosis = next(reader, None)
+
+    _check_header(header, prognosis)
+    return np.array(header[1:], dtype=str), np.array(prognosis[1:], dtype=str)
+
+
+def _check_header(header: list[str] | None, prognosis: list[str] | None) -> None:
+    if not header or not prognosis:
+        raise ValueError(
+            "CSV file must contain a header and a prognosis row (transposed structure: columns=samples, rows=CpG sites)"
+        )
+    if prognosis[0] != TAG:
+        raise ValueError(
+            f"First data row must start with '{TAG}' (found: '{prognosis[0]}')"
+        )
+    if len(prognosis) != len(header):
+        raise ValueError(
+            f"Prognosis row has {len(prognosis) - 1} values but header has {len(header) - 1} samples"
+        )
+
+
+def _is_beta(value: str) -> bool:
+    if value.strip() in _NA_VALUES:
+        return True
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+def validate_prefix(data: bytes, complete: bool = False) -> None:
+    """
+    Check the layout from the first bytes of a beta CSV.
+
+    Looks at the header, the prognosis row, that every CpG row has as many
+    fields as the header (a wrong delimiter or broken quoting shows up here)
+    and that the values parse as numbers. Unless `complete`, `data` is the
+    start of a longer file and its last, possibly cut, line is ignored.
+    Raises InvalidCsvError.
+    """
+    if not complete:
+        data = data[: data.rfind(b"\n") + 1]
+    text = data.decode("utf-8-sig", errors="replace")
+    rows = [row for row in csv.reader(io.StringIO(text)) if row]
+    if not rows:
+        raise InvalidCsvError("CSV file is empty")
+
+    header = rows[0]
+    if len(header) < 2:
+        raise InvalidCsvError(
+            "CSV header has a single column; the file must be comma-separated"
+        )
+    try:
+        _check_header(header, rows[1] if len(rows) > 1 else None)
+    except ValueError as e:
+        raise InvalidCsvError(str(e)) from None
+    if not any(label.strip() for label in rows[1][1:]):
+        raise InvalidCsvError(
+            f"First row contains '{TAG}' identifier but no prognosis values found"
+        )
+
+    for row in rows[2:]:
+        if len(row) != len(header):
+            raise InvalidCsvError(
+                f"Row '{row[0]}' has {len(row)} fields but the header has {len(header)}; check the delimiter and quoting"
+            )
+        bad = next((v for v in row[1:] if not _is_beta(v)), None)
+        if bad is not None:
+            raise InvalidCsvError(f"Row '{row[0]}' has a non-numeric value: '{bad}'")
+
+
+class PrefixValidator:
+    """
+    Validates an upload from its first bytes while it streams in.
+
+    `feed` every chunk: the header and prognosis row are checked as soon as
+    they have arrived, and the sampled prefix once `rows` CpG rows (or
+    `max_bytes`) are in, so a malformed file is rejected before the rest is
+    transferred; later chunks are ignored. `close` at the end checks files
+    shorter than that.
+    """
+
+    def __init__(self, rows: int = PREFIX_ROWS, max_bytes: int = PREFIX_BYTES):
+        self.rows = rows
+        self.max_bytes = max_bytes
+        self.checked = False
+        self._buffer = bytearray()
+        self._lines = 0
+
+    def feed(self, chunk: bytes) -> None:
+        if self.checked:
+            return
+        header_pending = self._lines < 2
+        self._buffer += chunk[: self.max_bytes - len(self._buffer)]
+        self._lines += chunk.count(b"\n")
+        if self._lines > self.rows + 2 or len(self._buffer) >= self.max_bytes:
+            self._check(complete=False)
+        elif header_pending and self._lines >= 2:
+            validate_prefix(bytes(self._buffer))  # plus any complete rows so far
+
+    def close(self) -> None:
+        if not self.checked:
+            self._check(complete=True)
+
+    def _check(self, complete: bool) -> None:
+        self.checked = True
+        data, self._buffer = bytes(self._buffer), bytearray()
+        validate_prefix(data, complete=complete)
+
+
+def count_cpg_rows(csv_path: str | Path, block_size: int = _BLOCK_SIZE) -> int:
+    """
+    Number of CpG rows, counted without tokenizing the beta values.
+
+    Counts records the way the CSV parser does: blank lines are skipped and
+    a newline inside a quoted field (odd number of quotes before it) does
+    not end a record.
+    """
+    records = 0
+    quotes = 0
+    pending = False  # the record running into the next block has content
+    with open(csv_path, "rb") as f:
+        while block := f.read(block_size):
+            data = np.frombuffer(block, dtype=np.uint8)
+            newlines = np.flatnonzero(data == ord("\n"))
+            quote_at = np.flatnonzero(data == ord('"'))
+            ends = newlines[(quotes + np.searchsorted(quote_at, newlines)) % 2 == 0]
+            quotes += len(quote_at)
+
+            content = data > ord(" ")
+            if len(ends):
+                filled = np.logical_or.reduceat(
+                    content[: ends[-1] + 1], np.r_[0, ends[:-1] + 1]
+                )
+                filled[0] |= pending
+                records += int(filled.sum())
+                pending = bool(content[ends[-1] + 1 :].any())
+            else:
+                pending |= bool(content.any())
+    records += pending
+    return max(records - 2, 0)
+
+
+def iter_cpg_ids(
+    csv_path: str | Path, block_size: int = _BLOCK_SIZE
+) -> Iterator[np.ndarray]:
+    """
+    Yield the CpG ids (first column only) block by block.
+
+    Beta values are never tokenized, so a scan costs little more than reading
+    the file, and memory is bounded by `block_size`.
+    """
+    to_skip = 2  # header and prognosis row
+    tail = b""
+    with open(csv_path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            data = tail + block
+            if block:
+                cut = data.rfind(b"\n") + 1
+                data, tail = data[:cut], data[cut:]
+            elif data:
+                data += b"\n"  # last line without a trailing newline
+
+            if data:
+                ids = _LINE_FIRST_FIELD.findall(data)
+                if to_skip:
+                    skipped = min(to_skip, len(ids))
+                    ids, to_skip = ids[skipped:], to_skip - skipped
+                ids = np.char.strip(np.array(ids, dtype=bytes), b'"\r ')
+                ids = ids[np.char.str_len(ids) > 0]  # blank lines
+                if len(ids):
+                    yield ids.astype(str)
+
+            if not block:
+                break
+
+
+def iter_cpg_chunks(
+    csv_path: str | Path,
+    n_samples: int,
+    chunk_rows: int = CHUNK_ROWS,
+    sample_idx: np.ndarray | None = None,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    Yield (cpg ids, float32 block of shape (rows, samples)) per chunk.
+
+    With `sample_idx` (sorted sample positions) only those columns are parsed.
+    """
+    if sample_idx is None:
+        columns = list(range(1, n_samples + 1))
+    else:
+        columns = [int(i) + 1 for i in sample_idx]
+
+    dtype = {0: str, **{i: np.float32 for i in columns}}
+    reader = pd.read_csv(
+        csv_path,
+        header=None,
+        skiprows=2,
+        index_col=0,
+        usecols=[0, *columns],
+        dtype=dtype,
+        chunksize=chunk_rows,
+    )
+    with reader:
+        for chunk in reader:
+            yield chunk.index.to_numpy(dtype=str), chunk.to_numpy(dtype=np.float32)
+
+
+def _allocate(shape: tuple[int, int], out_path: str | Path | None) -> np.ndarray:
+    if out_path is None:
+        return np.empty(shape, dtype=np.float32)
+    return np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float32, shape=shape)
+
+
+def read_beta_csv(
+    csv_path: str | Path,
+    out_path: str | Path | None = None,
+    chunk_rows: int = CHUNK_ROWS,
+    sample_idx: np.ndarray | None = None,
+    engine: str | None = None,
+) -> BetaMatrix:
+    """
+    Parse the upload CSV in a single pass into a sample-major float32 matrix.
+
+    With `out_path` the matrix is written into a .npy memmap at that path
+    instead of RAM, and the returned `betas` is that memmap. With `sample_idx`
+    only those samples (positions in the header) are parsed and returned.
+    `engine` overrides `cnf.csv_engine`.
+    """
+    samples, labels = read_beta_header(csv_path)
+    n_samples = len(samples)
+    if sample_idx is not None:
+        sample_idx = np.unique(sample_idx)
+        samples, labels = samples[sample_idx], labels[sample_idx]
+
+    if resolve_engine(engine) == "pyarrow":
+        chunks = iter_cpg_batches(csv_path, n_samples, sample_idx)
+    else:
+        chunks = iter_cpg_chunks(csv_path, n_samples, chunk_rows, sample_idx)
+
+    shape = (len(samples), count_cpg_rows(csv_path))
+    betas = _allocate(shape, out_path)
+
+    cpg_chunks = []
+    start = 0
+    for cpgs, block in chunks:
+        stop = start + len(cpgs)
+        if stop > shape[1]:
+            start = stop
+            break
+        betas[:, start:stop] = block.T
+        cpg_chunks.append(cpgs)
+        start = stop
+
+    if start != shape[1]:
+        raise InvalidCsvError(
+            f"Parsed CpG rows do not match the {shape[1]} counted; check the quoting"
+        )
+
+    if isinstance(betas, np.memmap):
+        betas.flush()
+
+    return BetaMatrix(
+        betas=betas,
+        cpgs=np.concatenate(cpg_chunks) if cpg_chunks else np.array([], dtype=str),
+        samples=samples,
+        labels=labels,
+    )
@@ -0,0 +1,62 @@
+"""
+16-bit fixed-point codec for beta values.
+
+Betas live in [0, 1]; they are stored as uint16 codes with 1.0 == QUANT_MAX
+(max error ~7.6e-6, well below array measurement noise) and NAN_CODE for a
+missing value. Dequantization is vectorized and done in column blocks, so a
+consumer never needs a full float copy of the matrix at once.
+"""
+
+from typing import Iterator
+
+import numpy as np
+
+QUANT_DTYPE = np.uint16
+NAN_CODE = np.iinfo(QUANT_DTYPE).max  # missing beta
+QUANT_MAX = NAN_CODE - 1  # beta == 1.0
+BLOCK_COLS = 65_536  # CpGs per dequantized block
+
+_STEP = np.float32(1.0 / QUANT_MAX)
+
+
+def is_quantized(X: np.ndarray) -> bool:
+    return X.dtype == QUANT_DTYPE
+
+
+def quantize(betas: np.ndarray) -> np.ndarray:
+    """float betas -> uint16 codes; values outside [0, 1] are clipped."""
+    codes = np.rint(np.clip(betas, 0.0, 1.0) * np.float32(QUANT_MAX))
+    codes[np.isnan(betas)] = NAN_CODE
+    return codes.astype(QUANT_DTYPE)
+
+
+def dequantize(codes: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """uint16 codes -> float32 betas (NaN where the code is NAN_CODE)."""
+    out = np.multiply(codes, _STEP, out=out, dtype=np.float32)
+    out[codes == NAN_CODE] = np.nan
+    return out
+
+
+def float_block(X: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """float32 betas X[:, start:stop] of a quantized or float matrix."""
+    if is_quantized(X):
+        return dequantize(X[:, start:stop])
+    return np.asarray(X[:, start:stop], dtype=np.float32)
+
+
+def iter_dequantized_blocks(
+    codes: np.ndarray, block_cols: int = BLOCK_COLS
+) -> Iterator[tuple[int, int, np.ndarray]]:
+    """Yield (start, stop, float32 betas[:, start:stop]) over column blocks."""
+    for start in range(0, codes.shape[1], block_cols):
+        stop = min(start + block_cols, codes.shape[1])
+        yield start, stop, dequantize(codes[:, start:stop])
+
+
+def float_columns(X: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    """float32 X[:, columns] for sorted columns, sliced when contiguous."""
+    if len(columns) and columns[-1] - columns[0] + 1 == len(columns):
+        return float_block(X, columns[0], columns[-1] + 1)
+    if is_quantized(X):
+        return dequantize(X[:, columns])
+    return np.asarray(X[:, columns], dtype=np.float32)
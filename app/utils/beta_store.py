@@ -0,0 +1,194 @@
+"""
+Binary on-disk copy of an uploaded beta-value matrix.
+
+The upload CSV is CpG-major (one row per CpG, one column per sample, with the
+prognosis labels in the first data row). Every consumer however wants the
+sample-major layout, so the CSV is converted once at upload time into:
+
+    <storage_dir>/<cnf.beta_store_dir_name>/
+        betas.npy    float32, shape (n_samples, n_cpgs), C order
+        cpgs.npy     CpG ids (column labels of betas.npy)
+        samples.npy  sample ids (row labels of betas.npy)
+        labels.npy   prognosis label of every sample
+        cpgs_sorted.npy  CpG ids in sorted order ...
+        cpg_order.npy    ... and their columns in betas.npy (see cpg_columns)
+        betas_u16.npy  optional uint16 quantized copy of betas.npy
+                       (cnf.beta_store_quantized, see app.utils.beta_quant)
+"""
+
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from app.config import cnf
+from app.utils.beta_csv import BetaMatrix, read_beta_csv
+from app.utils.beta_quant import QUANT_DTYPE, quantize
+
+BETAS_FILE = "betas.npy"
+CPGS_FILE = "cpgs.npy"
+SAMPLES_FILE = "samples.npy"
+LABELS_FILE = "labels.npy"
+QUANT_BETAS_FILE = "betas_u16.npy"
+SORTED_CPGS_FILE = "cpgs_sorted.npy"
+CPG_ORDER_FILE = "cpg_order.npy"
+
+STORE_FILES = (BETAS_FILE, CPGS_FILE, SAMPLES_FILE, LABELS_FILE)
+
+QUANT_BLOCK_ROWS = 16  # samples quantized per block
+
+
+def store_dir(storage_dir: str | Path) -> Path:
+    return Path(storage_dir) / cnf.beta_store_dir_name
+
+
+def has_beta_store(storage_dir: str | Path) -> bool:
+    directory = store_dir(storage_dir)
+    return all((directory / name).exists() for name in STORE_FILES)
+
+
+def has_quantized_store(storage_dir: str | Path) -> bool:
+    return (
+        has_beta_store(storage_dir)
+        and (store_dir(storage_dir) / QUANT_BETAS_FILE).exists()
+    )
+
+
+def write_quantized_betas(directory: Path) -> int:
+    """Quantize betas.npy into betas_u16.npy block by block; returns its size."""
+    betas = np.load(directory / BETAS_FILE, mmap_mode="r")
+    codes = np.lib.format.open_memmap(
+        directory / QUANT_BETAS_FILE, mode="w+", dtype=QUANT_DTYPE, shape=betas.shape
+    )
+    for start in range(0, betas.shape[0], QUANT_BLOCK_ROWS):
+        stop = start + QUANT_BLOCK_ROWS
+        codes[start:stop] = quantize(betas[start:stop])
+    codes.flush()
+    return int(codes.nbytes)
+
+
+def write_beta_store(
+    csv_path: str | Path, storage_dir: str | Path, quantized: bool | None = None
+) -> dict:
+    """Convert an uploaded beta CSV into the binary store next to it."""
+    final_dir = store_dir(storage_dir)
+    tmp_dir = final_dir.with_name(f"{final_dir.name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    # CpG rows are streamed straight into the on-disk matrix
+    matrix = read_beta_csv(csv_path, out_path=tmp_dir / BETAS_FILE)
+    np.save(tmp_dir / CPGS_FILE, matrix.cpgs)
+    np.save(tmp_dir / SAMPLES_FILE, matrix.samples)
+    np.save(tmp_dir / LABELS_FILE, matrix.labels)
+    order = np.argsort(matrix.cpgs, kind="stable")
+    np.save(tmp_dir / SORTED_CPGS_FILE, matrix.cpgs[order])
+    np.save(tmp_dir / CPG_ORDER_FILE, order)
+
+    n_samples, n_cpgs = matrix.shape
+    info = {
+        "path": str(final_dir),
+        "samples": int(n_samples),
+        "cpgs": int(n_cpgs),
+        "dtype": str(matrix.betas.dtype),
+        "bytes": int(matrix.betas.nbytes),
+    }
+    del matrix  # flush and unmap before the directory is swapped in
+
+    if quantized is None:
+        quantized = cnf.beta_store_quantized
+    if quantized:
+        info["quantized_bytes"] = write_quantized_betas(tmp_dir)
+
+    # Swap in atomically so readers never see a half written store
+    shutil.rmtree(final_dir, ignore_errors=True)
+    tmp_dir.rename(final_dir)
+    return info
+
+
+def read_beta_store(
+    storage_dir: str | Path, mmap_mode: str | None = None
+) -> BetaMatrix:
+    directory = store_dir(storage_dir)
+    if not has_beta_store(storage_dir):
+        raise FileNotFoundError(f"Beta store not found: {directory}")
+
+    return BetaMatrix(
+        betas=np.load(directory / BETAS_FILE, mmap_mode=mmap_mode),
+        cpgs=np.load(directory / CPGS_FILE),
+        samples=np.load(directory / SAMPLES_FILE),
+        labels=np.load(directory / LABELS_FILE),
+    )
+
+
+def open_beta_store(storage_dir: str | Path) -> BetaMatrix:
+    """
+    Zero-copy accessor: the matrix is a read-only np.memmap over betas.npy.
+
+    Concurrent workers opening the same dataset share the OS page cache
+    instead of each holding a private copy of the matrix.
+    """
+    return read_beta_store(storage_dir, mmap_mode="r")
+
+
+def open_quantized_store(storage_dir: str | Path) -> BetaMatrix:
+    """Like `open_beta_store`, but `betas` is the read-only uint16 memmap."""
+    directory = store_dir(storage_dir)
+    if not has_quantized_store(storage_dir):
+        raise FileNotFoundError(f"Quantized beta store not found: {directory}")
+
+    return BetaMatrix(
+        betas=np.load(directory / QUANT_BETAS_FILE, mmap_mode="r"),
+        cpgs=np.load(directory / CPGS_FILE),
+        samples=np.load(directory / SAMPLES_FILE),
+        labels=np.load(directory / LABELS_FILE),
+    )
+
+
+def read_store_labels(storage_dir: str | Path) -> np.ndarray:
+    """Prognosis labels only, without touching the matrix."""
+    return np.load(store_dir(storage_dir) / LABELS_FILE)
+
+
+def cpg_columns(storage_dir: str | Path, cpg_ids) -> np.ndarray:
+    """
+    Columns of betas.npy holding `cpg_ids`, in query order; ids the dataset
+    does not have are left out. A binary search over the memory-mapped
+    sorted ids, so a query never loads or hashes every CpG id.
+    """
+    directory = store_dir(storage_dir)
+    try:
+        keys = np.load(directory / SORTED_CPGS_FILE, mmap_mode="r")
+        order = np.load(directory / CPG_ORDER_FILE, mmap_mode="r")
+    except FileNotFoundError:  # store written before the sorted index
+        cpgs = np.load(directory / CPGS_FILE)
+        order = np.argsort(cpgs, kind="stable")
+        keys = cpgs[order]
+
+    query = np.asarray(list(cpg_ids), dtype=str)
+    if not len(keys) or not len(query):
+        return np.empty(0, dtype=np.int64)
+    found = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    hit = keys[found] == query
+    return np.asarray(order[found[hit]], dtype=np.int64)
+
+
+def read_store_cpgs(storage_dir: str | Path, cpg_ids) -> BetaMatrix:
+    """
+    Only the columns of `cpg_ids` the dataset has (see `cpg_columns`), read
+    from memory-mapped betas.npy and cpgs.npy, so neither the matrix nor
+    the full list of CpG ids is loaded.
+    """
+    directory = store_dir(storage_dir)
+    if not has_beta_store(storage_dir):
+        raise FileNotFoundError(f"Beta store not found: {directory}")
+
+    columns = cpg_columns(storage_dir, cpg_ids)
+    betas = np.load(directory / BETAS_FILE, mmap_mode="r")
+    cpgs = np.load(directory / CPGS_FILE, mmap_mode="r")
+    return BetaMatrix(
+        betas=np.asarray(betas[:, columns]),
+        cpgs=np.asarray(cpgs[columns]),
+        samples=np.load(directory / SAMPLES_FILE),
+        labels=np.load(directory / LABELS_FILE),
+    )
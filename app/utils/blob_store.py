@@ -0,0 +1,245 @@
+"""
+Content-addressed store for uploaded files, shared by every bundle.
+
+    <BLOB_DIR>/<sha1[:2]>/<sha1>        one read-only file per content hash
+    <BLOB_DIR>/manifests/<bundle>.json  file list of a bundle being uploaded
+    <BLOB_DIR>/derived/<sha1>/          artifacts computed from a beta CSV
+
+Bundles that share IDATs only transfer the blobs the server does not have
+yet; committing a bundle hardlinks its blobs into the bundle's `in/` dir.
+The fs and dmp workdirs hardlink their `bval_data.csv` the same way, and
+share what was derived from it (profile, analysis JSON, binary store), so a
+CSV uploaded to both modules is stored and analyzed once.
+
+Blobs are read-only (0o444), and a hardlink shares its blob's inode, so every
+linked file in a workdir is read-only too. Never open one for writing: a new
+version is written to a new file that replaces the link (or the link is
+unlinked first), otherwise every dataset holding that content changes too.
+
+A blob's mtime records when it was last added or linked; prune_blobs deletes
+blobs that nothing links to and that have not been used for a while.
+"""
+
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from fastapi import UploadFile
+
+from app.config import cnf
+from app.utils.file_utils import (
+    SavedFile,
+    calculate_file_sha1,
+    stream_upload,
+    upload_tempdir,
+)
+
+BLOB_DIR = cnf.blob_dir
+
+_SHA1 = re.compile(r"^[0-9a-f]{40}$")
+
+
+def is_sha1(value: str) -> bool:
+    return bool(_SHA1.match(value))
+
+
+def blob_path(sha1: str) -> Path:
+    if not is_sha1(sha1):
+        raise ValueError(f"Invalid SHA1: {sha1}")
+    return BLOB_DIR / sha1[:2] / sha1
+
+
+def has_blob(sha1: str, size: int | None = None) -> bool:
+    path = blob_path(sha1)
+    return path.exists() and (size is None or path.stat().st_size == size)
+
+
+def missing_blobs(files: list[SavedFile]) -> list[SavedFile]:
+    """Manifest entries whose content the server does not hold yet."""
+    return [f for f in files if not has_blob(f.sha1, f.size)]
+
+
+def touch_blob(sha1: str) -> None:
+    """Record that a blob is in use now (its mtime), see prune_blobs."""
+    os.utime(blob_path(sha1))
+
+
+def add_blob(path: Path, sha1: str) -> Path:
+    """Move an already hashed file into the store (read-only from then on)."""
+    target = blob_path(sha1)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    path.chmod(0o444)  # blobs are hardlinked into bundles; never edit in place
+    shutil.move(path, target)
+    touch_blob(sha1)
+    return target
+
+
+async def put_blob(file: UploadFile, sha1: str) -> SavedFile:
+    """Stream an upload into the store, checking it hashes to `sha1`."""
+    blob_path(sha1)  # validates the id before anything is written
+    with upload_tempdir() as temp_dir:
+        saved = await stream_upload(file, temp_dir / "blob")
+        if saved.sha1 != sha1:
+            raise ValueError(
+                f"Uploaded content does not match its hash. Expected: {sha1}, Got: {saved.sha1}"
+            )
+        if has_blob(sha1, saved.size):
+            touch_blob(sha1)
+        else:
+            add_blob(saved.path, sha1)
+    return SavedFile(path=blob_path(sha1), size=saved.size, sha1=sha1)
+
+
+def link_blob(sha1: str, target: Path) -> Path:
+    """Hardlink a blob to `target`, copying if the filesystem cannot link."""
+    try:
+        os.link(blob_path(sha1), target)
+    except OSError:
+        shutil.copyfile(blob_path(sha1), target)
+    touch_blob(sha1)
+    return target
+
+
+def intern_file(path: Path, sha1: str, target: Path | None = None) -> Path:
+    """
+    Replace an already hashed file by a hardlink to its blob.
+
+    The file is moved into the store, unless its content is there already,
+    and linked back at `target` (default: where it was).
+    """
+    target = target or path
+    if has_blob(sha1, path.stat().st_size):
+        path.unlink()
+    else:
+        add_blob(path, sha1)
+    return link_blob(sha1, target)
+
+
+def recorded_sha1(path: Path) -> str:
+    """
+    SHA1 of a pipeline output, interned as a blob the first time it is asked.
+
+    The hash is kept in a `<name>.sha1` sidecar, so it is computed only once.
+    """
+    sidecar = path.with_name(f"{path.name}.sha1")
+    if sidecar.exists():
+        return sidecar.read_text().strip()
+    sha1 = calculate_file_sha1(path)
+    intern_file(path, sha1)
+    sidecar.write_text(sha1)
+    return sha1
+
+
+def derived_dir(sha1: str) -> Path:
+    if not is_sha1(sha1):
+        raise ValueError(f"Invalid SHA1: {sha1}")
+    return BLOB_DIR / "derived" / sha1
+
+
+def _link_tree(src: Path, dst: Path) -> None:
+    if src.is_dir():
+        dst.mkdir()
+        for child in src.iterdir():
+            _link_tree(child, dst / child.name)
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _link_into(src: Path, dst: Path) -> None:
+    """Link a file or directory tree to `dst`, which appears all at once."""
+    staging = dst.with_name(f".{dst.name}-{uuid.uuid4().hex}")
+    _link_tree(src, staging)
+    try:
+        os.rename(staging, dst)
+    except OSError:  # a concurrent writer got there first
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.unlink(missing_ok=True)
+
+
+def share_derived(sha1: str, storage_dir: str | Path, names: list[str]) -> None:
+    """Publish finished artifacts of `storage_dir` under the CSV's hash."""
+    shared = derived_dir(sha1)
+    shared.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        src = Path(storage_dir) / name
+        if src.exists() and not (shared / name).exists():
+            _link_into(src, shared / name)
+
+
+def link_derived(sha1: str, storage_dir: str | Path, names: list[str]) -> list[str]:
+    """Link shared artifacts into `storage_dir`; returns the names available."""
+    shared = derived_dir(sha1)
+    available = []
+    for name in names:
+        if not (shared / name).exists():
+            continue
+        if not (Path(storage_dir) / name).exists():
+            _link_into(shared / name, Path(storage_dir) / name)
+        available.append(name)
+    return available
+
+
+def _manifest_path(bundle_id: str) -> Path:
+    if not is_sha1(bundle_id):
+        raise ValueError(f"Invalid bundle id: {bundle_id}")
+    return BLOB_DIR / "manifests" / f"{bundle_id}.json"
+
+
+def save_manifest(bundle_id: str, files: list[SavedFile]) -> None:
+    path = _manifest_path(bundle_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entries = [{"name": f.path.name, "size": f.size, "sha1": f.sha1} for f in files]
+    path.write_text(json.dumps(entries))
+
+
+def load_manifest(bundle_id: str) -> list[SavedFile] | None:
+    path = _manifest_path(bundle_id)
+    if not path.exists():
+        return None
+    return [
+        SavedFile(path=Path(e["name"]), size=e["size"], sha1=e["sha1"])
+        for e in json.loads(path.read_text())
+    ]
+
+
+def drop_manifest(bundle_id: str) -> None:
+    _manifest_path(bundle_id).unlink(missing_ok=True)
+
+
+def prune_blobs(min_age: float = 24 * 3600) -> int:
+    """
+    Delete blobs no workdir links to any more; returns the bytes freed.
+
+    A blob with a single link is only referenced by the store. Blobs listed
+    in a pending manifest, uploads still in progress, and blobs added or
+    linked less than `min_age` seconds ago (e.g. a finished resumable upload
+    awaiting its commit) are kept. Abandoned upload sessions are swept first.
+    """
+    # upload_sessions builds on this module
+    from app.utils.upload_sessions import open_upload_sha1s, sweep_sessions
+
+    sweep_sessions()
+    manifests = BLOB_DIR / "manifests"
+    keep = open_upload_sha1s() | {
+        f.sha1
+        for path in (manifests.glob("*.json") if manifests.exists() else [])
+        for f in load_manifest(path.stem) or []
+    }
+    # mtime, not ctime: unlinking a workdir's hardlink updates the ctime
+    cutoff = time.time() - min_age
+    freed = 0
+    for path in BLOB_DIR.glob("??/*"):
+        stat = path.stat()
+        if stat.st_nlink > 1 or path.name in keep or stat.st_mtime > cutoff:
+            continue
+        path.unlink()
+        shutil.rmtree(derived_dir(path.name), ignore_errors=True)
+        freed += stat.st_size
+    return freed
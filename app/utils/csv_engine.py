@@ -0,0 +1,137 @@
+"""
+Pluggable CSV ingestion engines.
+
+pyarrow's reader parses blocks on every core and converts straight into a
+declared schema (string ids, float32 values); pandas' single-threaded C
+parser is the fallback when pyarrow (the "arrow" extra) is not installed. The engine is picked
+with `cnf.csv_engine`: "auto" (pyarrow when available), "pyarrow" or "pandas".
+"""
+
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+from app.config import cnf
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional dependency
+    pa = pa_csv = None
+
+ENGINES = ("auto", "pyarrow", "pandas")
+ARROW_BLOCK_BYTES = 1 << 24  # CSV bytes per streamed record batch
+
+
+class InvalidCsvError(ValueError):
+    """The file cannot be parsed as the expected CSV."""
+
+
+def resolve_engine(engine: str | None = None) -> str:
+    """Concrete engine ("pyarrow" or "pandas") for a configured name."""
+    engine = (engine or cnf.csv_engine).lower()
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown CSV engine '{engine}', expected one of {ENGINES}")
+    if engine == "pandas" or pa_csv is None:
+        return "pandas"
+    return "pyarrow"
+
+
+def iter_cpg_batches(
+    csv_path: str | Path,
+    n_samples: int,
+    sample_idx: np.ndarray | None = None,
+    block_size: int = ARROW_BLOCK_BYTES,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    Stream the CpG rows of an upload CSV with pyarrow.
+
+    Yields (cpg ids, float32 block of shape (rows, samples)) per record
+    batch of about `block_size` bytes of CSV, so the table is never held
+    whole next to the matrix being filled.
+    """
+    names = [f"c{i}" for i in range(n_samples + 1)]
+    if sample_idx is None:
+        columns = names[1:]
+    else:
+        columns = [names[int(i) + 1] for i in sample_idx]
+
+    reader = pa_csv.open_csv(
+        csv_path,
+        read_options=pa_csv.ReadOptions(
+            skip_rows=2, column_names=names, use_threads=True, block_size=block_size
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={names[0]: pa.string(), **{c: pa.float32() for c in columns}},
+            include_columns=[names[0], *columns],
+        ),
+    )
+    with reader:
+        for batch in reader:
+            if not batch.num_rows:
+                continue
+            cpgs = batch.column(0).to_numpy(zero_copy_only=False).astype(str)
+            block = np.empty((batch.num_rows, len(columns)), dtype=np.float32)
+            for j in range(len(columns)):
+                block[:, j] = batch.column(j + 1).to_numpy(zero_copy_only=False)
+            yield cpgs, block
+
+
+def _read_frame_pyarrow(
+    csv_path: str | Path, sep: str, decimal: str, encoding: str
+) -> pd.DataFrame:
+    try:
+        table = pa_csv.read_csv(
+            csv_path,
+            read_options=pa_csv.ReadOptions(encoding=encoding, use_threads=True),
+            parse_options=pa_csv.ParseOptions(
+                delimiter=sep, invalid_row_handler=lambda row: "skip"
+            ),
+            convert_options=pa_csv.ConvertOptions(decimal_point=decimal),
+        )
+    except (pa.ArrowInvalid, UnicodeDecodeError) as e:
+        raise InvalidCsvError(str(e)) from e
+
+    # text that does not decode is inferred as binary rather than rejected
+    undecoded = [f.name for f in table.schema if pa.types.is_binary(f.type)]
+    if undecoded:
+        raise InvalidCsvError(f"Columns {undecoded} are not valid {encoding} text")
+
+    # float32 is all the precision a beta value carries
+    schema = pa.schema(
+        [
+            field.with_type(pa.float32()) if pa.types.is_floating(field.type) else field
+            for field in table.schema
+        ]
+    )
+    return table.cast(schema).to_pandas()
+
+
+def read_frame(
+    csv_path: str | Path,
+    *,
+    sep: str = ",",
+    decimal: str = ".",
+    encoding: str = "utf-8",
+    engine: str | None = None,
+) -> pd.DataFrame:
+    """
+    Read a header-first CSV into a DataFrame, skipping malformed lines.
+
+    The pyarrow engine stores float columns as float32; the pandas engine
+    keeps pandas' own type inference. Either engine raises InvalidCsvError
+    for an empty file, text that is not in `encoding` or a parse failure.
+    """
+    if Path(csv_path).stat().st_size == 0:
+        raise InvalidCsvError("CSV file is empty")
+    if resolve_engine(engine) == "pyarrow":
+        return _read_frame_pyarrow(csv_path, sep, decimal, encoding)
+
+    try:
+        return pd.read_csv(
+            csv_path, sep=sep, decimal=decimal, encoding=encoding, on_bad_lines="skip"
+        )
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise InvalidCsvError(str(e)) from e
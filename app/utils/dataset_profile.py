@@ -0,0 +1,83 @@
+"""
+Small JSON summary of an uploaded dataset, written once by the analysis task.
+
+Endpoints that only need dimensions and label counts read this instead of
+the CSV. Parsed profiles are cached per process and re-read when the file's
+mtime changes.
+"""
+
+import json
+from pathlib import Path
+
+from app.config import cnf
+
+_CACHE: dict[Path, tuple[int, dict]] = {}
+
+
+def profile_path(storage_dir: str | Path) -> Path:
+    return Path(storage_dir) / cnf.profile_file
+
+
+def build_profile(
+    *,
+    filename: str,
+    file_size: int,
+    n_cpgs: int,
+    labels: list[str],
+    array_types: list[str],
+    matrix_bytes: int,
+    dtype: str = "float32",
+) -> dict:
+    """
+    `labels` holds the prognosis label of every sample in header order;
+    samples with a blank label count towards n_samples and blank_labels
+    but are not a label of their own.
+    """
+    label_counts = {}
+    blank = 0
+    for label in labels:
+        if not label.strip():
+            blank += 1
+            continue
+        label_counts[label] = label_counts.get(label, 0) + 1
+
+    return {
+        "filename": filename,
+        "file_size": int(file_size),
+        "n_cpgs": int(n_cpgs),
+        "n_samples": len(labels),
+        "unique_labels": sorted(label_counts),
+        "label_counts": label_counts,
+        "blank_labels": blank,
+        "array_types": list(array_types),
+        "matrix_bytes": int(matrix_bytes),
+        "dtype": dtype,
+    }
+
+
+def write_profile(storage_dir: str | Path, profile: dict) -> Path:
+    path = profile_path(storage_dir)
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(profile, f, indent=2)
+    tmp.replace(path)
+    return path
+
+
+def load_profile(storage_dir: str | Path) -> dict | None:
+    """Cached profile for a dataset, or None if it has not been analyzed yet."""
+    path = profile_path(storage_dir)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        _CACHE.pop(path, None)
+        return None
+
+    cached = _CACHE.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path) as f:
+        profile = json.load(f)
+    _CACHE[path] = (mtime, profile)
+    return profile
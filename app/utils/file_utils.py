@@ -2,15 +2,36 @@
 CSV utility functions for data processing operations.
 """
 
+import contextlib
+import gzip
 import hashlib
-from io import StringIO
+import shutil
+import tempfile
+import uuid
+import zlib
+from dataclasses import dataclass
+from io import BytesIO, StringIO
 from pathlib import Path
+from typing import BinaryIO
 
 import aiofiles
 import pandas as pd
 from fastapi import HTTPException, UploadFile
 
 from app.config import cnf
+from app.utils.beta_csv import PREFIX_BYTES, PrefixValidator
+
+try:
+    import zstandard
+except ImportError:  # optional dependency, needed for .csv.zst uploads
+    zstandard = None
+
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+ZSTD_MISSING = (
+    "zstd support not installed; install the 'zstd' extra to upload .csv.zst files"
+)
 
 
 def csv2first_n_rows(csv_file: str, num_rows: int) -> str:
@@ -35,50 +56,155 @@ def calculate_file_sha1(file_path: Path) -> str:
     return sha1.hexdigest()
 
 
-def calculate_sha1_hashes(file_paths: list[Path]) -> str:
-    """Calculate SHA1 hash using manifest approach (matches JavaScript implementation)."""
+@dataclass(frozen=True)
+class SavedFile:
+    """An upload written to disk, hashed while it was written."""
+
+    path: Path
+    size: int
+    sha1: str
+
+
+def manifest_sha1(files: list[SavedFile]) -> str:
+    """Bundle SHA1 using manifest approach (matches JavaScript implementation)."""
     # Filter and sort files like JavaScript does
-    filtered_files = []
-    for file_path in file_paths:
-        name_lower = file_path.name.lower()
-        if name_lower.endswith(".csv") or name_lower.endswith(".idat"):
-            filtered_files.append(file_path)
+    filtered_files = [
+        f for f in files if f.path.name.lower().endswith((".csv", ".idat"))
+    ]
 
     if not filtered_files:
         return ""
 
     # Sort by relative path (just filename in this case)
-    filtered_files.sort(key=lambda f: f.name)
+    filtered_files.sort(key=lambda f: f.path.name)
 
     # Build manifest lines like JavaScript
-    lines = []
-    for file_path in filtered_files:
-        # Calculate individual file SHA-1
-        file_sha1 = hashlib.sha1()
-        with open(file_path, "rb") as f:
-            while chunk := f.read(8192):
-                file_sha1.update(chunk)
-
-        file_size = file_path.stat().st_size
-        file_hash = file_sha1.hexdigest()
-
-        # Format: "filename\nsize\nhash\n"
-        lines.append(f"{file_path.name}\n{file_size}\n{file_hash}\n")
+    # Format: "filename\nsize\nhash\n"
+    lines = [f"{f.path.name}\n{f.size}\n{f.sha1}\n" for f in filtered_files]
 
     # Create canonical manifest and hash it
     canonical = "".join(lines)
-    manifest_sha1 = hashlib.sha1(canonical.encode("utf-8"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
 
-    return manifest_sha1.hexdigest()
+
+def calculate_sha1_hashes(file_paths: list[Path]) -> str:
+    """Calculate SHA1 hash using manifest approach (matches JavaScript implementation)."""
+    return manifest_sha1(
+        [
+            SavedFile(
+                path=path, size=path.stat().st_size, sha1=calculate_file_sha1(path)
+            )
+            for path in file_paths
+            if path.name.lower().endswith((".csv", ".idat"))
+        ]
+    )
 
 
 def validate_csv_file(file: UploadFile) -> bool:
-    """Validate that the file is a CSV."""
-    if not file.filename:
+    """Validate that the file is a CSV, plain or compressed (e.g. .csv.gz)."""
+    return is_csv_filename(file.filename)
+
+
+def is_csv_filename(filename: str | None) -> bool:
+    if not filename:
         return False
 
-    extension = Path(file.filename).suffix.lower()
-    return extension in cnf.fs_allowed_extensions
+    name = filename.lower()
+    return any(name.endswith(extension) for extension in cnf.fs_allowed_extensions)
+
+
+def csv_compression(filename: str) -> str | None:
+    """Compression of an uploaded CSV from its name: "gzip", "zstd" or None."""
+    return COMPRESSIONS.get(Path(filename).suffix.lower())
+
+
+def check_compression_support(filename: str) -> None:
+    """Raise ValueError if this install cannot decompress `filename`."""
+    if csv_compression(filename) == "zstd" and zstandard is None:
+        raise ValueError(ZSTD_MISSING)
+
+
+class _HashingReader:
+    """File-like wrapper that hashes the bytes read through it."""
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.sha1 = hashlib.sha1()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.sha1.update(data)
+        return data
+
+
+def decompress_csv(
+    src: BinaryIO,
+    dst_path: Path,
+    compression: str,
+    validator: PrefixValidator | None = None,
+) -> tuple[str, str]:
+    """
+    Stream-decompress `src` into `dst_path`.
+
+    Returns (sha1 of the decompressed CSV, sha1 of the compressed bytes). The
+    first one is the canonical dataset id, so a CSV uploaded plain or
+    compressed maps to the same dataset. The decompressed bytes are fed to
+    `validator`, if given.
+    """
+    compressed = _HashingReader(src)
+    if compression == "gzip":
+        reader = gzip.GzipFile(fileobj=compressed, mode="rb")
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ValueError(ZSTD_MISSING)
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            compressed, read_across_frames=True, closefd=False
+        )
+    else:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+    sha1 = hashlib.sha1()
+    with reader, open(dst_path, "wb") as out:
+        while chunk := reader.read(DECOMPRESS_CHUNK_SIZE):
+            if validator:
+                validator.feed(chunk)
+            sha1.update(chunk)
+            out.write(chunk)
+    if validator:
+        validator.close()
+
+    # drain anything the decompressor did not need (trailing padding)
+    while compressed.read(DECOMPRESS_CHUNK_SIZE):
+        pass
+    return sha1.hexdigest(), compressed.sha1.hexdigest()
+
+
+def validate_csv_prefix(data: bytes, filename: str, complete: bool = False) -> None:
+    """
+    Run the beta CSV checks on the first bytes of an upload, e.g. its first
+    chunk. Compressed uploads are partially decompressed first. Nothing is
+    checked if the prefix is too short to hold enough rows.
+    """
+    compression = csv_compression(filename)
+    if compression == "gzip":
+        data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data, PREFIX_BYTES)
+        complete = False
+    elif compression == "zstd":
+        if zstandard is None:
+            return
+        reader = zstandard.ZstdDecompressor().stream_reader(BytesIO(data))
+        out = bytearray()
+        with contextlib.suppress(zstandard.ZstdError):
+            while len(out) < PREFIX_BYTES and (
+                part := reader.read(PREFIX_BYTES - len(out))
+            ):
+                out += part
+        data, complete = bytes(out), False
+
+    validator = PrefixValidator()
+    validator.feed(data)
+    if complete:
+        validator.close()
 
 
 def validate_file_extensions(files: list[UploadFile]) -> bool:
@@ -91,37 +217,93 @@ def validate_file_extensions(files: list[UploadFile]) -> bool:
     return True
 
 
-async def save_csv_file(file: UploadFile, temp_dir: Path) -> Path:
-    """Save uploaded CSV file to temporary directory."""
-    if not file.filename:
-        raise HTTPException(status_code=400, detail="Filename is required")
+@contextlib.contextmanager
+def upload_tempdir():
+    """Temporary directory on the same filesystem as the storage dirs."""
+    cnf.upload_tmpdir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=cnf.upload_tmpdir) as td:
+        yield Path(td)
+
+
+async def stream_upload(
+    file: UploadFile, file_path: Path, validator: PrefixValidator | None = None
+) -> SavedFile:
+    """
+    Write an upload to disk chunk by chunk, hashing it in the same pass.
 
-    file_path = temp_dir / file.filename
+    Chunks also go through `validator`, which stops the upload as soon as
+    the start of the file shows it is malformed.
+    """
+    sha1 = hashlib.sha1()
+    size = 0
+    await file.seek(0)
 
     async with aiofiles.open(file_path, "wb") as f:
-        content = await file.read()
-        await f.write(content)
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            if validator:
+                validator.feed(chunk)
+            sha1.update(chunk)
+            size += len(chunk)
+            await f.write(chunk)
+    if validator:
+        validator.close()
+
+    return SavedFile(path=file_path, size=size, sha1=sha1.hexdigest())
 
-    return file_path
 
+async def save_csv_file(
+    file: UploadFile, temp_dir: Path, validator: PrefixValidator | None = None
+) -> SavedFile:
+    """Stream an uploaded CSV file into the temporary directory."""
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="Filename is required")
+
+    return await stream_upload(file, temp_dir / Path(file.filename).name, validator)
 
-async def save_uploaded_files(files: list[UploadFile], temp_dir: Path) -> list[Path]:
-    """Save uploaded files to temporary directory and return file paths."""
+
+async def save_uploaded_files(
+    files: list[UploadFile], temp_dir: Path
+) -> list[SavedFile]:
+    """Stream uploaded files into the temporary directory."""
     saved_files = []
 
     for file in files:
         if not file.filename:
             continue
 
-        file_path = temp_dir / file.filename
-
-        async with aiofiles.open(file_path, "wb") as f:
-            content = await file.read()
-            await f.write(content)
-
-        saved_files.append(file_path)
+        saved_files.append(
+            await stream_upload(file, temp_dir / Path(file.filename).name)
+        )
 
         # Reset file pointer for potential re-use
         await file.seek(0)
 
     return saved_files
+
+
+def move_into_place(file_paths: list[Path], target_dir: Path) -> list[Path]:
+    """
+    Rename files into `target_dir`, which appears all at once.
+
+    The files are moved into a staging directory next to the target, which
+    is then renamed to `target_dir`. On the same filesystem (uploads are
+    staged under cnf.upload_tmpdir) every move is a rename, not a copy. An
+    existing empty `target_dir` is replaced.
+    """
+    target_dir.parent.mkdir(parents=True, exist_ok=True)
+    staging = target_dir.with_name(f".{target_dir.name}-{uuid.uuid4().hex}")
+    staging.mkdir()
+
+    try:
+        moved = []
+        for path in file_paths:
+            shutil.move(path, staging / path.name)
+            moved.append(target_dir / path.name)
+
+        if target_dir.exists() and not any(target_dir.iterdir()):
+            target_dir.rmdir()
+        staging.rename(target_dir)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return moved
@@ -1,6 +1,8 @@
 import pandas as pd
 from pandas.api.types import is_numeric_dtype
 
+from app.utils.csv_engine import InvalidCsvError, read_frame
+
 # from app.schemas.task import Job
 
 TAG_COL = "Prognosis"  # default label column name
@@ -67,21 +69,15 @@ def prepare_prognosis_dataframe_from_csv(
     # job.job_logger.add_log(f"Reading CSV to pandas DataFrame: {csv_path}")
 
     try:
-        df = pd.read_csv(
-            csv_path,
-            sep=sep,
-            decimal=decimal,
-            encoding="utf-8",
-            on_bad_lines="skip",  # Skip problematic lines instead of failing
-        )
-    except UnicodeDecodeError:
-        # job.job_logger.add_log("UTF-8 encoding failed, trying latin-1...")
-        df = pd.read_csv(
-            csv_path, sep=sep, decimal=decimal, encoding="latin-1", on_bad_lines="skip"
-        )
-    except pd.errors.EmptyDataError:
+        try:
+            # Skips problematic lines instead of failing
+            df = read_frame(csv_path, sep=sep, decimal=decimal, encoding="utf-8")
+        except InvalidCsvError:
+            # job.job_logger.add_log("UTF-8 encoding failed, trying latin-1...")
+            df = read_frame(csv_path, sep=sep, decimal=decimal, encoding="latin-1")
+    except InvalidCsvError as e:
         # job.job_logger.add_log("CSV file is empty or has no valid data")
-        raise ValueError("CSV file is empty or has no valid data")
+        raise ValueError(f"CSV file is empty or has no valid data: {str(e)}")
     except Exception as e:
         # job.job_logger.add_log(f"Error reading CSV: {str(e)}")
         raise ValueError(f"Could not read CSV file: {str(e)}")
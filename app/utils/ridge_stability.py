@@ -0,0 +1,101 @@
+"""
+Ridge stability scores in the dual (samples x samples) space.
+
+With far more CpGs than samples, refitting a RidgeClassifier on every row
+subsample solves a p x p problem each time. The same coefficients come out
+of the n x n dual system: for a subsample S with centred features Xc and
++-1 class targets Yc (one column per class, one for binary),
+
+    coef = Xc.T @ A,   (Xc @ Xc.T + alpha * I) @ A = Yc
+
+so the Gram matrix X @ X.T is built once, in column blocks, and every
+repeat only solves an s x s system with all its class columns as right-hand
+sides. The dual solutions of all repeats are then stacked and mapped back
+to the CpGs block by block, again without a dense copy of the matrix.
+Because every column of A sums to zero, centring X once over all samples
+gives the same coefficients as centring inside each subsample.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.utils.beta_quant import float_columns
+from app.utils.block_ops import BLOCK_COLS, column_blocks, gram, map_blocks
+
+
+def _class_targets(y: np.ndarray) -> np.ndarray:
+    """+-1 targets as RidgeClassifier encodes them (LabelBinarizer)."""
+    classes = np.unique(y)
+    if len(classes) == 2:
+        return np.where(y == classes[1], 1.0, -1.0)[:, None]
+    return np.where(y[:, None] == classes, 1.0, -1.0)
+
+
+def ridge_stability(
+    X: np.ndarray,
+    y: np.ndarray,
+    *,
+    alpha: float = 1.0,
+    n_repeats: int = 50,
+    subsample_frac: float = 0.7,
+    random_state: int | None = 0,
+    block_cols: int = BLOCK_COLS,
+    n_jobs: int | None = None,
+) -> np.ndarray:
+    """
+    Mean |coef| of ridge classifiers fitted on `n_repeats` random row
+    subsamples (averaged over the classes for multiclass), per column of X.
+
+    X may be float or uint16 quantized, in memory or memory-mapped. Each
+    repeat draws its rows from its own child of SeedSequence(random_state),
+    so the scores do not depend on n_jobs or on the order repeats finish.
+    """
+    if len(np.unique(y)) < 2:
+        raise ValueError("Need at least two classes in the target.")
+    n_rows, n_feats = X.shape
+    size = int(n_rows * subsample_frac)
+    if size < 2:
+        raise ValueError("Subsamples need at least two rows.")
+
+    blocks = column_blocks(n_feats, block_cols)
+    n_jobs = n_jobs or min(os.cpu_count() or 1, max(len(blocks), n_repeats)) or 1
+
+    def column_sums(columns):
+        return float_columns(X, columns).sum(axis=0, dtype=np.float64)
+
+    means = np.concatenate(map_blocks(column_sums, blocks, n_jobs)) / n_rows
+
+    def centred(columns) -> np.ndarray:
+        return float_columns(X, columns).astype(np.float64) - means[columns]
+
+    G = gram(centred, blocks, n_jobs)
+    if not np.isfinite(G).all():
+        raise ValueError("Input contains NaN or infinite beta values.")
+
+    Y = _class_targets(y)
+    seeds = np.random.SeedSequence(random_state).spawn(n_repeats)
+
+    def solve(seed):
+        rows = np.random.default_rng(seed).choice(n_rows, size=size, replace=False)
+        K = G[np.ix_(rows, rows)]
+        # centre the subsample: H @ K @ H with H = I - 1/s
+        K = K - K.mean(axis=0) - K.mean(axis=1)[:, None] + K.mean()
+        K[np.diag_indices_from(K)] += alpha
+        targets = Y[rows] - Y[rows].mean(axis=0)
+        dual = np.zeros((n_rows, Y.shape[1]))
+        dual[rows] = np.linalg.solve(K, targets)
+        return dual
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        # n_rows x (n_repeats * n_classes): all repeats mapped back at once
+        A = np.hstack(list(pool.map(solve, seeds)))
+
+    def scores(columns):
+        coefs = np.abs(centred(columns).T @ A)
+        return (
+            coefs.reshape(len(columns), n_repeats, Y.shape[1]).mean(axis=2).sum(axis=1)
+        )
+
+    return np.concatenate(map_blocks(scores, blocks, n_jobs)) / n_repeats
@@ -0,0 +1,199 @@
+"""
+Recursive feature elimination with a linear SVM, solved in the dual.
+
+LinearSVC solves its dual anyway (one variable per sample), so with p >> n
+the fits only need the n x n Gram matrix X @ X.T. It is built once in
+float32 column blocks and downdated as features are eliminated; the dual
+variables of the previous round warm start the next one, where they are
+nearly optimal already. Only mapping the duals back to feature weights,
+w = X.T @ (alpha * y), touches the remaining columns each round.
+
+The elimination schedule is coarse while many features are left (a
+fraction `step` per round) and fine among the last `top_k` (`fine_step` per
+round), so the top of the ranking is resolved feature by feature. Within a
+round, eliminated features are ordered by their weight, so no two features
+tie in the ranking.
+
+The solver is liblinear's dual coordinate descent (Hsieh et al., 2008) for
+the one-vs-rest problems LinearSVC fits, including its penalized intercept
+(intercept_scaling=1), so the weights match LinearSVC's.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from sklearn.utils.class_weight import compute_sample_weight
+
+from app.utils.beta_quant import float_columns
+from app.utils.block_ops import BLOCK_COLS, column_blocks, gram, map_blocks
+
+
+@dataclass(frozen=True)
+class RFERound:
+    """One elimination round, as passed to the `on_round` callback."""
+
+    round: int  # 1-based
+    n_rounds: int
+    remaining: int  # features left after this round
+    eliminated: np.ndarray  # column indices, best -> worst
+    ranks: np.ndarray  # final 1-based RFE rank of every eliminated feature
+
+
+@dataclass(frozen=True)
+class RFEResult:
+    order: np.ndarray  # column indices, best -> worst
+    ranks: np.ndarray  # RFE rank per column: 1 for the last survivor, then by round
+
+    def ranking(self, features: np.ndarray) -> pd.DataFrame:
+        """Features best -> worst, with the RFE rank as the Importance."""
+        return pd.DataFrame(
+            {"Feature": features[self.order], "Importance": self.ranks[self.order]}
+        )
+
+
+def elimination_schedule(
+    n_features: int, *, step: float = 0.5, top_k: int = 100, fine_step: int = 1
+) -> list[int]:
+    """Features eliminated per round, until one is left."""
+    if not 0 < step < 1:
+        raise ValueError("step must be a fraction between 0 and 1")
+    schedule, remaining = [], n_features
+    while remaining > 1:
+        if remaining > top_k:
+            drop = min(max(int(remaining * step), 1), remaining - top_k)
+        else:
+            drop = min(fine_step, remaining - 1)
+        schedule.append(drop)
+        remaining -= drop
+    return schedule
+
+
+def _dual_cd(Q, alpha, upper, tol, max_iter, rng) -> np.ndarray:
+    """
+    Coordinate descent on min 1/2 a'Qa - sum(a), 0 <= a <= upper, in place
+    from a warm start; stops when every projected gradient is within tol.
+
+    Each epoch only visits the coordinates whose projected gradient is not
+    zero (liblinear's shrinking), and a warm start that is already optimal
+    costs one vectorized check.
+    """
+    grad = Q @ alpha - 1
+    diag = np.diag(Q).copy()
+    for _ in range(max_iter):
+        projected = np.where(
+            alpha <= 0,
+            np.minimum(grad, 0),
+            np.where(alpha >= upper, np.maximum(grad, 0), grad),
+        )
+        if np.abs(projected).max() <= tol:
+            break
+        for i in rng.permutation(np.flatnonzero(projected)):
+            new = min(max(alpha[i] - grad[i] / diag[i], 0.0), upper[i])
+            if new != alpha[i]:
+                grad += (new - alpha[i]) * Q[i]
+                alpha[i] = new
+    return alpha
+
+
+def svm_rfe(
+    X: np.ndarray,
+    y: np.ndarray,
+    *,
+    C: float = 0.1,
+    loss: str = "hinge",
+    class_weight=None,
+    tol: float = 5e-2,
+    max_iter: int = 1000,
+    step: float = 0.5,
+    top_k: int = 100,
+    fine_step: int = 1,
+    random_state: int = 0,
+    block_cols: int = BLOCK_COLS,
+    n_jobs: int | None = None,
+    on_round: Callable[[RFERound], None] | None = None,
+) -> RFEResult:
+    """
+    Full RFE ranking of the columns of X; `on_round` sees every round as it
+    finishes, so partial rankings (the worst features) are known early.
+
+    X may be float or uint16 quantized, in memory or memory-mapped.
+    """
+    if loss not in ("hinge", "squared_hinge"):
+        raise ValueError(f"Unknown loss {loss}, expected hinge or squared_hinge")
+    classes = np.unique(y)
+    if len(classes) < 2:
+        raise ValueError(f"Need at least 2 classes; found {len(classes)}.")
+    n_rows, n_feats = X.shape
+
+    # one-vs-rest +-1 targets; a single problem for binary (the second class)
+    targets = np.where(y[:, None] == classes, 1.0, -1.0)
+    if len(classes) == 2:
+        targets = targets[:, 1:]
+    costs = C * compute_sample_weight(class_weight, y)
+    if loss == "hinge":
+        upper, diag_shift = costs, np.zeros(n_rows)
+    else:
+        upper, diag_shift = np.full(n_rows, np.inf), 1 / (2 * costs)
+
+    def block(part: np.ndarray) -> np.ndarray:
+        return float_columns(X, part).astype(np.float64)
+
+    def gram_of(columns: np.ndarray) -> np.ndarray:
+        return gram(block, column_blocks(columns, block_cols), n_jobs)
+
+    def feature_weights(columns: np.ndarray, duals: np.ndarray) -> np.ndarray:
+        """Squared weights X.T @ duals of the columns, summed over classes."""
+        weights = map_blocks(
+            lambda part: np.square(block(part).T @ duals).sum(axis=1),
+            column_blocks(columns, block_cols),
+            n_jobs,
+        )
+        return np.concatenate(weights)
+
+    remaining = np.arange(n_feats)
+    G = gram_of(remaining)
+    if not np.isfinite(G).all():
+        raise ValueError("Input contains NaN or infinite beta values.")
+
+    rng = np.random.default_rng(random_state)
+    alphas = np.zeros((n_rows, targets.shape[1]))
+    schedule = elimination_schedule(
+        n_feats, step=step, top_k=top_k, fine_step=fine_step
+    )
+    order = np.empty(n_feats, dtype=np.int64)
+    ranks = np.ones(n_feats, dtype=np.int64)
+    for number, drop in enumerate(schedule, start=1):
+        for c in range(targets.shape[1]):
+            t = targets[:, c]
+            Q = np.outer(t, t) * (G + 1)  # + 1: the penalized intercept
+            Q[np.diag_indices_from(Q)] += diag_shift
+            _dual_cd(Q, alphas[:, c], upper, tol, max_iter, rng)
+
+        importance = feature_weights(remaining, alphas * targets)
+        worst_first = np.argsort(importance, kind="stable")
+        eliminated = remaining[worst_first[:drop]]
+        kept = np.sort(remaining[worst_first[drop:]])
+
+        # downdate the Gram, or rebuild it when most features leave at once
+        if len(eliminated) <= len(kept):
+            G -= gram_of(np.sort(eliminated))
+        else:
+            G = gram_of(kept)
+        remaining = kept
+
+        order[len(kept) : len(kept) + drop] = eliminated[::-1]
+        ranks[eliminated] = len(schedule) - number + 2
+        if on_round is not None:
+            on_round(
+                RFERound(
+                    round=number,
+                    n_rounds=len(schedule),
+                    remaining=len(kept),
+                    eliminated=eliminated[::-1],
+                    ranks=ranks[eliminated[::-1]],
+                )
+            )
+    order[0] = remaining[0]
+    return RFEResult(order, ranks)
@@ -0,0 +1,237 @@
+"""
+Blocked, multi-threaded univariate tests over the columns of a beta matrix.
+
+The matrix (samples x CpGs, often a read-only memmap of the beta store or its
+uint16 quantized copy) is processed in column blocks of float32 values on a
+thread pool; numpy releases the GIL in the per-block reductions, so blocks run
+in parallel and no float64 copy of the whole matrix is ever made. Each block
+is reduced to per-class sufficient statistics (counts, means, within-class
+sums of squares, or rank sums), accumulated in float64; statistics, p-values
+and Benjamini-Hochberg FDR for every CpG then come out of one pass.
+
+Tests (K classes, missing betas are left out per CpG):
+    anova        one-way ANOVA F (same as sklearn's f_classif)
+    welch        Welch's ANOVA (Welch's t-test squared for two classes)
+    moderated_t  moderated F/t: within-class variances shrunk towards a prior
+                 estimated from all CpGs (limma's empirical Bayes)
+    kruskal      Kruskal-Wallis H with tie correction, each block ranked once
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from app.utils.beta_quant import float_columns
+from app.utils.block_ops import BLOCK_COLS, column_blocks, map_blocks
+
+TESTS = ("anova", "welch", "moderated_t", "kruskal")
+
+
+@dataclass(frozen=True)
+class UnivariateResult:
+    statistic: np.ndarray
+    pvalue: np.ndarray
+    qvalue: np.ndarray  # Benjamini-Hochberg FDR
+
+    def ranking(self, features: np.ndarray) -> pd.DataFrame:
+        """
+        Features best -> worst: p-value asc, statistic desc, name asc, with
+        -log10(p) as the Importance.
+        """
+        statistic = np.nan_to_num(self.statistic, nan=0.0, posinf=0.0, neginf=0.0)
+        pvalue = np.nan_to_num(self.pvalue, nan=1.0)
+        order = np.lexsort((features, -statistic, pvalue))
+        importance = -np.log10(np.maximum(pvalue, np.finfo(np.float64).tiny))
+        return pd.DataFrame(
+            {"Feature": features[order], "Importance": importance[order]}
+        )
+
+
+def _group_moments(block: np.ndarray, groups: list[np.ndarray]):
+    """Per class: non-missing counts, means and within-class sums of squares."""
+    shape = (len(groups), block.shape[1])
+    n, mean, ss = np.empty(shape), np.empty(shape), np.empty(shape)
+    for g, rows in enumerate(groups):
+        values = block[rows]
+        missing = np.isnan(values)
+        if missing.any():
+            values = np.where(missing, np.float32(0), values)
+        n[g] = len(rows) - missing.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean[g] = values.sum(axis=0, dtype=np.float64) / n[g]
+        # centre before squaring, so float32 keeps its precision
+        centred = values - mean[g].astype(np.float32)
+        centred[missing] = 0
+        ss[g] = np.square(centred).sum(axis=0, dtype=np.float64)
+    return n, mean, ss
+
+
+def _average_ranks(block: np.ndarray) -> np.ndarray:
+    """
+    1-based ranks of every column of `block` (ties get their average rank,
+    missing values NaN), returned transposed: one contiguous row per CpG.
+
+    A single argsort per block; tie runs are found on the flattened sorted
+    values, so no per-column Python loop or repeated sorting is needed.
+    """
+    values = np.ascontiguousarray(block.T)
+    n_cols, n = values.shape
+    order = np.argsort(values, axis=1, kind="stable")
+    ordered = np.take_along_axis(values, order, axis=1).ravel()
+
+    new_run = np.ones(ordered.size, dtype=bool)
+    new_run[1:] = ordered[1:] != ordered[:-1]
+    new_run[::n] = True  # every CpG starts a new run
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], ordered.size) - 1
+    run = np.cumsum(new_run) - 1
+    average = (starts[run] + ends[run]) / 2 - np.repeat(np.arange(n_cols) * n, n) + 1
+    average[np.isnan(ordered)] = np.nan
+
+    ranks = np.empty((n_cols, n))
+    np.put_along_axis(ranks, order, average.reshape(n_cols, n), axis=1)
+    return ranks
+
+
+def _rank_sums(block: np.ndarray, groups: list[np.ndarray]):
+    """Per class rank sums and counts, plus the sum of squared ranks per CpG."""
+    ranks = _average_ranks(block)
+    present = ~np.isnan(ranks)
+    ranks[~present] = 0.0
+    shape = (len(groups), block.shape[1])
+    n, rank_sum = np.empty(shape), np.empty(shape)
+    for g, rows in enumerate(groups):
+        n[g] = present[:, rows].sum(axis=1)
+        rank_sum[g] = ranks[:, rows].sum(axis=1)
+    return n, rank_sum, np.square(ranks).sum(axis=1)
+
+
+def _anova(n, mean, ss):
+    k = len(n)
+    total = n.sum(axis=0)
+    grand = (n * mean).sum(axis=0) / total
+    between = (n * (mean - grand) ** 2).sum(axis=0)
+    within = ss.sum(axis=0)
+    df_between, df_within = k - 1, total - k
+    with np.errstate(invalid="ignore", divide="ignore"):
+        F = (between / df_between) / (within / df_within)
+    return F, special.fdtrc(df_between, df_within, F)
+
+
+def _welch(n, mean, ss):
+    k = len(n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = n / (ss / (n - 1))
+        total = weight.sum(axis=0)
+        centre = (weight * mean).sum(axis=0) / total
+        between = (weight * (mean - centre) ** 2).sum(axis=0) / (k - 1)
+        spread = ((1 - weight / total) ** 2 / (n - 1)).sum(axis=0)
+        F = between / (1 + 2 * (k - 2) / (k**2 - 1) * spread)
+        df_within = (k**2 - 1) / (3 * spread)
+    return F, special.fdtrc(k - 1, df_within, F)
+
+
+def _trigamma_inverse(x: float) -> float:
+    """Solve trigamma(y) = x by Newton's method (as limma's trigammaInverse)."""
+    if x > 1e7:
+        return 1 / np.sqrt(x)
+    if x < 1e-6:
+        return 1 / x
+    y = 0.5 + 1 / x
+    for _ in range(50):
+        tri = special.polygamma(1, y)
+        step = tri * (1 - tri / x) / special.polygamma(2, y)
+        y += step
+        if -step / y < 1e-8:
+            break
+    return y
+
+
+def _moderated(n, mean, ss):
+    """Moderated F: residual variances shrunk towards a fitted prior."""
+    k = len(n)
+    total = n.sum(axis=0)
+    grand = (n * mean).sum(axis=0) / total
+    between = (n * (mean - grand) ** 2).sum(axis=0) / (k - 1)
+    df = total - k
+    with np.errstate(invalid="ignore", divide="ignore"):
+        s2 = ss.sum(axis=0) / df
+
+    # prior (d0, s0^2) by moments of log s2, as limma's fitFDist
+    usable = np.isfinite(s2) & (s2 > 0) & (df > 0)
+    d = df[usable]
+    e = np.log(s2[usable]) - special.digamma(d / 2) + np.log(d / 2)
+    excess = np.var(e, ddof=1) - np.mean(special.polygamma(1, d / 2))
+    if usable.sum() > 1 and excess > 0:
+        d0 = 2 * _trigamma_inverse(excess)
+        s0 = np.exp(np.mean(e) + special.digamma(d0 / 2) - np.log(d0 / 2))
+        posterior = (d0 * s0 + df * np.nan_to_num(s2)) / (d0 + df)
+    else:  # no spread beyond sampling noise: pool everything
+        d0 = np.inf
+        posterior = np.full_like(s2, np.exp(np.mean(e)) if usable.any() else np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        F = between / posterior
+    df_total = np.minimum(df + d0, 1e12)  # an infinite prior is a chi-square
+    return F, special.fdtrc(k - 1, df_total, F)
+
+
+def _kruskal(n, rank_sum, ranks_squared):
+    k = len(n)
+    total = n.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        H = 12 / (total * (total + 1)) * (rank_sum**2 / n).sum(axis=0)
+        H -= 3 * (total + 1)
+        # sum of (t^3 - t) over ties, from the sum of squared average ranks
+        ties = 12 * (total * (total + 1) * (2 * total + 1) / 6 - ranks_squared)
+        H /= 1 - ties / (total**3 - total)
+    return H, special.chdtrc(k - 1, H)
+
+
+def fdr_bh(pvalues: np.ndarray) -> np.ndarray:
+    """Benjamini-Hochberg adjusted p-values (NaN p-values count as 1)."""
+    p = np.nan_to_num(np.asarray(pvalues, dtype=np.float64), nan=1.0)
+    order = np.argsort(p)
+    scaled = p[order] * len(p) / np.arange(1, len(p) + 1)
+    q = np.empty_like(p)
+    q[order] = np.minimum.accumulate(scaled[::-1])[::-1]
+    return np.minimum(q, 1.0)
+
+
+def univariate_test(
+    X: np.ndarray,
+    y: np.ndarray,
+    test: str = "anova",
+    *,
+    block_cols: int = BLOCK_COLS,
+    n_jobs: int | None = None,
+) -> UnivariateResult:
+    """
+    Run `test` on every column of X (samples x features) against labels y.
+
+    X may be float or uint16 quantized, in memory or memory-mapped; it is
+    read one block of `block_cols` columns at a time on `n_jobs` threads.
+    """
+    if test not in TESTS:
+        raise ValueError(f"Unknown test {test}, expected one of {TESTS}")
+    classes = np.unique(y)
+    if len(classes) < 2:
+        raise ValueError("Need at least two classes in the target.")
+    groups = [np.flatnonzero(y == c) for c in classes]
+    reduce = _rank_sums if test == "kruskal" else _group_moments
+
+    def run(columns: np.ndarray):
+        return reduce(float_columns(X, columns), groups)
+
+    blocks = map_blocks(run, column_blocks(X.shape[1], block_cols), n_jobs)
+    stats = [np.concatenate(parts, axis=-1) for parts in zip(*blocks)]
+
+    finish = {
+        "anova": _anova,
+        "welch": _welch,
+        "moderated_t": _moderated,
+        "kruskal": _kruskal,
+    }[test]
+    statistic, pvalue = finish(*stats)
+    return UnivariateResult(statistic, pvalue, fdr_bh(pvalue))
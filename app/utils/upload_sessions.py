@@ -0,0 +1,246 @@
+"""
+Resumable uploads: a large file is sent as numbered chunks of a fixed size.
+
+    <SESSION_DIR>/<session_id>/session.json   filename, size, sha1, progress
+    <SESSION_DIR>/<session_id>/data           chunks assembled in order
+    <SESSION_DIR>/<session_id>/chunk-*.part   chunks still being received
+
+`received` in session.json is the authority on how much of `data` is valid:
+a chunk is streamed to its own part file, then copied in at that offset and
+only counted once it is on disk, so a dropped connection loses at most the
+chunk in flight. The SHA1 is updated chunk by chunk in this process; after a
+restart (or when another worker took the chunks) finalize rehashes the
+assembled file instead. A finalized upload becomes a blob (see blob_store),
+from where bundles and CSV uploads use it. Sessions without a chunk for
+SESSION_TTL seconds are swept, partial files included.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from app.config import cnf
+from app.utils.blob_store import add_blob, blob_path, has_blob, is_sha1, touch_blob
+from app.utils.file_utils import UPLOAD_CHUNK_SIZE, SavedFile, calculate_file_sha1
+
+SESSION_DIR = cnf.upload_session_dir
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+SESSION_TTL = 24 * 3600  # seconds without a chunk before a session is swept
+COPY_BLOCK = 1024 * 1024
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# running SHA1 per session: session_id -> (bytes hashed, hash object)
+_hashers: dict[str, tuple[int, "hashlib._Hash"]] = {}
+_locks: dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+class ChunkOutOfOrder(ValueError):
+    """A chunk arrived before the ones preceding it."""
+
+    def __init__(self, expected: int, got: int):
+        super().__init__(f"Expected chunk {expected}, got chunk {got}")
+        self.expected = expected
+
+
+@dataclass
+class UploadSession:
+    session_id: str
+    filename: str
+    size: int
+    sha1: str
+    chunk_size: int
+    received: int = 0
+
+    @property
+    def chunk_count(self) -> int:
+        return -(-self.size // self.chunk_size)
+
+    @property
+    def next_chunk(self) -> int:
+        return -(-self.received // self.chunk_size)
+
+    @property
+    def complete(self) -> bool:
+        return self.received == self.size
+
+
+def _session_dir(session_id: str) -> Path:
+    if not _SESSION_ID.match(session_id):
+        raise ValueError(f"Invalid upload session id: {session_id}")
+    return SESSION_DIR / session_id
+
+
+def _lock(session_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(session_id, threading.Lock())
+
+
+def _save(session: UploadSession) -> None:
+    path = _session_dir(session.session_id) / "session.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(asdict(session)))
+    os.replace(tmp, path)
+
+
+def create_session(
+    filename: str, size: int, sha1: str, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> UploadSession:
+    """Start a resumable upload of `size` bytes that hash to `sha1`."""
+    if not is_sha1(sha1):
+        raise ValueError(f"Invalid SHA1: {sha1}")
+    if size <= 0:
+        raise ValueError("Upload size must be positive")
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"Chunk size must be between 1 and {MAX_CHUNK_SIZE} bytes")
+
+    sweep_sessions()
+    session = UploadSession(
+        session_id=uuid.uuid4().hex,
+        filename=Path(filename).name,
+        size=size,
+        sha1=sha1,
+        chunk_size=chunk_size,
+    )
+    directory = _session_dir(session.session_id)
+    directory.mkdir(parents=True)
+    (directory / "data").touch()
+    _save(session)
+    _hashers[session.session_id] = (0, hashlib.sha1())
+    return session
+
+
+def load_session(session_id: str) -> UploadSession | None:
+    path = _session_dir(session_id) / "session.json"
+    if not path.exists():
+        return None
+    return UploadSession(**json.loads(path.read_text()))
+
+
+def staging_path(session_id: str) -> Path:
+    """A new part file in the session to stream one incoming chunk to."""
+    return _session_dir(session_id) / f"chunk-{uuid.uuid4().hex}.part"
+
+
+def write_chunk(session_id: str, index: int, chunk: Path) -> UploadSession:
+    """
+    Store chunk `index` of an upload from the part file `chunk` (see
+    staging_path), which is removed afterwards.
+
+    Chunks must arrive in order; resending a chunk that is already stored
+    is a no-op, so a client can blindly retry the last one after an error.
+    """
+    try:
+        with _lock(session_id):
+            session = load_session(session_id)
+            if session is None:
+                raise FileNotFoundError(f"No upload session {session_id}")
+            if index < session.next_chunk:
+                return session
+            if index > session.next_chunk:
+                raise ChunkOutOfOrder(session.next_chunk, index)
+
+            expected = min(session.chunk_size, session.size - session.received)
+            size = chunk.stat().st_size
+            if size != expected:
+                raise ValueError(f"Chunk {index} must be {expected} bytes, got {size}")
+
+            hashed, sha1 = _hashers.pop(session_id, (-1, None))
+            sha1 = sha1.copy() if hashed == session.received else None
+            # anything past `received` is left over from an interrupted chunk
+            with (
+                open(chunk, "rb") as src,
+                open(_session_dir(session_id) / "data", "r+b") as f,
+            ):
+                f.seek(session.received)
+                while block := src.read(COPY_BLOCK):
+                    f.write(block)
+                    if sha1 is not None:
+                        sha1.update(block)
+                f.truncate()
+            if sha1 is not None:  # else finalize will rehash the file
+                _hashers[session_id] = (hashed + size, sha1)
+
+            session.received += size
+            _save(session)
+            return session
+    finally:
+        chunk.unlink(missing_ok=True)
+
+
+def finalize_session(session_id: str) -> SavedFile:
+    """Verify a complete upload and move it into the blob store."""
+    with _lock(session_id):
+        session = load_session(session_id)
+        if session is None:
+            raise FileNotFoundError(f"No upload session {session_id}")
+        if not session.complete:
+            raise ValueError(
+                f"Upload incomplete: {session.received} of {session.size} bytes received"
+            )
+
+        data_path = _session_dir(session_id) / "data"
+        hashed, sha1 = _hashers.pop(session_id, (-1, None))
+        digest = sha1.hexdigest() if hashed == session.size else None
+        digest = digest or calculate_file_sha1(data_path)
+        if digest != session.sha1:
+            drop_session(session_id)
+            raise ValueError(
+                f"Uploaded content does not match its hash. Expected: {session.sha1}, Got: {digest}"
+            )
+
+        if has_blob(session.sha1, session.size):
+            touch_blob(session.sha1)
+        else:
+            add_blob(data_path, session.sha1)
+        drop_session(session_id)
+    return SavedFile(path=blob_path(session.sha1), size=session.size, sha1=session.sha1)
+
+
+def drop_session(session_id: str) -> None:
+    _hashers.pop(session_id, None)
+    shutil.rmtree(_session_dir(session_id), ignore_errors=True)
+    with _locks_guard:
+        _locks.pop(session_id, None)
+
+
+def sweep_sessions(max_age: float = SESSION_TTL) -> int:
+    """Drop sessions without a chunk for `max_age` seconds; returns how many."""
+    if not SESSION_DIR.exists():
+        return 0
+    cutoff = time.time() - max_age
+    dropped = 0
+    for directory in SESSION_DIR.iterdir():
+        if not _SESSION_ID.match(directory.name):
+            continue
+        with _lock(directory.name):
+            try:
+                # session.json is rewritten with every chunk
+                last = (directory / "session.json").stat().st_mtime
+            except FileNotFoundError:
+                last = directory.stat().st_mtime if directory.exists() else 0
+            if last < cutoff:
+                drop_session(directory.name)
+                dropped += 1
+    return dropped
+
+
+def open_upload_sha1s() -> set[str]:
+    """Content hashes of the uploads still in progress."""
+    if not SESSION_DIR.exists():
+        return set()
+    hashes = set()
+    for path in SESSION_DIR.glob("*/session.json"):
+        try:
+            hashes.add(json.loads(path.read_text())["sha1"])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            continue  # dropped or being rewritten right now
+    return hashes
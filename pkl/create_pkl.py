@@ -3,18 +3,38 @@ from pathlib import Path
 import pandas as pd
 
 from app.config import cnf
+from app.cpg2gene.annotation_store import (
+    CHROM_COLUMN,
+    POS_COLUMN,
+    store_dir,
+    write_annotation_store,
+)
+from app.cpg2gene.cpg_gene_mapping import build_probe_index
 
 current_path = Path(__file__).parent.resolve()
 
+COORDINATE_COLUMNS = {
+    CHROM_COLUMN: ("chr", "CHR", "Chromosome", "chromosome"),
+    POS_COLUMN: ("pos", "MAPINFO", "Position", "position"),
+}
+
 
 def csv2pickle(csv_path):
     try:
         df = pd.read_csv(csv_path)
-        df = df[["CpG_site", "GeneName"]]
+        # keep the coordinates too (for region queries), whatever they are called
+        coordinates = {}
+        for target, aliases in COORDINATE_COLUMNS.items():
+            name = next((a for a in aliases if a in df.columns), None)
+            if name is not None:
+                coordinates[name] = target
+        df = df[["CpG_site", "GeneName", *coordinates]].rename(columns=coordinates)
         file_name = Path(csv_path).stem
         file_path = current_path / f"{file_name}.pkl"
         df.to_pickle(file_path)
         print(f"Created {file_path}")
+        # memory-mappable copy shared by all workers (see annotation_store)
+        print(f"Created {write_annotation_store(df, store_dir(file_path))}")
     except Exception as e:
         print(f"Error processing {csv_path}: {e}")
 
@@ -27,6 +47,19 @@ def create_pickles_in_current_directory(*, csv_dir):
         csv2pickle(file_path / manifest)
 
 
+def create_probe_index():
+    """Hashed probe ids of every platform, for fast array type detection."""
+    index = build_probe_index(
+        {
+            t: pd.read_pickle(path)["CpG_site"].astype(str)
+            for t, path in cnf.pkl_files.items()
+        }
+    )
+    index.save(cnf.probe_index_file)
+    print(f"Created {cnf.probe_index_file}")
+
+
 if __name__ == "__main__":
     print(f"Creating pickles in {current_path}")
     create_pickles_in_current_directory(csv_dir="Directory with the 3 csv files")
+    create_probe_index()
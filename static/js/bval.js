@@ -1,11 +1,20 @@
 // --- Configure your endpoints here ---
 const URL_BASE = '/bval'
 const EXISTS_URL = (id) => `${URL_BASE}/exists/${encodeURIComponent(id)}`
-const UPLOAD_URL = `${URL_BASE}/upload`
+const MANIFEST_URL = `${URL_BASE}/manifest`
+const BLOB_URL = (sha1) => `${URL_BASE}/blobs/${encodeURIComponent(sha1)}`
+const COMMIT_URL = (id) => `${URL_BASE}/commit/${encodeURIComponent(id)}`
+const UPLOADS_URL = '/uploads'
+const UPLOAD_SESSION_URL = (id) => `${UPLOADS_URL}/${encodeURIComponent(id)}`
+// files above this size are sent in resumable chunks
+const RESUMABLE_MIN_SIZE = 32 * 1024 * 1024
+const CHUNK_SIZE = 8 * 1024 * 1024
+const CHUNK_RETRIES = 5
 const IMAGES_BASE_URL = `${URL_BASE}/images`
 const METADATA_STATUS_URL = (id) => `${URL_BASE}/metadata-status/${encodeURIComponent(id)}`
 const TASK_STATUS_URL = (task_id) => `${URL_BASE}/status/${encodeURIComponent(task_id)}`
 const DOWNLOAD_ALL_URL = `${URL_BASE}/download-all`
+const PROMOTE_URL = (id) => `${URL_BASE}/promote/${encodeURIComponent(id)}`
 
 // --- Elements ---
 const inputEl = document.getElementById('folderInput')
@@ -20,6 +29,7 @@ const folderNameEl = document.getElementById('folderName')
 const folderFileCountEl = document.getElementById('folderFileCount')
 
 let selectedFiles = []
+let manifestEntries = []
 let bundleId = null
 let currentTaskId = null
 let processingStartTime = null
@@ -284,7 +294,7 @@ async function computeBundleSha(files) {
     return name.endsWith('.csv') || name.endsWith('.idat')
   })
 
-  if (filtered.length === 0) return { bundleId: null, items: [] }
+  if (filtered.length === 0) return { bundleId: null, items: [], entries: [] }
 
   filtered.sort((a, b) => {
     const pa = a.name
@@ -293,6 +303,7 @@ async function computeBundleSha(files) {
   })
 
   const lines = []
+  const entries = []
   let processed = 0
 
   for (const f of filtered) {
@@ -301,6 +312,7 @@ async function computeBundleSha(files) {
       const fileSha = await sha1ArrayBuffer(ab)
       const rel = f.name
       lines.push(`${rel}\n${f.size}\n${fileSha}\n`)
+      entries.push({ name: rel, size: f.size, sha1: fileSha })
     } catch (e) {
       // Surface which file failed for easier debugging
       throw new Error(`Hashing failed for "${f.name}": ${e?.message || e}`)
@@ -319,7 +331,7 @@ async function computeBundleSha(files) {
     throw new Error(`Manifest SHA-1 failed: ${e?.message || e}`)
   }
 
-  return { bundleId: bundleShaHex, items: filtered }
+  return { bundleId: bundleShaHex, items: filtered, entries }
 }
 
 // ---------- Network ----------
@@ -331,19 +343,83 @@ async function checkExists(id) {
   throw new Error(`Exists check failed: ${res.status} ${text}`)
 }
 
-async function uploadBundle(id, files) {
-  const fd = new FormData()
-  fd.append('bundle_id', id)
-  fd.append('file_count', String(files.length))
-  for (const f of files) {
-    fd.append('files', f, f.name)
-  }
-  const res = await fetch(UPLOAD_URL, { method: 'POST', body: fd })
+async function postJson(url, body) {
+  const res = await fetch(url, {
+    method: 'POST',
+    headers: body ? { 'Content-Type': 'application/json' } : {},
+    body: body ? JSON.stringify(body) : undefined,
+  })
   if (!res.ok) {
     const text = await res.text().catch(() => '')
     throw new Error(`Upload failed: ${res.status} ${text}`)
   }
-  return res
+  return res.json()
+}
+
+// Send a large file in numbered chunks. After a failed request the session
+// is asked where to resume from, so a dropped connection only costs a chunk.
+async function uploadResumable(sha1, file) {
+  let session = await postJson(UPLOADS_URL, {
+    filename: file.name, size: file.size, sha1, chunk_size: CHUNK_SIZE,
+  })
+  if (session.exists) return { sha1, size: file.size }
+
+  let failures = 0
+  while (!session.complete) {
+    const start = session.next_chunk * session.chunk_size
+    const chunk = file.slice(start, start + session.chunk_size)
+    try {
+      const res = await fetch(`${UPLOAD_SESSION_URL(session.session_id)}/chunks/${session.next_chunk}`, {
+        method: 'PUT', body: chunk,
+      })
+      if (!res.ok && res.status !== 409) throw new Error(`${res.status} ${await res.text().catch(() => '')}`)
+      if (res.ok) {
+        session = await res.json()
+        failures = 0
+      } else {
+        session = await (await fetch(UPLOAD_SESSION_URL(session.session_id))).json()
+      }
+    } catch (err) {
+      if (++failures > CHUNK_RETRIES) throw new Error(`Upload of "${file.name}" failed: ${err.message}`)
+      await new Promise((r) => setTimeout(r, 1000 * failures))
+      const res = await fetch(UPLOAD_SESSION_URL(session.session_id)).catch(() => null)
+      if (res && res.ok) session = await res.json()
+    }
+    setStatus(`📤 ${file.name}: ${Math.round((100 * session.received) / session.size)}%`, 'warn')
+  }
+
+  return postJson(`${UPLOAD_SESSION_URL(session.session_id)}/finalize`)
+}
+
+async function uploadBlob(sha1, file) {
+  if (file.size >= RESUMABLE_MIN_SIZE) return uploadResumable(sha1, file)
+  const fd = new FormData()
+  fd.append('file', file, file.name)
+  const res = await fetch(BLOB_URL(sha1), { method: 'POST', body: fd })
+  if (!res.ok) {
+    const text = await res.text().catch(() => '')
+    throw new Error(`Upload of "${file.name}" failed: ${res.status} ${text}`)
+  }
+  return res.json()
+}
+
+// Two-phase upload: send the manifest, upload only the files the server
+// does not already hold (e.g. IDATs shared with another cohort), then commit.
+async function uploadBundle(id, files, entries) {
+  const manifest = await postJson(MANIFEST_URL, { bundle_id: id, files: entries })
+  if (manifest.exists) {
+    return { task_id: '', sha1_hash: id }
+  }
+
+  const byName = new Map(files.map((f) => [f.name, f]))
+  let sent = 0
+  for (const entry of manifest.missing) {
+    sent++
+    setStatus(`📤 Uploading ${sent}/${manifest.missing.length} (${entries.length - manifest.missing.length} already on server): ${entry.name}`, 'warn')
+    await uploadBlob(entry.sha1, byName.get(entry.name))
+  }
+
+  return postJson(COMMIT_URL(id))
 }
 
 async function checkMetadataStatus(id) {
@@ -447,6 +523,7 @@ inputEl.addEventListener('change', async () => {
   fileCountOut.value = '0'
   bundleId = null
   selectedFiles = []
+  manifestEntries = []
   currentTaskId = null
   clearStatus()
   hideImagesSection()
@@ -485,7 +562,7 @@ inputEl.addEventListener('change', async () => {
   }
 
   try {
-    const { bundleId: id, items } = await computeBundleSha(files)
+    const { bundleId: id, items, entries } = await computeBundleSha(files)
     if (!id) {
       setStatus('No .csv or .idat files found in the selected folder.', 'info')
       // Update folder info to show 0 valid files
@@ -494,6 +571,7 @@ inputEl.addEventListener('change', async () => {
     }
     bundleId = id
     selectedFiles = items
+    manifestEntries = entries
     shaOut.value = bundleId
     fileCountOut.value = String(selectedFiles.length)
 
@@ -545,8 +623,7 @@ goBtn.addEventListener('click', async () => {
       return
     }
     setStatus('📤 Not found on server. Uploading files…', 'warn')
-    const uploadResponse = await uploadBundle(bundleId, selectedFiles)
-    const data = await uploadResponse.json()
+    const data = await uploadBundle(bundleId, selectedFiles, manifestEntries)
 
     // Store the task ID for status checking
     if (data.task_id) {
@@ -575,6 +652,7 @@ resetBtn.addEventListener('click', () => {
   fileCountOut.value = '0'
   bundleId = null
   selectedFiles = []
+  manifestEntries = []
   currentTaskId = null
   clearStatus()
   hideImagesSection()
@@ -670,6 +748,27 @@ if (downloadAllBtn) {
   })
 }
 
+// Hand the beta values over to Feature Selection and DMP on the server,
+// instead of downloading the ZIP and uploading bval_data.csv again
+const promoteBtn = document.getElementById('promoteBtn')
+if (promoteBtn) {
+  promoteBtn.addEventListener('click', async () => {
+    if (!window.currentImagesSha1) {
+      setStatus('No results loaded', 'error')
+      return
+    }
+    promoteBtn.disabled = true
+    try {
+      const res = await postJson(PROMOTE_URL(window.currentImagesSha1))
+      setStatus(`✅ Beta values available in Feature Selection and DMP as dataset ${res.csv_sha1}`, 'ok')
+    } catch (error) {
+      setStatus('❌ Could not send beta values: ' + error.message, 'error')
+    } finally {
+      promoteBtn.disabled = false
+    }
+  })
+}
+
 function hideImagesSection() {
   if (imagesSection) {
     imagesSection.classList.add('hidden')
@@ -1,6 +1,13 @@
 const URL_BASE = '/fs'
 const URL_EXISTS = `${URL_BASE}/exists`
 const URL_UPLOAD = `${URL_BASE}/upload`
+const URL_UPLOAD_BLOB = `${URL_BASE}/upload-blob`
+const URL_SESSIONS = '/uploads'
+// files above this size are sent in resumable chunks; the server checks the
+// first chunk, so a malformed file is rejected before the rest is sent
+const RESUMABLE_MIN_SIZE = 32 * 1024 * 1024
+const CHUNK_SIZE = 8 * 1024 * 1024
+const CHUNK_RETRIES = 5
 const URL_RESULTS = `${URL_BASE}/results`
 const URL_ALGORITHMS = `${URL_BASE}/algorithms`
 const URL_VALUES = `${URL_BASE}/prognosis-values`
@@ -172,9 +179,13 @@ async function sha1File(file) {
   return computeSHA1(buf)
 }
 
-// --- CSV validation: only .csv; prognosis values in first row ---
+// --- CSV validation: only .csv (plain, .gz or .zst); prognosis values in first row ---
+function isCompressedCsv(file) {
+  return /\.csv\.(gz|zst)$/i.test(file.name || '')
+}
+
 function isCsvFile(file) {
-  const byExt = /\.csv$/i.test(file.name || '')
+  const byExt = /\.csv(\.gz|\.zst)?$/i.test(file.name || '')
   const byType = (file.type || '').includes('csv')
   return byExt || byType
 }
@@ -236,6 +247,11 @@ async function validateCsv(file) {
     throw new Error('Only CSV files are supported.')
   }
 
+  // Compressed uploads are validated by the server after decompression
+  if (isCompressedCsv(file)) {
+    return true
+  }
+
   // Read first row to check transposed structure (samples as columns, prognosis values in first row)
   let readSize = 1024 * 1024 // Start with 1MB
   let firstLine = ''
@@ -306,7 +322,58 @@ async function checkExists(id) {
   return data
 }
 
+async function postJson(url, body) {
+  const r = await fetch(url, {
+    method: 'POST',
+    headers: body ? { 'Content-Type': 'application/json' } : {},
+    body: body ? JSON.stringify(body) : undefined,
+  })
+  if (!r.ok) {
+    const text = await r.text().catch(() => '')
+    throw new Error(`Upload failed (${r.status}) ${text}`)
+  }
+  return r.json()
+}
+
+async function uploadResumable(file, id) {
+  let session = await postJson(URL_SESSIONS, {
+    filename: file.name, size: file.size, sha1: id, chunk_size: CHUNK_SIZE,
+  })
+  const sessionUrl = `${URL_SESSIONS}/${encodeURIComponent(session.session_id)}`
+
+  let failures = 0
+  while (!session.complete) {
+    const start = session.next_chunk * session.chunk_size
+    let r
+    try {
+      r = await fetch(`${sessionUrl}/chunks/${session.next_chunk}`, {
+        method: 'PUT', body: file.slice(start, start + session.chunk_size),
+      })
+    } catch (err) {
+      // network error: wait, then resume from what the server has
+      if (++failures > CHUNK_RETRIES) throw err
+      await new Promise((resolve) => setTimeout(resolve, 1000 * failures))
+      r = await fetch(sessionUrl).catch(() => null)
+      if (r && r.ok) session = await r.json()
+      continue
+    }
+    if (r.status === 409) {
+      session = await (await fetch(sessionUrl)).json()
+    } else if (!r.ok) {
+      const text = await r.text().catch(() => '')
+      throw new Error(`Upload failed (${r.status}) ${text}`)
+    } else {
+      session = await r.json()
+      failures = 0
+    }
+  }
+
+  if (session.session_id) await postJson(`${sessionUrl}/finalize`)
+  return postJson(URL_UPLOAD_BLOB, { sha1: id, filename: file.name })
+}
+
 async function uploadFile(file, id) {
+  if (file.size >= RESUMABLE_MIN_SIZE) return uploadResumable(file, id)
   const form = new FormData()
   form.append('file', file, file.name)
   form.append('id', id)
@@ -387,9 +454,17 @@ goBtn.addEventListener('click', async () => {
     } else {
       setStatus('warn', 'Not found. Uploading…')
       const upload_return = await uploadFile(file, id)
+      // Compressed uploads are keyed by the SHA‑1 of the decompressed CSV
+      const datasetId = upload_return.sha1_hash || id
+      sha1Out.value = datasetId
+      if (!upload_return.task_id) {
+        setStatus('ok', `File with this SHA‑1 already exists on server. Loading analysis interface...`)
+        await loadAnalysisInterface(datasetId)
+        return
+      }
       setStatus('ok', `Upload complete. Monitoring analysis progress...`)
       // Monitor the analysis task and then load interface
-      await monitorAnalysisTask(upload_return.task_id, id)
+      await monitorAnalysisTask(upload_return.task_id, datasetId)
     }
   } catch (e) {
     console.error(e)
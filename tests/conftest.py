@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+TEST_DATA = Path(__file__).parent / "test_data"
+
+
+@pytest.fixture
+def upload_csv(tmp_path) -> Path:
+    """bval_data.csv in the upload layout: Prognosis row first, one row per CpG."""
+    df = pd.read_csv(TEST_DATA / "bval_data.csv")
+    df.index = [f"S{i}" for i in range(len(df))]
+    df = df[["Prognosis"] + [c for c in df.columns if c != "Prognosis"]]
+
+    storage_dir = tmp_path / "sha1"
+    storage_dir.mkdir()
+    csv_path = storage_dir / "bval_data.csv"
+    df.T.to_csv(csv_path)
+    return csv_path
+
+
+@pytest.fixture
+def cohort():
+    """
+    Factory for synthetic beta matrices: cohort(y, n_cpgs) returns (X, y),
+    where the first `signal` CpGs shift with the class label.
+    """
+
+    def make(y, n_cpgs, *, seed=0, signal=5, dtype=np.float32):
+        y = np.asarray(y)
+        rng = np.random.default_rng(seed)
+        X = rng.beta(2, 5, size=(len(y), n_cpgs))
+        X[:, :signal] += 0.3 * y[:, None]  # differentially methylated CpGs
+        return X.astype(dtype), y
+
+    return make
@@ -2,7 +2,7 @@ from pathlib import Path
 
 import pandas as pd
 
-from app.dimensionality_reduction.pca import pca_plot
+from app.dimensionality_reduction.pca import pca_plot, pca_plot_matrix
 
 PATH = Path(__file__).parent.parent / "test_data"
 
@@ -23,3 +23,18 @@ def test_pca_plot():
 
     # fig.savefig("test_pca_plot.png", dpi=300, bbox_inches="tight")
     assert fig is not None
+
+
+def test_pca_plot_matrix():
+    df = pd.read_csv(PATH / "bval_data.csv")
+    X = df.drop(columns=["Prognosis"])
+
+    fig = pca_plot_matrix(
+        X.to_numpy(dtype="float32"),
+        df["Prognosis"].to_numpy(),
+        X.columns.to_numpy(),
+        conditions=["Indolent", "Normal"],
+        selected_features=list(X.columns[:50]) + ["not_a_cpg"],
+    )
+
+    assert fig is not None
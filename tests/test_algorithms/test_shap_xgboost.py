@@ -0,0 +1,38 @@
+import numpy as np
+
+from app.algorithms import shap_xgboost as module
+from app.algorithms.shap_xgboost import shap_xgboost
+from app.utils.algorithm_utils import FeatureMatrix
+from app.utils.beta_quant import quantize
+
+
+def test_batched_shap_matches_a_single_batch(cohort, monkeypatch):
+    X, y = cohort(np.arange(90) % 3, 400)
+    data = FeatureMatrix(X=X, y=y, features=np.array([f"cg{i}" for i in range(400)]))
+
+    predicted = []
+    predict = module.xgb.Booster.predict
+
+    def spy(self, dmat, **kwargs):
+        predicted.append(dmat.num_row())
+        return predict(self, dmat, **kwargs)
+
+    monkeypatch.setattr(module.xgb.Booster, "predict", spy)
+    whole = shap_xgboost(data, n_estimators=30, batch_bytes=2**30)
+    assert predicted == [90]
+
+    # ~4 rows of 3 x 401 float32 contributions per batch
+    predicted.clear()
+    batched = shap_xgboost(data, n_estimators=30, batch_bytes=20_000)
+    assert max(predicted) == 4 and sum(predicted) == 90
+
+    assert batched["Feature"].tolist() == whole["Feature"].tolist()
+    np.testing.assert_allclose(batched["Importance"], whole["Importance"], rtol=1e-5)
+    assert {f"cg{i}" for i in range(5)} <= set(batched["Feature"][:10])
+
+    quantized = shap_xgboost(
+        FeatureMatrix(X=quantize(X), y=y, features=data.features),
+        n_estimators=30,
+        batch_bytes=20_000,
+    )
+    assert {f"cg{i}" for i in range(5)} <= set(quantized["Feature"][:10])
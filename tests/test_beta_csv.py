@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.config import cnf
+from app.cpg2gene import cpg_gene_mapping
+from app.cpg2gene.cpg_gene_mapping import ArrayTypeMatcher
+from app.services.prognosis_values_from_csv import get_prognosis_values_from_csv
+from app.utils.beta_csv import (
+    InvalidCsvError,
+    PrefixValidator,
+    count_cpg_rows,
+    iter_cpg_ids,
+    read_beta_csv,
+    read_beta_header,
+    validate_prefix,
+)
+
+
+def test_read_beta_header(upload_csv):
+    samples, labels = read_beta_header(upload_csv)
+
+    assert len(samples) == len(labels) == 20
+    assert samples[0] == "S0"
+    assert set(labels) == {"AVPC", "High_grade", "Indolent", "Normal"}
+
+
+@pytest.mark.parametrize(
+    "data, match",
+    [
+        (b"", "empty"),
+        (b"S1;S2\nPrognosis;A;B\n", "comma-separated"),
+        (b",S1,S2\ncg1,0.1,0.2\n", "Prognosis"),
+        (b",S1,S2\nPrognosis,,\ncg1,0.1,0.2\n", "no prognosis values"),
+        (b",S1,S2\nPrognosis,A,B\ncg1,0.1;0.2\n", "delimiter"),
+        (b",S1,S2\nPrognosis,A,B\ncg1,0.1,high\n", "non-numeric"),
+    ],
+)
+def test_validate_prefix_rejects(data, match):
+    with pytest.raises(InvalidCsvError, match=match):
+        validate_prefix(data, complete=True)
+
+
+def test_prefix_validator_checks_once_enough_rows_arrived(upload_csv):
+    data = upload_csv.read_bytes()
+    validate_prefix(data, complete=True)
+    validate_prefix(data[:1000])  # a cut last line is ignored
+
+    validator = PrefixValidator(rows=3)
+    bad = b",S1,S2\nPrognosis,A,B\ncg1,0.1,x\n"
+    with pytest.raises(InvalidCsvError):
+        for line in bad.splitlines(keepends=True) + [b"cg2,0.1,0.2\n"] * 1000:
+            validator.feed(line)
+    assert validator.checked
+
+
+def test_read_beta_header_rejects_missing_prognosis_row(tmp_path):
+    csv_path = tmp_path / "bad.csv"
+    csv_path.write_text(",S1,S2\ncg1,0.1,0.2\n")
+
+    with pytest.raises(ValueError, match="Prognosis"):
+        read_beta_header(csv_path)
+
+
+@pytest.mark.parametrize("chunk_rows", [7, 500, 10_000])
+def test_read_beta_csv_matches_pandas(upload_csv, chunk_rows):
+    matrix = read_beta_csv(upload_csv, chunk_rows=chunk_rows)
+    expected = pd.read_csv(upload_csv, index_col=0, skiprows=[1]).T
+
+    assert matrix.betas.shape == expected.shape
+    assert matrix.betas.flags.c_contiguous
+    assert list(matrix.cpgs) == list(expected.columns)
+    np.testing.assert_allclose(matrix.betas, expected.to_numpy(), rtol=1e-6)
+
+
+def test_read_beta_csv_r_style_quotes_and_trailing_blank_lines(tmp_path):
+    # write.csv(row.names = TRUE) output: quoted ids and an empty corner cell
+    csv_path = tmp_path / "bval_data.csv"
+    csv_path.write_text(
+        '"","S1","S2"\n"Prognosis","A","B"\n"cg1",0.1,0.2\n"cg2",0.3,0.4\n\n\n'
+    )
+    out_path = tmp_path / "betas.npy"
+
+    matrix = read_beta_csv(csv_path, out_path=out_path)
+
+    assert list(matrix.samples) == ["S1", "S2"]
+    assert list(matrix.labels) == ["A", "B"]
+    assert list(matrix.cpgs) == ["cg1", "cg2"]
+    np.testing.assert_allclose(np.load(out_path), [[0.1, 0.3], [0.2, 0.4]])
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 1 << 24])
+def test_count_cpg_rows_counts_records_not_newlines(tmp_path, block_size):
+    csv_path = tmp_path / "bval_data.csv"
+    csv_path.write_bytes(
+        b",S1,S2\r\nPrognosis,A,B\r\ncg1,0.1,0.2\r\n  \r\n\n"
+        b'"cg""2\ncg3",0.3,0.4\r\n\n,0.5,0.6\ncg4,0.7,0.8'
+    )
+    expected = pd.read_csv(csv_path, skiprows=[1])
+
+    assert count_cpg_rows(csv_path, block_size=block_size) == len(expected) == 4
+
+
+def test_read_beta_csv_blank_lines_parse_in_place(tmp_path):
+    csv_path = tmp_path / "bval_data.csv"
+    csv_path.write_text(",S1,S2\nPrognosis,A,B\ncg1,0.1,0.2\n\ncg2,0.3,0.4\n\n\n")
+    out_path = tmp_path / "betas.npy"
+
+    matrix = read_beta_csv(csv_path, out_path=out_path, chunk_rows=1)
+
+    assert isinstance(matrix.betas, np.memmap)
+    assert str(matrix.betas.filename) == str(out_path)
+    assert list(matrix.cpgs) == ["cg1", "cg2"]
+    np.testing.assert_allclose(np.load(out_path), [[0.1, 0.3], [0.2, 0.4]])
+
+
+def test_read_beta_csv_selected_samples_only(upload_csv):
+    full = read_beta_csv(upload_csv)
+    sample_idx = np.flatnonzero(np.isin(full.labels, ["AVPC", "Normal"]))
+
+    subset = read_beta_csv(upload_csv, chunk_rows=50, sample_idx=sample_idx)
+
+    assert subset.betas.shape == (len(sample_idx), full.betas.shape[1])
+    assert subset.samples.tolist() == full.samples[sample_idx].tolist()
+    assert set(subset.labels) == {"AVPC", "Normal"}
+    np.testing.assert_array_equal(subset.betas, full.betas[sample_idx])
+
+
+def test_prognosis_values_without_full_parse(upload_csv):
+    storage_dir = upload_csv.parent
+    response = get_prognosis_values_from_csv(
+        storage_dir.name, workdir=storage_dir.parent
+    )
+
+    assert response.unique_values == ["AVPC", "High_grade", "Indolent", "Normal"]
+    assert response.total_rows == count_cpg_rows(upload_csv) + 1 == 501
+    assert response.total_columns == 21
+
+
+@pytest.mark.parametrize("block_size", [5, 1 << 10, 1 << 24])
+def test_iter_cpg_ids_matches_pandas(upload_csv, block_size):
+    ids = np.concatenate(list(iter_cpg_ids(upload_csv, block_size=block_size)))
+    expected = pd.read_csv(upload_csv, index_col=0, skiprows=[1]).index
+
+    assert ids.tolist() == expected.astype(str).tolist()
+
+
+def test_iter_cpg_ids_r_style_quotes_and_missing_final_newline(tmp_path):
+    csv_path = tmp_path / "bval_data.csv"
+    csv_path.write_bytes(
+        b'"","S1","S2"\r\n"Prognosis","A","B"\r\n"cg1",0.1,0.2\r\n\ncg2,0.3,0.4'
+    )
+
+    ids = np.concatenate(list(iter_cpg_ids(csv_path, block_size=8)))
+
+    assert ids.tolist() == ["cg1", "cg2"]
+
+
+def test_array_type_matcher_streams_chunks(tmp_path, monkeypatch):
+    for name, sites in {"450k": ["cg1", "cg2"], "epic": ["cg1", "cg2", "cg3"]}.items():
+        path = tmp_path / f"{name}.pkl"
+        pd.DataFrame({"CpG_site": sites}).to_pickle(path)
+        monkeypatch.setitem(cnf.pkl_files, name, path)
+    monkeypatch.delitem(cnf.pkl_files, "epicv2")
+    monkeypatch.setattr(cpg_gene_mapping, "PROBE_INDEX_FILE", tmp_path / "none.npz")
+    cpg_gene_mapping.probe_index.cache_clear()
+
+    matcher = ArrayTypeMatcher()
+    matcher.update(["cg1"])
+    assert matcher.array_types == ["450k", "epic"]
+    matcher.update(["cg2", "cg3"])
+    assert matcher.array_types == ["epic"]
+    matcher.update(["cg4"])
+    assert matcher.array_types == []
+
+    cpg_gene_mapping.probe_index.cache_clear()
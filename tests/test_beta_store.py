@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.dimensionality_reduction.pca import pca_plot_matrix
+from app.services.get_algorithms import (
+    ALGORITHMS,
+    QUANTIZED_ALGORITHMS,
+    accepts_quantized,
+)
+from app.utils.algorithm_utils import fs_wrapper
+from app.utils.beta_quant import (
+    QUANT_MAX,
+    dequantize,
+    iter_dequantized_blocks,
+    quantize,
+)
+from app.utils.beta_store import (
+    has_beta_store,
+    has_quantized_store,
+    open_beta_store,
+    open_quantized_store,
+    read_beta_store,
+    write_beta_store,
+)
+
+
+def test_write_and_read_beta_store(upload_csv):
+    storage_dir = upload_csv.parent
+    info = write_beta_store(upload_csv, storage_dir)
+
+    assert has_beta_store(storage_dir)
+    assert info["samples"] == 20 and info["cpgs"] == 500
+
+    matrix = read_beta_store(storage_dir)
+    expected = pd.read_csv(upload_csv, index_col=0, skiprows=[1]).T
+
+    assert matrix.betas.dtype == np.float32
+    assert matrix.betas.shape == (20, 500)
+    assert list(matrix.cpgs) == list(expected.columns)
+    assert list(matrix.samples) == list(expected.index)
+    np.testing.assert_allclose(matrix.betas, expected.to_numpy(), rtol=1e-6)
+    assert set(matrix.labels) == {"AVPC", "High_grade", "Indolent", "Normal"}
+
+
+def test_fs_wrapper_reads_store_and_csv_alike(upload_csv):
+    algorithm = ALGORITHMS["anova_ftest"]
+    from_csv = fs_wrapper(algorithm=algorithm, csv_path=upload_csv)
+
+    write_beta_store(upload_csv, upload_csv.parent)
+    from_store = fs_wrapper(algorithm=algorithm, csv_path=upload_csv)
+
+    assert from_store["all_prognosis"] == from_csv["all_prognosis"]
+    assert (
+        from_store["feature_ranking"]["Feature"].tolist()[:20]
+        == from_csv["feature_ranking"]["Feature"].tolist()[:20]
+    )
+
+
+def test_fs_wrapper_selected_prognosis_from_store_and_csv(upload_csv):
+    algorithm = ALGORITHMS["anova_ftest"]
+    selected = ["AVPC", "Normal"]
+    from_csv = fs_wrapper(
+        algorithm=algorithm, csv_path=upload_csv, selected_prognosis=selected
+    )
+
+    write_beta_store(upload_csv, upload_csv.parent)
+    from_store = fs_wrapper(
+        algorithm=algorithm, csv_path=upload_csv, selected_prognosis=selected
+    )
+
+    for result in (from_csv, from_store):
+        assert set(result["labels"]) == set(selected)
+        assert result["data"].X.shape == (result["total_samples"], 500)
+        assert len(result["all_prognosis"]) == 4
+    np.testing.assert_array_equal(from_store["data"].X, from_csv["data"].X)
+
+
+def test_open_beta_store_is_read_only_memmap(upload_csv):
+    write_beta_store(upload_csv, upload_csv.parent)
+    matrix = open_beta_store(upload_csv.parent)
+
+    assert isinstance(matrix.betas, np.memmap)
+    assert not matrix.betas.flags.writeable
+
+
+@pytest.mark.parametrize("algorithm", ALGORITHMS.values())
+def test_algorithms_on_memmapped_store(upload_csv, algorithm):
+    write_beta_store(upload_csv, upload_csv.parent)
+    results = fs_wrapper(algorithm=algorithm, csv_path=upload_csv)
+
+    assert isinstance(results["data"].X, np.memmap)
+    assert results["feature_ranking"].shape == (500, 2)
+
+
+def test_quantize_round_trip():
+    betas = np.array([[0.0, 0.5, 1.0, np.nan, 1.2, -0.1, 0.123456]], np.float32)
+
+    codes = quantize(betas)
+    restored = dequantize(codes)
+
+    assert codes.dtype == np.uint16
+    assert np.isnan(restored[0, 3])
+    np.testing.assert_allclose(
+        restored[0, [0, 1, 2, 4, 5, 6]],
+        [0.0, 0.5, 1.0, 1.0, 0.0, 0.123456],
+        atol=0.5 / QUANT_MAX + 1e-7,
+    )
+
+
+def test_quantized_store(upload_csv):
+    storage_dir = upload_csv.parent
+    info = write_beta_store(upload_csv, storage_dir, quantized=True)
+
+    assert has_quantized_store(storage_dir)
+    assert info["quantized_bytes"] == info["bytes"] // 2
+
+    codes = open_quantized_store(storage_dir).betas
+    betas = read_beta_store(storage_dir).betas
+    assert isinstance(codes, np.memmap) and codes.dtype == np.uint16
+    blocks = [block for _, _, block in iter_dequantized_blocks(codes, block_cols=64)]
+    np.testing.assert_allclose(np.hstack(blocks), betas, atol=1e-5)
+
+
+@pytest.mark.parametrize("name", sorted(alg.value for alg in QUANTIZED_ALGORITHMS))
+def test_quantized_algorithms(upload_csv, name):
+    write_beta_store(upload_csv, upload_csv.parent, quantized=True)
+    algorithm = ALGORITHMS[name]
+
+    exact = fs_wrapper(algorithm=algorithm, csv_path=upload_csv)
+    results = fs_wrapper(algorithm=algorithm, csv_path=upload_csv, quantized=True)
+
+    assert accepts_quantized(name)
+    assert results["data"].X.dtype == np.uint16
+    ranking = results["feature_ranking"]["Feature"].tolist()
+    assert sorted(ranking) == sorted(results["data"].features.tolist())
+    if name == "anova_ftest":
+        assert ranking[:20] == exact["feature_ranking"]["Feature"].tolist()[:20]
+
+    pca_plot_matrix(
+        results["data"].X,
+        results["labels"],
+        results["data"].features,
+        selected_features=ranking[:10],
+    )
+
+
+def test_random_forest_reads_the_float_store(upload_csv):
+    write_beta_store(upload_csv, upload_csv.parent, quantized=True)
+
+    results = fs_wrapper(
+        algorithm=ALGORITHMS["random_forest"],
+        csv_path=upload_csv,
+        quantized=accepts_quantized("random_forest"),
+    )
+
+    assert results["data"].X.dtype == np.float32
+    assert len(results["feature_ranking"]) == len(results["data"].features)
@@ -0,0 +1,20 @@
+import numpy as np
+
+from app.utils.beta_quant import dequantize, float_columns, quantize
+from app.utils.block_ops import column_blocks, gram, map_blocks
+
+
+def test_block_helpers_gram_and_map(cohort):
+    X, _ = cohort(np.arange(12) % 2, 50)
+    codes = quantize(X)
+    columns = np.array([0, 1, 2, 7, 9, 30, 31, 49])
+    blocks = column_blocks(columns, block_cols=3)
+
+    def read(block):
+        return float_columns(codes, block).astype(np.float64)
+
+    expected = dequantize(codes)[:, columns].astype(np.float64)
+    np.testing.assert_allclose(gram(read, blocks, n_jobs=2), expected @ expected.T)
+    sums = map_blocks(lambda block: read(block).sum(axis=0), blocks, n_jobs=3)
+    np.testing.assert_allclose(np.concatenate(sums), expected.sum(axis=0))
+    assert [len(b) for b in column_blocks(50, block_cols=16)] == [16, 16, 16, 2]
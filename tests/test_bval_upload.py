@@ -0,0 +1,151 @@
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import cnf
+from app.routers import bval_router
+from app.schemas import PromoteTarget
+from app.services import service_upload_beta_csv
+from app.services.service_upload_beta_csv import UploadBetaValuesCSVService
+from app.utils import blob_store
+
+
+def sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def manifest(files: dict[str, bytes]) -> dict:
+    entries = [
+        {"name": name, "size": len(data), "sha1": sha1(data)}
+        for name, data in sorted(files.items())
+    ]
+    canonical = "".join(f"{e['name']}\n{e['size']}\n{e['sha1']}\n" for e in entries)
+    return {"bundle_id": sha1(canonical.encode()), "files": entries}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(bval_router, "UPLOAD_DIR", tmp_path / "bval")
+    monkeypatch.setattr(blob_store, "BLOB_DIR", tmp_path / "blobs")
+
+    calls = []
+
+    def delay(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(id=f"task-{len(calls)}")
+
+    monkeypatch.setattr(bval_router.process_uploaded_files, "delay", delay)
+
+    app = FastAPI()
+    app.include_router(bval_router.router)
+    client = TestClient(app)
+    client.calls = calls
+    return client
+
+
+def upload(client, files: dict[str, bytes], to_send: list[str]) -> dict:
+    body = manifest(files)
+    response = client.post("/bval/manifest", json=body)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert sorted(e["name"] for e in result["missing"]) == sorted(to_send)
+
+    for entry in result["missing"]:
+        data = files[entry["name"]]
+        response = client.post(
+            f"/bval/blobs/{entry['sha1']}", files={"file": (entry["name"], data)}
+        )
+        assert response.status_code == 200, response.text
+
+    response = client.post(f"/bval/commit/{body['bundle_id']}")
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_manifest_upload_sends_only_missing_files(client, tmp_path):
+    shared = {"a_Grn.idat": b"green" * 100, "a_Red.idat": b"red" * 100}
+    first = {**shared, "b_Grn.idat": b"b-green"}
+    second = {**shared, "c_Grn.idat": b"c-green"}
+
+    result = upload(client, first, to_send=list(first))
+    assert result["task_id"] == "task-1"
+    assert result["file_count"] == 3
+
+    # the second cohort only transfers its new file
+    result = upload(client, second, to_send=["c_Grn.idat"])
+    storage_in = tmp_path / "bval" / result["sha1_hash"] / "in"
+    assert sorted(p.name for p in storage_in.iterdir()) == sorted(second)
+    assert (storage_in / "a_Grn.idat").read_bytes() == shared["a_Grn.idat"]
+    if cnf.upload_tmpdir.stat().st_dev == tmp_path.stat().st_dev:
+        assert (storage_in / "a_Grn.idat").stat().st_nlink >= 2  # hardlinked blob
+    assert client.calls[1]["file_paths"] == sorted(
+        str(storage_in / name) for name in second
+    )
+
+    # an existing bundle needs no upload at all
+    response = client.post("/bval/manifest", json=manifest(second))
+    assert response.json()["exists"] is True
+
+
+def test_manifest_upload_rejects_bad_input(client):
+    files = {"a.idat": b"a", "b.idat": b"b"}
+    body = manifest(files)
+
+    wrong_id = {**body, "bundle_id": "0" * 40}
+    assert client.post("/bval/manifest", json=wrong_id).status_code == 400
+
+    traversal = manifest({"../a.idat": b"a"})
+    assert client.post("/bval/manifest", json=traversal).status_code == 400
+
+    assert client.post("/bval/manifest", json=body).status_code == 200
+    entry = body["files"][0]
+    response = client.post(
+        f"/bval/blobs/{entry['sha1']}", files={"file": ("a.idat", b"tampered")}
+    )
+    assert response.status_code == 400
+
+    # commit refuses while files are still missing
+    response = client.post(f"/bval/commit/{body['bundle_id']}")
+    assert response.status_code == 400
+    assert "a.idat" in response.json()["detail"]
+    assert client.calls == []
+
+
+def test_promote_output_links_csv_into_fs_and_dmp(
+    client, tmp_path, monkeypatch, upload_csv
+):
+    services = {
+        target: UploadBetaValuesCSVService(tmp_path / target.value)
+        for target in PromoteTarget
+    }
+    monkeypatch.setattr(bval_router, "PROMOTE_SERVICES", services)
+    monkeypatch.setattr(
+        service_upload_beta_csv.task_analyze_bvals_csv,
+        "delay",
+        bval_router.process_uploaded_files.delay,
+    )
+    bundle_id = "a" * 40
+    out_csv = tmp_path / "bval" / bundle_id / "out" / "bval_data.csv"
+    out_csv.parent.mkdir(parents=True)
+    out_csv.write_bytes(upload_csv.read_bytes())
+    csv_sha1 = sha1(upload_csv.read_bytes())
+
+    response = client.post(f"/bval/promote/{bundle_id}")
+
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["csv_sha1"] == csv_sha1
+    assert [r["task_id"] for r in result["results"].values()] == ["task-1", "task-2"]
+    for module in ("fs", "dmp"):
+        promoted = tmp_path / module / csv_sha1 / "bval_data.csv"
+        assert promoted.read_bytes() == out_csv.read_bytes()
+        assert client.calls[0 if module == "fs" else 1]["sha1_hash"] == csv_sha1
+    assert (out_csv.parent / "bval_data.csv.sha1").read_text() == csv_sha1
+
+    # promoting again finds the datasets in place
+    response = client.post(f"/bval/promote/{bundle_id}", json={"targets": ["fs"]})
+    assert response.json()["results"]["fs"]["task_id"] == ""
+    assert client.post(f"/bval/promote/{'b' * 40}").status_code == 404
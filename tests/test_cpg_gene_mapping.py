@@ -0,0 +1,306 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import cnf
+from app.cpg2gene import cpg_gene_mapping, regions
+from app.cpg2gene.annotation_store import store_dir, write_annotation_store
+from app.cpg2gene.cpg_gene_mapping import (
+    build_gene_names_csv,
+    build_gene_names_df,
+    build_probe_index,
+    get_annotation,
+    probe_index,
+)
+from app.cpg2gene.gene_ranking import aggregate_genes, get_gene_incidence
+from app.routers import fs_router
+from app.utils import beta_store
+from app.utils.beta_store import cpg_columns, write_beta_store
+
+
+@pytest.fixture
+def annotation_450k(tmp_path, monkeypatch):
+    path = tmp_path / "450k.pkl"
+    pd.DataFrame(
+        {
+            "CpG_site": ["cg1", "cg2", "cg3", "cg4"],
+            "GeneName": ["TP53", None, "BRCA1;BRCA2", "TP53"],
+        }
+    ).to_pickle(path)
+    monkeypatch.setitem(cnf.pkl_files, "450k", path)
+    get_annotation.cache_clear()
+    get_gene_incidence.cache_clear()
+    yield path
+    get_annotation.cache_clear()
+    get_gene_incidence.cache_clear()
+
+
+def test_annotation_is_loaded_once(annotation_450k, monkeypatch):
+    loads = []
+    read_pickle = pd.read_pickle
+    monkeypatch.setattr(
+        cpg_gene_mapping.pd,
+        "read_pickle",
+        lambda path: loads.append(path) or read_pickle(path),
+    )
+
+    first = get_annotation("450k")
+    assert get_annotation("450k") is first
+    assert loads == [annotation_450k]
+    assert isinstance(first.genes, pd.Categorical)
+
+    with pytest.raises(ValueError, match="Unknown array type"):
+        get_annotation("27k")
+
+
+def test_build_gene_names_df_keeps_feature_order(annotation_450k):
+    feature_df = pd.DataFrame(
+        {"Feature": ["cg3", "cg1", "cg2"], "Importance": [0.9, 0.5, 0.1]}
+    )
+
+    result = build_gene_names_df(array_type="450K", feature_df=feature_df)
+
+    assert result["CpG_site"].tolist() == ["cg3", "cg1", "cg2"]
+    assert result["GeneName"].tolist()[:2] == ["BRCA1;BRCA2", "TP53"]
+    assert pd.isna(result["GeneName"].iloc[2])
+    assert result["Importance"].tolist() == [0.9, 0.5, 0.1]
+
+    top = build_gene_names_df(array_type="450k", feature_df=feature_df, fno=1)
+    assert top["CpG_site"].tolist() == ["cg3"]
+
+
+def test_build_gene_names_df_keeps_unannotated_features(annotation_450k):
+    ranking = pd.DataFrame(
+        {
+            "Feature": ["cg9", "cg3", "cg_unknown", "cg1"],
+            "Importance": [0.9, 0.7, 0.4, 0.2],
+        }
+    )
+
+    result = build_gene_names_df(array_type="450k", feature_df=ranking)
+
+    assert result["CpG_site"].tolist() == ["cg9", "cg3", "cg_unknown", "cg1"]
+    assert result["GeneName"].tolist()[1::2] == ["BRCA1;BRCA2", "TP53"]
+    assert result["GeneName"].iloc[[0, 2]].isna().all()
+    assert result["Importance"].tolist() == [0.9, 0.7, 0.4, 0.2]
+
+
+def test_memory_mapped_store_is_used_without_unpickling(annotation_450k, monkeypatch):
+    write_annotation_store(pd.read_pickle(annotation_450k), store_dir(annotation_450k))
+    monkeypatch.setattr(cpg_gene_mapping.pd, "read_pickle", None)  # must not be hit
+
+    annotation = get_annotation("450k")
+
+    assert isinstance(annotation.cpgs, np.memmap)
+    assert not annotation.cpgs.flags.writeable
+    result = annotation.lookup(["cg4", "cg2", "cg3"])
+    assert result["CpG_site"].tolist() == ["cg4", "cg2", "cg3"]
+    assert result["GeneName"].tolist()[::2] == ["TP53", "BRCA1;BRCA2"]
+    assert pd.isna(result["GeneName"].iloc[1])
+    assert annotation.positions(["cg1", "cg10", "x"]).tolist() == [0, -1, -1]
+
+
+def test_build_gene_names_csv(annotation_450k, tmp_path):
+    features = tmp_path / "ranked.csv"
+    pd.DataFrame({"Feature": ["cg4", "cg2"], "Score": [2, 1]}).to_csv(
+        features, index=False
+    )
+
+    outfile = build_gene_names_csv(
+        array_type="450k", input=str(features), output_dir=str(tmp_path)
+    )
+
+    result = pd.read_csv(outfile)
+    assert result.columns.tolist() == ["CpG_site", "GeneName"]
+    assert result["CpG_site"].tolist() == ["cg4", "cg2"]
+
+
+def test_prebuilt_probe_index_gives_overlap_per_platform(tmp_path, monkeypatch):
+    sites = {
+        "450k": [f"cg{i}" for i in range(100)],
+        "epic": [f"cg{i}" for i in range(50, 200)],
+    }
+    index_file = tmp_path / "probe_index.npz"
+    build_probe_index(sites).save(index_file)
+    for name in sites:
+        monkeypatch.setitem(cnf.pkl_files, name, tmp_path / "missing.pkl")
+    monkeypatch.delitem(cnf.pkl_files, "epicv2")
+    monkeypatch.setattr(cpg_gene_mapping, "PROBE_INDEX_FILE", index_file)
+    probe_index.cache_clear()
+
+    matcher = cpg_gene_mapping.ArrayTypeMatcher(min_overlap=0.95)
+    # an EPIC upload with a couple of ids that are on no platform
+    matcher.update([f"cg{i}" for i in range(60, 158)] + ["rs1", "ch.1"])
+
+    assert matcher.overlap == {"450k": 0.4, "epic": 0.98}
+    assert matcher.array_types == ["epic"]
+    probe_index.cache_clear()
+
+
+@pytest.mark.parametrize("stored", [False, True])
+def test_aggregate_ranking_to_genes(annotation_450k, stored):
+    if stored:
+        write_annotation_store(
+            pd.read_pickle(annotation_450k), store_dir(annotation_450k)
+        )
+    # best first: cg3 -> BRCA1, BRCA2; cg2 has no gene; cg9 is not on the array
+    ranking = pd.DataFrame(
+        {
+            "Feature": ["cg3", "cg2", "cg9", "cg4", "cg1"],
+            "Importance": [0.9, 0.8, 0.7, 0.2, 0.6],
+        }
+    )
+
+    by_rank = aggregate_genes(ranking, "450K", method="rank_sum")
+    assert by_rank.to_dict(orient="list") == {
+        "Gene": ["BRCA1", "BRCA2", "TP53"],
+        "Score": [5.0, 5.0, 3.0],  # Borda points: cg3 = 5, cg4 + cg1 = 2 + 1
+        "CpGs": [1, 1, 2],
+        "BestRank": [1, 1, 4],
+    }
+
+    by_max = aggregate_genes(ranking, "450k", score_column="Importance")
+    assert by_max["Score"].tolist() == [0.9, 0.9, 0.6]
+    by_mean = aggregate_genes(ranking, "450k", "mean", score_column="Importance")
+    assert by_mean["Score"].iloc[2] == pytest.approx(0.4)
+    top = aggregate_genes(ranking, "450k", "top_k", top_k=3)
+    assert top.set_index("Gene")["Score"].to_dict() == {
+        "BRCA1": 1.0,
+        "BRCA2": 1.0,
+        "TP53": 0.0,
+    }
+
+    with pytest.raises(ValueError, match="median"):
+        aggregate_genes(ranking, "450k", "median")
+
+
+@pytest.fixture
+def annotation_with_coordinates(tmp_path, monkeypatch, upload_csv):
+    cpgs = pd.read_csv(upload_csv, index_col=0, skiprows=[1], nrows=6).index
+    path = tmp_path / "epicv2.pkl"
+    df = pd.DataFrame(
+        {
+            "CpG_site": list(cpgs) + ["cg_other"],
+            "GeneName": ["TP53", None, "TP53;WRAP53", "BRCA1", None, "EGFR", None],
+            "chr": ["chr17", "chr17", "chr17", "chr17", "chr17", "chr7", None],
+            "pos": [
+                7_675_000,
+                7_676_000,
+                7_687_000,
+                43_044_000,
+                7_690_000,
+                55_019_000,
+                1,
+            ],
+        }
+    )
+    df.to_pickle(path)
+    monkeypatch.setitem(cnf.pkl_files, "epicv2", path)
+    get_annotation.cache_clear()
+    get_gene_incidence.cache_clear()
+    regions.get_coordinate_index.cache_clear()
+    yield df
+    get_annotation.cache_clear()
+    get_gene_incidence.cache_clear()
+    regions.get_coordinate_index.cache_clear()
+
+
+@pytest.mark.parametrize("stored", [False, True])
+def test_region_and_gene_queries(annotation_with_coordinates, tmp_path, stored):
+    df = annotation_with_coordinates
+    if stored:
+        write_annotation_store(df, store_dir(cnf.pkl_files["epicv2"]))
+
+    hits = regions.region_cpgs("EPICv2", "17", 7_676_000, 7_690_000)
+    assert hits["CpG_site"].tolist() == df["CpG_site"].iloc[[1, 2, 4]].tolist()
+    assert hits["pos"].tolist() == [7_676_000, 7_687_000, 7_690_000]
+    assert hits["chr"].tolist() == ["chr17"] * 3
+    assert regions.region_cpgs("epicv2", "chr17", 1, 10).empty
+
+    # TP53 CpGs span 7,675,000-7,687,000; the flank reaches 7,690,000
+    near = regions.gene_cpgs("epicv2", "TP53", flank=3_000)
+    assert near["pos"].tolist() == [7_675_000, 7_676_000, 7_687_000, 7_690_000]
+    assert regions.gene_cpgs("epicv2", "EGFR")["chr"].tolist() == ["chr7"]
+
+    with pytest.raises(ValueError, match="chrZ"):
+        regions.region_cpgs("epicv2", "chrZ", 1, 10)
+    with pytest.raises(ValueError, match="NOPE"):
+        regions.gene_cpgs("epicv2", "NOPE")
+
+
+def test_region_betas_come_from_the_beta_store(
+    annotation_with_coordinates, upload_csv, monkeypatch
+):
+    write_beta_store(upload_csv, upload_csv.parent)
+    expected = pd.read_csv(upload_csv, index_col=0, skiprows=[1]).T
+
+    loads = {}
+    load = np.load
+
+    def spy(path, mmap_mode=None, **kwargs):
+        loads[path.name] = mmap_mode
+        return load(path, mmap_mode=mmap_mode, **kwargs)
+
+    hits = regions.region_cpgs("epicv2", "chr17", 7_000_000, 7_700_000)
+    with monkeypatch.context() as m:
+        m.setattr(beta_store.np, "load", spy)
+        betas = regions.region_betas(upload_csv.parent, hits["CpG_site"])
+
+    # neither the matrix nor the CpG ids are read whole
+    assert loads[beta_store.BETAS_FILE] == loads[beta_store.CPGS_FILE] == "r"
+
+    assert betas.columns[:-1].tolist() == hits["CpG_site"].tolist()
+    np.testing.assert_allclose(
+        betas[hits["CpG_site"]].to_numpy(),
+        expected[hits["CpG_site"]].to_numpy(dtype=float),
+        rtol=1e-6,
+    )
+    assert betas.columns[-1] == cnf.prognosis_column_name
+
+
+def test_cpg_columns_binary_search(upload_csv):
+    write_beta_store(upload_csv, upload_csv.parent)
+    directory = beta_store.store_dir(upload_csv.parent)
+    cpgs = np.load(directory / beta_store.CPGS_FILE)
+    query = [cpgs[7], "cg_missing", cpgs[0], cpgs[-1] + "x", cpgs[-1]]
+
+    expected = [7, 0, len(cpgs) - 1]
+    assert cpg_columns(upload_csv.parent, query).tolist() == expected
+
+    # a store written before the sorted index still answers
+    (directory / beta_store.SORTED_CPGS_FILE).unlink()
+    (directory / beta_store.CPG_ORDER_FILE).unlink()
+    assert cpg_columns(upload_csv.parent, query).tolist() == expected
+    assert cpg_columns(upload_csv.parent, []).tolist() == []
+
+
+def test_region_endpoint_finds_dmp_datasets(
+    annotation_with_coordinates, upload_csv, tmp_path, monkeypatch
+):
+    storage_dir = upload_csv.parent
+    write_beta_store(upload_csv, storage_dir)
+    (storage_dir / cnf.metadata_file).write_text(
+        json.dumps({"detected_illumina_array_types": ["epicv2"]})
+    )
+    # not a feature-selection upload, only a DMP one
+    monkeypatch.setattr(fs_router, "REGION_WORKDIRS", (tmp_path / "fs", tmp_path))
+    app = FastAPI()
+    app.include_router(fs_router.router)
+
+    response = TestClient(app).get(
+        f"/fs/region/{storage_dir.name}",
+        params={"gene": "TP53", "betas": True},
+    )
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["cpg_count"] == 3
+    assert set(body["betas"]) == {
+        *annotation_with_coordinates["CpG_site"][:3],
+        "Prognosis",
+    }
+    assert TestClient(app).get("/fs/region/nope?gene=TP53").status_code == 404
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.utils import csv_engine
+from app.utils.beta_csv import read_beta_csv
+from app.utils.csv_engine import InvalidCsvError, read_frame, resolve_engine
+
+from .conftest import TEST_DATA
+
+ENGINES = [
+    "pandas",
+    pytest.param(
+        "pyarrow",
+        marks=pytest.mark.skipif(
+            csv_engine.pa_csv is None, reason="pyarrow is not installed"
+        ),
+    ),
+]
+
+
+def test_resolve_engine(monkeypatch):
+    assert resolve_engine("pandas") == "pandas"
+    with pytest.raises(ValueError, match="Unknown CSV engine"):
+        resolve_engine("polars")
+
+    # pyarrow missing: everything falls back to pandas
+    monkeypatch.setattr(csv_engine, "pa_csv", None)
+    assert resolve_engine("auto") == "pandas"
+    assert resolve_engine("pyarrow") == "pandas"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_read_beta_csv_engines_agree(upload_csv, engine):
+    expected = read_beta_csv(upload_csv, engine="pandas")
+    matrix = read_beta_csv(upload_csv, engine=engine)
+
+    assert matrix.betas.dtype == np.float32
+    assert matrix.cpgs.tolist() == expected.cpgs.tolist()
+    np.testing.assert_array_equal(matrix.betas, expected.betas)
+
+    sample_idx = np.array([1, 4, 7])
+    subset = read_beta_csv(upload_csv, sample_idx=sample_idx, engine=engine)
+    np.testing.assert_array_equal(subset.betas, expected.betas[sample_idx])
+    assert subset.labels.tolist() == expected.labels[sample_idx].tolist()
+
+
+@pytest.mark.skipif(csv_engine.pa_csv is None, reason="pyarrow is not installed")
+def test_iter_cpg_batches_streams_small_batches(upload_csv):
+    expected = read_beta_csv(upload_csv, engine="pandas")
+
+    batches = list(
+        csv_engine.iter_cpg_batches(upload_csv, len(expected.samples), block_size=4096)
+    )
+
+    assert len(batches) > 1
+    assert (
+        np.concatenate([ids for ids, _ in batches]).tolist() == expected.cpgs.tolist()
+    )
+    np.testing.assert_array_equal(
+        np.concatenate([block for _, block in batches]).T, expected.betas
+    )
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_read_beta_csv_engines_r_style_quotes(tmp_path, engine):
+    csv_path = tmp_path / "bval_data.csv"
+    csv_path.write_text(
+        '"","S1","S2"\n"Prognosis","A","B"\n"cg1",0.1,NA\n"cg2",0.3,0.4\n\n'
+    )
+
+    matrix = read_beta_csv(csv_path, out_path=tmp_path / "betas.npy", engine=engine)
+
+    assert matrix.cpgs.tolist() == ["cg1", "cg2"]
+    assert np.isnan(matrix.betas[1, 0])
+    np.testing.assert_allclose(matrix.betas[:, 1], [0.3, 0.4], rtol=1e-6)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_read_frame(engine):
+    df = read_frame(TEST_DATA / "bval_data.csv", engine=engine)
+    expected = pd.read_csv(TEST_DATA / "bval_data.csv")
+
+    assert df.columns.tolist() == expected.columns.tolist()
+    assert df["Prognosis"].tolist() == expected["Prognosis"].tolist()
+    np.testing.assert_allclose(
+        df.drop(columns="Prognosis").to_numpy(dtype=np.float64),
+        expected.drop(columns="Prognosis").to_numpy(),
+        rtol=1e-6,
+    )
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_read_frame_empty_file(tmp_path, engine):
+    csv_path = tmp_path / "empty.csv"
+    csv_path.write_text("")
+
+    with pytest.raises(InvalidCsvError, match="empty"):
+        read_frame(csv_path, engine=engine)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_read_frame_wrong_encoding(tmp_path, engine):
+    csv_path = tmp_path / "latin1.csv"
+    csv_path.write_bytes("site,Prognosis\nSão Paulo,A\n".encode("latin-1"))
+
+    with pytest.raises(InvalidCsvError):
+        read_frame(csv_path, encoding="utf-8", engine=engine)
+    df = read_frame(csv_path, encoding="latin-1", engine=engine)
+    assert df["site"].tolist() == ["São Paulo"]
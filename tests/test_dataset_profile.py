@@ -0,0 +1,106 @@
+import os
+from types import SimpleNamespace
+
+from app.celery_tasks import task_analyze_bvals_csv as analysis
+from app.config import cnf
+from app.services.prognosis_values_from_csv import get_prognosis_values_from_csv
+from app.utils.dataset_profile import (
+    build_profile,
+    load_profile,
+    profile_path,
+    write_profile,
+)
+
+
+def _profile(labels):
+    return build_profile(
+        filename="bval_data.csv",
+        file_size=1234,
+        n_cpgs=500,
+        labels=labels,
+        array_types=["450k"],
+        matrix_bytes=4 * 500 * len(labels),
+    )
+
+
+def test_build_profile_counts_labels():
+    profile = _profile(["B", "A", "B"])
+
+    assert profile["n_samples"] == 3
+    assert profile["unique_labels"] == ["A", "B"]
+    assert profile["label_counts"] == {"B": 2, "A": 1}
+
+
+def test_load_profile_is_cached_until_mtime_changes(tmp_path):
+    assert load_profile(tmp_path) is None
+
+    write_profile(tmp_path, _profile(["A", "B"]))
+    first = load_profile(tmp_path)
+    assert load_profile(tmp_path) is first
+
+    write_profile(tmp_path, _profile(["A", "B", "C"]))
+    stat = profile_path(tmp_path).stat()
+    os.utime(profile_path(tmp_path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert load_profile(tmp_path)["n_samples"] == 3
+
+
+def test_prognosis_values_served_from_profile(tmp_path):
+    storage_dir = tmp_path / "sha1"
+    storage_dir.mkdir()
+    write_profile(storage_dir, _profile(["Normal", "AVPC", "Normal"]))
+
+    # no CSV at all: the answer must come from the profile
+    response = get_prognosis_values_from_csv("sha1", workdir=tmp_path)
+
+    assert response.unique_values == ["AVPC", "Normal"]
+    assert response.total_rows == 501
+    assert response.total_columns == 4
+
+
+def test_blank_labels_count_as_samples():
+    profile = _profile(["A", "", "B", " "])
+
+    assert profile["n_samples"] == 4
+    assert profile["blank_labels"] == 2
+    assert profile["unique_labels"] == ["A", "B"]
+
+
+def test_analysis_counts_every_sample_and_is_written_before_the_store(
+    tmp_path, monkeypatch
+):
+    storage_dir = tmp_path / "sha1"
+    storage_dir.mkdir()
+    csv_path = storage_dir / "bval_data.csv"
+    csv_path.write_text(",S1,S2,S3\nPrognosis,A,,B\ncg1,0.1,0.2,0.3\n")
+    # an analysis shared from another dataset, hardlinked into this one
+    shared = tmp_path / "shared.json"
+    shared.write_text("{}")
+    os.link(shared, storage_dir / cnf.metadata_file)
+    queued = []
+
+    def delay(*args):
+        queued.append((storage_dir / cnf.metadata_file).stat().st_nlink == 1)
+        return SimpleNamespace(id="store-task")
+
+    monkeypatch.setattr(analysis.task_build_beta_store, "delay", delay)
+    monkeypatch.setattr(
+        analysis.task_analyze_bvals_csv, "update_state", lambda **kwargs: None
+    )
+    monkeypatch.setattr(analysis, "share_derived", lambda *args: None)
+    # no annotation pickles here: an array type matcher that matches nothing
+    monkeypatch.setattr(
+        analysis,
+        "ArrayTypeMatcher",
+        lambda: SimpleNamespace(update=len, array_types=[], overlap={}),
+    )
+
+    result = analysis.task_analyze_bvals_csv.run(str(csv_path), "sha1", storage_dir)
+
+    assert queued == [True]
+    assert result["beta_store_task_id"] == "store-task"
+    assert result["prognosis_null_count"] == 1
+    response = get_prognosis_values_from_csv("sha1", workdir=tmp_path)
+    assert response.total_columns == 4
+    assert load_profile(storage_dir)["blank_labels"] == 1
+    assert shared.read_text() == "{}"
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from app.utils.beta_quant import quantize
+from app.utils.lasso_path import lasso_path
+
+
+@pytest.mark.parametrize("n_classes", [2, 3])
+def test_screened_path_ends_at_the_full_fit(cohort, n_classes):
+    X, y = cohort(np.arange(60) % n_classes, 400)
+
+    path = lasso_path(X, y, C=0.5, tol=1e-6, max_iter=20_000, block_cols=64)
+
+    full = LogisticRegression(
+        penalty="l1",
+        solver="saga",
+        C=0.5,
+        tol=1e-6,
+        max_iter=20_000,
+        class_weight="balanced",
+    ).fit(X.astype(np.float64), y)
+    full_coef = np.linalg.norm(full.coef_, axis=0)
+    np.testing.assert_array_equal(path.coef > 0, full_coef > 0)
+    np.testing.assert_allclose(path.coef, full_coef, atol=1e-2)
+
+    # entry penalties descend along the path; late CpGs rank below it
+    assert path.penalties[-1] == pytest.approx(2.0)
+    entered = path.coef > 0
+    assert path.importance[entered].min() >= path.penalties[-1]
+    assert path.importance[~entered].max() <= path.penalties[-1] * 1.01
+
+
+def test_ranking_is_full_and_reads_quantized_blocks(cohort):
+    X, y = cohort(np.arange(60) % 2, 2000, seed=1)
+    features = np.array([f"cg{i:05d}" for i in range(X.shape[1])])
+
+    ranking = lasso_path(X, y, C=0.5).ranking(features)
+    quantized = lasso_path(quantize(X), y, C=0.5).ranking(features)
+
+    assert sorted(ranking["Feature"]) == sorted(features)
+    assert ranking["Importance"].is_monotonic_decreasing
+    assert set(ranking["Feature"][:5]) == set(features[:5])
+    assert set(quantized["Feature"][:5]) == set(features[:5])
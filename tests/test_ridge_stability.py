@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import RidgeClassifier
+
+from app.utils.beta_quant import quantize
+from app.utils.ridge_stability import ridge_stability
+
+
+def refit_scores(X, y, n_repeats, size, random_state):
+    """What ridge_l2 used to do: one RidgeClassifier per subsample."""
+    scores = np.zeros(X.shape[1])
+    for seed in np.random.SeedSequence(random_state).spawn(n_repeats):
+        rows = np.random.default_rng(seed).choice(len(y), size=size, replace=False)
+        coef = RidgeClassifier(alpha=2.0).fit(X[rows], y[rows]).coef_
+        scores += np.abs(coef) if coef.ndim == 1 else np.abs(coef).mean(axis=0)
+    return scores / n_repeats
+
+
+@pytest.mark.parametrize("n_classes", [2, 3])
+def test_dual_solutions_match_refitting_each_subsample(cohort, n_classes):
+    X, y = cohort(np.arange(40) % n_classes, 700, seed=n_classes, dtype=np.float64)
+
+    scores = ridge_stability(
+        X, y, alpha=2.0, n_repeats=6, random_state=7, block_cols=128, n_jobs=3
+    )
+
+    expected = refit_scores(X, y, n_repeats=6, size=28, random_state=7)
+    np.testing.assert_allclose(scores, expected, rtol=1e-5, atol=1e-9)
+
+
+def test_scores_are_reproducible_and_read_quantized_blocks(cohort):
+    X, y = cohort(np.repeat([0, 1], 20), 300)
+
+    first = ridge_stability(X, y, n_repeats=8, block_cols=50, n_jobs=1)
+    again = ridge_stability(X, y, n_repeats=8, block_cols=300, n_jobs=4)
+    quantized = ridge_stability(quantize(X), y, n_repeats=8, block_cols=50)
+
+    np.testing.assert_allclose(first, again, rtol=1e-9)
+    np.testing.assert_allclose(quantized, first, rtol=1e-3, atol=1e-6)
+    assert set(np.argsort(-first)[:5]) == set(range(5))
+
+    with pytest.raises(ValueError):
+        ridge_stability(np.where(X > 0.9, np.nan, X), y)
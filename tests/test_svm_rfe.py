@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_selection import RFE
+from sklearn.svm import LinearSVC
+
+from app.algorithms.rfe_svm import rfe_svm
+from app.algorithms.workflow import NotifyCeleryTask
+from app.celery_tasks import fs_tasks
+from app.utils.algorithm_utils import FeatureMatrix
+from app.utils.beta_quant import quantize
+from app.utils.svm_rfe import elimination_schedule, svm_rfe
+
+
+def test_schedule_is_coarse_then_one_by_one_in_the_top_k():
+    schedule = elimination_schedule(1000, step=0.5, top_k=100)
+
+    assert schedule[:4] == [500, 250, 125, 25]
+    assert schedule[4:] == [1] * 99
+    assert sum(schedule) == 999
+
+
+@pytest.mark.parametrize(
+    "n_classes, loss, class_weight",
+    [(2, "hinge", None), (3, "squared_hinge", "balanced")],
+)
+def test_warm_started_dual_rfe_matches_sklearn(cohort, n_classes, loss, class_weight):
+    X, y = cohort(np.arange(60) % n_classes, 30)
+    svc = LinearSVC(
+        C=0.1, loss=loss, class_weight=class_weight, tol=1e-8, max_iter=100_000
+    )
+    expected = RFE(svc, n_features_to_select=1, step=1).fit(X, y).ranking_
+
+    result = svm_rfe(
+        X, y, C=0.1, loss=loss, class_weight=class_weight, tol=1e-8, block_cols=7
+    )
+
+    np.testing.assert_array_equal(result.ranks, expected)
+    np.testing.assert_array_equal(result.order, np.argsort(expected))
+
+
+def test_rounds_report_progress_and_write_the_partial_ranking(cohort, tmp_path):
+    X, y = cohort(np.arange(60) % 2, 500)
+    features = np.array([f"cg{i:05d}" for i in range(X.shape[1])])
+    states = []
+
+    class Task:
+        def update_state(self, state, meta):
+            states.append(meta)
+
+    partial = tmp_path / "rfe_svm_results.csv.partial"
+    ranking = rfe_svm(
+        FeatureMatrix(X=quantize(X), y=y, features=features),
+        top_k=20,
+        notify=NotifyCeleryTask(Task()),
+        partial_path=partial,
+    )
+
+    assert set(features[:5]) <= set(ranking["Feature"][:10])
+    assert ranking["Importance"].tolist()[:20] == list(range(1, 21))
+    rounds = len(elimination_schedule(500, top_k=20))
+    assert [s["rfe_round"] for s in states] == list(range(1, rounds + 1))
+    assert all(s["partial_ranking"] == partial.name for s in states)
+    assert 30 <= states[0]["progress"] <= states[-1]["progress"] <= 79
+
+    # read bottom-up, the partial file is the ranking minus the last survivor
+    written = pd.read_csv(partial)
+    np.testing.assert_array_equal(written["Feature"][::-1], ranking["Feature"][1:])
+    np.testing.assert_array_equal(
+        written["Importance"][::-1], ranking["Importance"][1:]
+    )
+
+
+def test_failed_rfe_task_leaves_no_partial_ranking(tmp_path, monkeypatch):
+    written = []
+
+    def fail_midway(**kwargs):
+        kwargs["partial_path"].write_text("Feature,Importance\ncg1,1\n")
+        written.append(kwargs["partial_path"])
+        raise MemoryError("killed in round 3")
+
+    monkeypatch.setattr(fs_tasks, "fs_wrapper", fail_midway)
+    task = fs_tasks.process_prognosis_algorithm
+    monkeypatch.setattr(task, "update_state", lambda **kwargs: None)
+
+    with pytest.raises(MemoryError):
+        task.run("bval_data.csv", "sha1", str(tmp_path), ["A", "B"], "rfe_svm", 10)
+
+    assert len(written) == 1
+    assert not written[0].exists()
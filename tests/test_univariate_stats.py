@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from scipy import stats
+from sklearn.feature_selection import f_classif
+
+from app.utils.beta_quant import quantize
+from app.utils.univariate_stats import fdr_bh, univariate_test
+
+
+@pytest.fixture
+def betas(cohort):
+    return cohort(np.repeat([0, 1, 2], [12, 15, 9]), 300, signal=10)
+
+
+def test_anova_matches_f_classif_block_by_block(betas):
+    X, y = betas
+    F, p = f_classif(X.astype(np.float64), y)
+
+    result = univariate_test(X, y, "anova", block_cols=64, n_jobs=3)
+
+    np.testing.assert_allclose(result.statistic, F, rtol=1e-5)
+    np.testing.assert_allclose(result.pvalue, p, rtol=1e-4)
+    np.testing.assert_allclose(
+        result.qvalue, stats.false_discovery_control(p), rtol=1e-4
+    )
+
+
+def test_welch_is_welchs_t_for_two_classes(betas):
+    X, y = betas
+    binary = (y > 0).astype(int)
+    t, p = stats.ttest_ind(
+        X[binary == 0].astype(np.float64), X[binary == 1], equal_var=False
+    )
+
+    result = univariate_test(X, binary, "welch", block_cols=100)
+
+    np.testing.assert_allclose(result.statistic, t**2, rtol=1e-5)
+    np.testing.assert_allclose(result.pvalue, p, rtol=1e-4)
+
+
+def test_kruskal_with_ties_and_missing_values(betas):
+    X, y = betas
+    X = np.round(X, 1)  # plenty of ties
+    X[0, 3] = np.nan
+    groups = [X[y == c].astype(np.float64) for c in range(3)]
+    H, p = stats.kruskal(*groups, axis=0)
+    kept = [g[~np.isnan(g[:, 3]), 3] for g in groups]
+
+    result = univariate_test(X, y, "kruskal", block_cols=50)
+
+    np.testing.assert_allclose(np.delete(result.statistic, 3), np.delete(H, 3))
+    np.testing.assert_allclose(np.delete(result.pvalue, 3), np.delete(p, 3))
+    assert result.statistic[3] == pytest.approx(stats.kruskal(*kept)[0])
+
+
+def test_moderated_and_quantized_rankings_find_the_signal(betas):
+    X, y = betas
+    for test in ("moderated_t", "welch", "kruskal"):
+        result = univariate_test(quantize(X), y, test, block_cols=64)
+        top = result.ranking(np.array([f"cg{i}" for i in range(X.shape[1])]))
+        assert set(top["Feature"][:10]) == {f"cg{i}" for i in range(10)}
+        assert top["Importance"].is_monotonic_decreasing
+
+
+def test_fdr_and_bad_input():
+    np.testing.assert_allclose(
+        fdr_bh(np.array([0.01, 0.04, 0.03, np.nan])), [0.04, 0.16 / 3, 0.16 / 3, 1.0]
+    )
+    with pytest.raises(ValueError, match="two classes"):
+        univariate_test(np.zeros((3, 2)), np.zeros(3), "anova")
+    with pytest.raises(ValueError, match="Unknown test"):
+        univariate_test(np.zeros((3, 2)), np.array([0, 1, 1]), "ttest")
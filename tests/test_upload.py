@@ -0,0 +1,249 @@
+import asyncio
+import gzip
+import hashlib
+import io
+import shutil
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.celery_tasks.task_analyze_bvals_csv import (
+    SHARED_ARTIFACTS,
+    STORE,
+    task_build_beta_store,
+)
+from app.services import service_upload_beta_csv
+from app.services.service_upload_beta_csv import UploadBetaValuesCSVService
+from app.utils import blob_store, file_utils
+from app.utils.beta_store import has_beta_store, write_beta_store
+from app.utils.file_utils import (
+    calculate_sha1_hashes,
+    csv_compression,
+    decompress_csv,
+    manifest_sha1,
+    move_into_place,
+    save_csv_file,
+    validate_csv_file,
+)
+
+zstd_only = pytest.mark.skipif(
+    file_utils.zstandard is None, reason="zstandard is not installed"
+)
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.compress(data)
+    return file_utils.zstandard.ZstdCompressor().compress(data)
+
+
+@pytest.fixture
+def csv_bytes(upload_csv) -> bytes:
+    return upload_csv.read_bytes()
+
+
+@pytest.fixture
+def fake_analysis(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "BLOB_DIR", tmp_path / "blobs")
+    calls = []
+
+    def delay(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(id="task-1")
+
+    def build_store(*args):
+        calls.append({"build_store": args})
+        return SimpleNamespace(id="task-2")
+
+    monkeypatch.setattr(service_upload_beta_csv.task_analyze_bvals_csv, "delay", delay)
+    monkeypatch.setattr(
+        service_upload_beta_csv.task_build_beta_store, "delay", build_store
+    )
+    return calls
+
+
+def test_validate_csv_file_compressed_extensions():
+    assert validate_csv_file(UploadFile(io.BytesIO(), filename="a.CSV"))
+    assert validate_csv_file(UploadFile(io.BytesIO(), filename="a.csv.gz"))
+    assert not validate_csv_file(UploadFile(io.BytesIO(), filename="a.gz"))
+    assert not validate_csv_file(UploadFile(io.BytesIO(), filename="a.txt.zst"))
+
+    assert csv_compression("a.csv") is None
+    assert csv_compression("a.csv.gz") == "gzip"
+    assert csv_compression("a.csv.zst") == "zstd"
+
+
+@pytest.mark.parametrize("compression", ["gzip", pytest.param("zstd", marks=zstd_only)])
+def test_decompress_csv_hashes_plain_and_compressed_bytes(
+    tmp_path, csv_bytes, compression
+):
+    packed = compress(csv_bytes, compression)
+
+    csv_hash, compressed_hash = decompress_csv(
+        io.BytesIO(packed), tmp_path / "out.csv", compression
+    )
+
+    assert (tmp_path / "out.csv").read_bytes() == csv_bytes
+    assert csv_hash == hashlib.sha1(csv_bytes).hexdigest()
+    assert compressed_hash == hashlib.sha1(packed).hexdigest()
+
+
+@pytest.mark.parametrize(
+    "filename", ["data.csv.gz", pytest.param("data.csv.zst", marks=zstd_only)]
+)
+def test_compressed_upload_dedupes_with_plain_csv(
+    tmp_path, csv_bytes, fake_analysis, filename
+):
+    service = UploadBetaValuesCSVService(tmp_path / "fs")
+    packed = compress(csv_bytes, csv_compression(filename))
+    csv_hash = hashlib.sha1(csv_bytes).hexdigest()
+
+    # the frontend sends the SHA1 of the bytes it uploads
+    response = asyncio.run(
+        service.handle_upload(
+            UploadFile(io.BytesIO(packed), filename=filename),
+            hashlib.sha1(packed).hexdigest(),
+        )
+    )
+
+    assert response.sha1_hash == csv_hash
+    assert response.task_id == "task-1"
+    stored = tmp_path / "fs" / csv_hash / "bval_data.csv"
+    assert stored.read_bytes() == csv_bytes
+    assert fake_analysis[0]["file_path"] == str(stored)
+
+    plain = asyncio.run(
+        service.handle_upload(
+            UploadFile(io.BytesIO(csv_bytes), filename="data.csv"), csv_hash
+        )
+    )
+    assert plain.sha1_hash == csv_hash
+    assert plain.task_id == ""
+    assert len(fake_analysis) == 1
+
+
+def test_compressed_upload_rejects_wrong_id_and_corrupt_data(
+    tmp_path, csv_bytes, fake_analysis
+):
+    service = UploadBetaValuesCSVService(tmp_path / "fs")
+    packed = gzip.compress(csv_bytes)
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(
+            service.handle_upload(
+                UploadFile(io.BytesIO(packed), filename="data.csv.gz"), "0" * 40
+            )
+        )
+    assert exc.value.status_code == 400
+
+    with pytest.raises(HTTPException, match="decompress"):
+        asyncio.run(
+            service.handle_upload(
+                UploadFile(io.BytesIO(packed[: len(packed) // 2]), filename="a.csv.gz"),
+                None,
+            )
+        )
+    assert fake_analysis == []
+
+
+def test_zstd_upload_without_zstandard_says_so(tmp_path, monkeypatch, fake_analysis):
+    monkeypatch.setattr(file_utils, "zstandard", None)
+    service = UploadBetaValuesCSVService(tmp_path / "fs")
+
+    assert validate_csv_file(UploadFile(io.BytesIO(), filename="a.csv.zst"))
+    with pytest.raises(HTTPException, match="zstd support not installed"):
+        asyncio.run(
+            service.handle_upload(
+                UploadFile(io.BytesIO(b"\x28\xb5\x2f\xfd"), filename="a.csv.zst"),
+                None,
+            )
+        )
+    assert fake_analysis == []
+
+
+def test_stream_upload_hashes_in_one_pass(tmp_path, csv_bytes):
+    upload = UploadFile(io.BytesIO(csv_bytes), filename="../evil/bval_data.csv")
+
+    saved = asyncio.run(save_csv_file(upload, tmp_path))
+
+    assert saved.path == tmp_path / "bval_data.csv"
+    assert saved.path.read_bytes() == csv_bytes
+    assert saved.size == len(csv_bytes)
+    assert saved.sha1 == hashlib.sha1(csv_bytes).hexdigest()
+    assert manifest_sha1([saved]) == calculate_sha1_hashes([saved.path])
+
+
+def test_move_into_place_renames_files(tmp_path):
+    staging = tmp_path / "upload"
+    staging.mkdir()
+    paths = []
+    for name in ("a.idat", "b.idat"):
+        (staging / name).write_bytes(name.encode())
+        paths.append(staging / name)
+
+    moved = move_into_place(paths, tmp_path / "sha1" / "in")
+
+    assert [p.name for p in moved] == ["a.idat", "b.idat"]
+    assert not any(staging.iterdir())
+    assert sorted(p.name for p in (tmp_path / "sha1").iterdir()) == ["in"]
+    assert (tmp_path / "sha1" / "in" / "a.idat").read_bytes() == b"a.idat"
+
+
+def test_same_csv_in_fs_and_dmp_is_stored_and_analyzed_once(
+    tmp_path, csv_bytes, fake_analysis
+):
+    csv_hash = hashlib.sha1(csv_bytes).hexdigest()
+    fs_dir, dmp_dir = tmp_path / "fs" / csv_hash, tmp_path / "dmp" / csv_hash
+
+    def upload(module):
+        service = UploadBetaValuesCSVService(tmp_path / module)
+        file = UploadFile(io.BytesIO(csv_bytes), filename="data.csv")
+        return asyncio.run(service.handle_upload(file, csv_hash))
+
+    assert upload("fs").task_id == "task-1"
+    # what the fs analysis and store tasks leave behind
+    for name in SHARED_ARTIFACTS:
+        (fs_dir / name).write_text("{}")
+    write_beta_store(fs_dir / "bval_data.csv", fs_dir)
+    blob_store.share_derived(csv_hash, fs_dir, [*SHARED_ARTIFACTS, STORE])
+
+    response = upload("dmp")
+
+    assert response.task_id == ""
+    assert [c for c in fake_analysis if "file_path" in c] == fake_analysis[:1]
+    fs_csv, dmp_csv = fs_dir / "bval_data.csv", dmp_dir / "bval_data.csv"
+    assert fs_csv.stat().st_ino == dmp_csv.stat().st_ino
+    for name in SHARED_ARTIFACTS:
+        assert (dmp_dir / name).stat().st_ino == (fs_dir / name).stat().st_ino
+
+    # the store task links the store built for fs instead of parsing again
+    (args,) = [c["build_store"] for c in fake_analysis if "build_store" in c]
+    assert task_build_beta_store.run(*args)["shared"] is True
+    assert has_beta_store(dmp_dir)
+
+    # the blob and its derived artifacts go once no workdir links them
+    assert blob_store.prune_blobs(min_age=0) == 0
+    shutil.rmtree(fs_dir)
+    shutil.rmtree(dmp_dir)
+    assert blob_store.prune_blobs(min_age=0) == len(csv_bytes)
+    assert not blob_store.derived_dir(csv_hash).exists()
+
+
+@pytest.mark.parametrize("filename", ["data.csv", "data.csv.gz"])
+def test_malformed_upload_is_rejected_while_streaming(
+    tmp_path, csv_bytes, fake_analysis, filename
+):
+    service = UploadBetaValuesCSVService(tmp_path / "fs")
+    bad = csv_bytes.replace(b"Prognosis", b"Diagnosis", 1)
+    if filename.endswith(".gz"):
+        bad = gzip.compress(bad)
+
+    with pytest.raises(HTTPException, match="validation failed") as exc:
+        asyncio.run(
+            service.handle_upload(UploadFile(io.BytesIO(bad), filename=filename), None)
+        )
+
+    assert exc.value.status_code == 400
+    assert not (tmp_path / "fs").exists()
+    assert fake_analysis == []
@@ -0,0 +1,218 @@
+import gzip
+import hashlib
+import os
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import bval_router, fs_router, upload_router
+from app.services import service_upload_beta_csv
+from app.services.service_upload_beta_csv import UploadBetaValuesCSVService
+from app.utils import blob_store, upload_sessions
+
+
+def sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_sessions, "SESSION_DIR", tmp_path / "sessions")
+    monkeypatch.setattr(blob_store, "BLOB_DIR", tmp_path / "blobs")
+    monkeypatch.setattr(bval_router, "UPLOAD_DIR", tmp_path / "bval")
+    monkeypatch.setattr(
+        fs_router, "upload_service", UploadBetaValuesCSVService(tmp_path / "fs")
+    )
+
+    calls = []
+
+    def delay(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(id=f"task-{len(calls)}")
+
+    monkeypatch.setattr(bval_router.process_uploaded_files, "delay", delay)
+    monkeypatch.setattr(service_upload_beta_csv.task_analyze_bvals_csv, "delay", delay)
+
+    app = FastAPI()
+    app.include_router(upload_router.router)
+    app.include_router(bval_router.router)
+    app.include_router(fs_router.router)
+    client = TestClient(app)
+    client.calls = calls
+    return client
+
+
+def start(client, name: str, data: bytes, chunk_size: int) -> dict:
+    body = {"filename": name, "size": len(data), "sha1": sha1(data)}
+    response = client.post("/uploads", json={**body, "chunk_size": chunk_size})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def put_chunk(client, session: dict, data: bytes, index: int):
+    size = session["chunk_size"]
+    chunk = data[index * size : (index + 1) * size]
+    return client.put(f"/uploads/{session['session_id']}/chunks/{index}", content=chunk)
+
+
+def test_resumed_upload_feeds_bundle_commit(client):
+    data = bytes(range(256)) * 40  # 10 chunks of 1 KiB
+    session = start(client, "a_Grn.idat", data, chunk_size=1024)
+    assert session["chunk_count"] == 10
+    session_id = session["session_id"]
+
+    for index in range(4):
+        assert put_chunk(client, session, data, index).status_code == 200
+
+    # connection dropped: chunk 5 arrives before 4 and chunk 3 is retried
+    response = put_chunk(client, session, data, 5)
+    assert response.status_code == 409
+    assert response.json()["detail"]["next_chunk"] == 4
+    assert put_chunk(client, session, data, 3).json()["received"] == 4096
+
+    state = client.get(f"/uploads/{session_id}").json()
+    for index in range(state["next_chunk"], state["chunk_count"]):
+        response = put_chunk(client, session, data, index)
+    assert response.json()["complete"] is True
+
+    response = client.post(f"/uploads/{session_id}/finalize")
+    assert response.json() == {"sha1": sha1(data), "size": len(data)}
+    assert blob_store.blob_path(sha1(data)).read_bytes() == data
+    assert client.get(f"/uploads/{session_id}").status_code == 404
+
+    # the bundle now commits without sending the file again
+    entry = {"name": "a_Grn.idat", "size": len(data), "sha1": sha1(data)}
+    bundle_id = sha1(f"a_Grn.idat\n{len(data)}\n{sha1(data)}\n".encode())
+    manifest = {"bundle_id": bundle_id, "files": [entry]}
+    assert client.post("/bval/manifest", json=manifest).json()["missing"] == []
+    assert client.post(f"/bval/commit/{bundle_id}").json()["task_id"] == "task-1"
+
+    # a known file needs no session at all
+    assert start(client, "b_Grn.idat", data, chunk_size=1024)["exists"] is True
+
+
+def test_finalize_rehashes_after_restart_and_rejects_bad_content(client):
+    data = b"x" * 3000
+    session = start(client, "a.idat", data, chunk_size=1024)
+    put_chunk(client, session, data, 0)
+    upload_sessions._hashers.clear()  # e.g. the server restarted mid-upload
+    put_chunk(client, session, data, 1)
+
+    response = client.post(f"/uploads/{session['session_id']}/finalize")
+    assert response.status_code == 400  # incomplete
+
+    put_chunk(client, session, data, 2)
+    response = client.post(f"/uploads/{session['session_id']}/finalize")
+    assert response.status_code == 200, response.text
+    assert blob_store.has_blob(sha1(data), len(data))
+
+    claimed = start(client, "b.idat", b"y" * 10, chunk_size=1024)
+    client.put(f"/uploads/{claimed['session_id']}/chunks/0", content=b"z" * 10)
+    response = client.post(f"/uploads/{claimed['session_id']}/finalize")
+    assert response.status_code == 400
+    assert not blob_store.has_blob(claimed["sha1"])
+
+
+def test_resumable_csv_upload_is_ingested(client, upload_csv):
+    packed = gzip.compress(upload_csv.read_bytes())
+    session = start(client, "data.csv.gz", packed, chunk_size=4096)
+    for index in range(session["chunk_count"]):
+        put_chunk(client, session, packed, index)
+    client.post(f"/uploads/{session['session_id']}/finalize")
+
+    body = {"sha1": sha1(packed), "filename": "data.csv.gz"}
+    response = client.post("/fs/upload-blob", json=body)
+
+    assert response.status_code == 200, response.text
+    csv_hash = sha1(upload_csv.read_bytes())
+    assert response.json()["sha1_hash"] == csv_hash
+    assert client.calls[0]["sha1_hash"] == csv_hash
+
+    response = client.post("/fs/upload-blob", json={**body, "sha1": "0" * 40})
+    assert response.status_code == 404
+
+
+def test_malformed_csv_is_rejected_on_the_first_chunk(client, upload_csv):
+    data = upload_csv.read_bytes().replace(b",", b";")
+    session = start(client, "data.csv", data, chunk_size=4096)
+
+    response = put_chunk(client, session, data, 0)
+
+    assert response.status_code == 400
+    assert "comma-separated" in response.json()["detail"]
+    assert client.get(f"/uploads/{session['session_id']}").status_code == 404
+
+
+def test_chunks_stream_to_disk_and_abandoned_sessions_are_swept(
+    client, tmp_path, monkeypatch
+):
+    data = b"x" * 3000
+    session = start(client, "a.idat", data, chunk_size=1024)
+    directory = tmp_path / "sessions" / session["session_id"]
+    put_chunk(client, session, data, 0)
+    assert sorted(p.name for p in directory.iterdir()) == ["data", "session.json"]
+
+    with monkeypatch.context() as patch:
+        patch.setattr(upload_router, "MAX_CHUNK_SIZE", 1000)
+        assert put_chunk(client, session, data, 1).status_code == 413
+    assert not list(directory.glob("*.part"))
+
+    # a day later without a chunk, the next upload sweeps this one away
+    stale = directory.stat().st_mtime - upload_sessions.SESSION_TTL - 60
+    os.utime(directory / "session.json", (stale, stale))
+    assert upload_sessions.open_upload_sha1s() == {sha1(data)}
+    start(client, "b.idat", b"y" * 10, chunk_size=1024)
+    assert not directory.exists()
+    assert client.get(f"/uploads/{session['session_id']}").status_code == 404
+
+
+def age(path, seconds: float = 2 * 24 * 3600):
+    stat = path.stat()
+    os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+
+def upload(client, name: str, data: bytes) -> None:
+    session = start(client, name, data, chunk_size=1024)
+    for index in range(session["chunk_count"]):
+        put_chunk(client, session, data, index)
+    client.post(f"/uploads/{session['session_id']}/finalize")
+
+
+def test_removing_a_dataset_prunes_its_blobs(client):
+    data = b"i" * 2000
+    upload(client, "a_Grn.idat", data)
+    entry = {"name": "a_Grn.idat", "size": len(data), "sha1": sha1(data)}
+    bundle_id = sha1(f"a_Grn.idat\n{len(data)}\n{sha1(data)}\n".encode())
+    client.post("/bval/manifest", json={"bundle_id": bundle_id, "files": [entry]})
+    client.post(f"/bval/commit/{bundle_id}")
+    blob = blob_store.blob_path(sha1(data))
+
+    # linked into the bundle: kept however old it is
+    age(blob)
+    assert blob_store.prune_blobs() == 0
+
+    # unlinking the bundle's copy bumps the ctime, not the recorded last use
+    assert client.delete(f"/bval/remove/{bundle_id}").status_code == 200
+    assert not blob.exists()
+
+
+def test_prune_keeps_recent_pending_and_uploading_blobs(client):
+    fresh, pending, uploading = b"f" * 100, b"p" * 100, b"u" * 100
+    for name, data in [("f.idat", fresh), ("p.idat", pending), ("u.idat", uploading)]:
+        upload(client, name, data)
+    entry = {"name": "p.idat", "size": len(pending), "sha1": sha1(pending)}
+    bundle_id = sha1(f"p.idat\n{len(pending)}\n{sha1(pending)}\n".encode())
+    client.post("/bval/manifest", json={"bundle_id": bundle_id, "files": [entry]})
+    # e.g. a second client sending the same content
+    upload_sessions.create_session("u.idat", len(uploading), sha1(uploading))
+    for data in (pending, uploading):
+        age(blob_store.blob_path(sha1(data)))
+
+    assert blob_store.prune_blobs() == 0
+
+    age(blob_store.blob_path(sha1(fresh)))
+    assert blob_store.prune_blobs() == len(fresh)
+    assert not blob_store.has_blob(sha1(fresh))
+    assert blob_store.has_blob(sha1(pending)) and blob_store.has_blob(sha1(uploading))